@@ -0,0 +1,105 @@
+import io
+import os
+import tempfile
+import threading
+
+import src.common.utils.attachment_store as attachment_store
+from src.common.utils.attachment_store import AttachmentPayloadCache, store_upload
+
+
+def test_duplicate_uploads_share_one_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        sha_a, path_a, existed_a = store_upload(io.BytesIO(b"same content"), "a.log", tmp)
+        sha_b, path_b, existed_b = store_upload(io.BytesIO(b"same content"), "dir/b.log", tmp)
+        sha_c, path_c, existed_c = store_upload(io.BytesIO(b"same content"), "a.log", tmp)
+        assert sha_a == sha_b == sha_c and path_a == path_c
+        assert (existed_a, existed_b, existed_c) == (False, True, True)
+        assert os.listdir(tmp) == [sha_a]
+        # 保留原文件名，同一内容只占一份空间
+        assert [os.path.basename(p) for p in (path_a, path_b)] == ["a.log", "b.log"]
+        assert os.path.samefile(path_a, path_b)
+
+        # 模型看到的是原文件名而不是哈希
+        cache = AttachmentPayloadCache(cache_dir=os.path.join(tmp, "cache"))
+        assert "=== File: a.log ===" in cache.get_payloads(path_a, "LLM")[0]["text"]
+        assert "=== File: b.log ===" in cache.get_payloads(path_b, "LLM")[0]["text"]
+
+
+def test_payload_built_once_for_concurrent_tasks():
+    builds = []
+    original = attachment_store.build_file_metadata
+
+    def counting_build(file_path, **kwargs):
+        builds.append(file_path)
+        return original(file_path, **kwargs)
+
+    attachment_store.build_file_metadata = counting_build
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            _, path, _ = store_upload(io.BytesIO(b"\x89PNG fake image bytes"), "x.png", tmp)
+            cache = AttachmentPayloadCache(cache_dir=os.path.join(tmp, "cache"), max_bytes=10 ** 7)
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(cache.get_payloads(path, "VLM")))
+                       for _ in range(16)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert len(builds) == 1
+            assert all(r == results[0] for r in results)
+            assert cache.stats()["misses"] == 1
+
+            # 新实例（模拟重启）直接读磁盘缓存
+            restarted = AttachmentPayloadCache(cache_dir=os.path.join(tmp, "cache"), max_bytes=10 ** 7)
+            assert restarted.get_payloads(path, "VLM") == results[0]
+            assert restarted.stats()["disk_hits"] == 1
+            assert len(builds) == 1
+    finally:
+        attachment_store.build_file_metadata = original
+
+
+def test_failed_build_releases_key_lock():
+    original = attachment_store.build_file_metadata
+
+    def broken_build(file_path, **kwargs):
+        raise OSError("disk error")
+
+    attachment_store.build_file_metadata = broken_build
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            _, path, _ = store_upload(io.BytesIO(b"some text"), "x.txt", tmp)
+            cache = AttachmentPayloadCache(cache_dir=os.path.join(tmp, "cache"))
+            try:
+                cache.get_payloads(path, "LLM")
+                raise AssertionError("编码失败应当抛出")
+            except OSError:
+                pass
+            assert not cache._building
+    finally:
+        attachment_store.build_file_metadata = original
+
+
+def test_file_hash_memo_is_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AttachmentPayloadCache(cache_dir=os.path.join(tmp, "cache"), max_hash_entries=3)
+        paths = []
+        for i in range(5):
+            path = os.path.join(tmp, f"f{i}.txt")
+            with open(path, "w") as f:
+                f.write(f"content {i}")
+            paths.append(path)
+            cache.file_hash(path)
+        assert len(cache._hashes) == 3
+        # 最早的记录被淘汰，最近的仍在
+        assert os.path.abspath(paths[-1]) in {key[0] for key in cache._hashes}
+        assert os.path.abspath(paths[0]) not in {key[0] for key in cache._hashes}
+        # 淘汰后重新计算，结果不变
+        assert cache.file_hash(paths[0]) == store_upload(io.BytesIO(b"content 0"), "x.txt", tmp)[0]
+
+
+if __name__ == "__main__":
+    test_duplicate_uploads_share_one_file()
+    test_payload_built_once_for_concurrent_tasks()
+    test_failed_build_releases_key_lock()
+    test_file_hash_memo_is_bounded()
+    print("attachment store tests passed")
@@ -0,0 +1,115 @@
+import asyncio
+
+import src.common.utils.context_compactor as context_compactor
+from src.common.models import Task
+from src.common.utils.context_compactor import compact_messages
+from src.common.utils.token_counter import estimate_messages_tokens
+from src.config.settings import MODEL_CONTEXT_BUDGET, SESSION_MAX_SIZE
+
+MODEL = "compaction-model"
+
+
+def _make_task(turns: int, tool_output: str = "x" * 400) -> Task:
+    task = Task(task_name="t", model=MODEL, task_content="do it")
+    task.session_history = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": "do it"},
+    ]
+    for i in range(turns):
+        task.session_history.append({
+            "role": "assistant", "content": None, "reasoning_content": f"thinking {i} " * 20,
+            "tool_calls": [{"id": f"call_{i}_a"}, {"id": f"call_{i}_b"}],
+        })
+        task.session_history.append({"role": "tool", "tool_call_id": f"call_{i}_a", "content": tool_output})
+        task.session_history.append({"role": "tool", "tool_call_id": f"call_{i}_b", "content": tool_output})
+    return task
+
+
+def _compact(task: Task, budget: int):
+    MODEL_CONTEXT_BUDGET[MODEL] = budget
+    try:
+        return asyncio.run(compact_messages(task))
+    finally:
+        MODEL_CONTEXT_BUDGET.pop(MODEL, None)
+
+
+def test_within_budget_only_drops_old_reasoning():
+    task = _make_task(turns=3)
+    messages = _compact(task, budget=100000)
+    assert len(messages) == len(task.session_history)
+    assert "reasoning_content" not in messages[2]
+    assert messages[-3]["reasoning_content"]
+    # 原始历史不被修改
+    assert task.session_history[2]["reasoning_content"]
+
+
+def test_sliding_window_keeps_tool_pairs_and_task_head():
+    task = _make_task(turns=30)
+    budget = 1500
+    messages = _compact(task, budget)
+
+    assert messages[:2] == task.session_history[:2]
+    assert messages[2]["role"] == "system" and "已省略" in messages[2]["content"]
+    assert estimate_messages_tokens(messages) <= budget
+    # 每个 tool 结果前面都有对应的 assistant tool_calls
+    call_ids = set()
+    for message in messages[3:]:
+        if message["role"] == "assistant":
+            call_ids = {call["id"] for call in message["tool_calls"]}
+        else:
+            assert message["tool_call_id"] in call_ids
+    assert messages[-1] is task.session_history[-1]
+
+
+def test_old_tool_outputs_are_truncated_first():
+    task = _make_task(turns=4, tool_output="y" * 5000)
+    messages = _compact(task, budget=9000)
+    assert len(messages) == len(task.session_history)
+    assert "已截断" in messages[3]["content"]
+    assert messages[-1]["content"] == "y" * 5000
+
+
+def test_message_count_limit_applies_within_budget():
+    task = _make_task(turns=30, tool_output="z")
+    for budget in (100000, 0):
+        messages = _compact(task, budget)
+        assert estimate_messages_tokens(task.session_history) < 100000
+        # 预算足够（或不做 token 压缩）时也不超过条数上限
+        assert messages[:2] == task.session_history[:2] and "已省略" in messages[2]["content"]
+        assert len(messages) - 3 <= SESSION_MAX_SIZE
+        assert messages[-1] is task.session_history[-1]
+
+    short = _make_task(turns=3)
+    assert _compact(short, 0) is short.session_history
+
+
+def test_summary_replaces_omission_note():
+    calls = []
+
+    async def fake_summary(model, previous, dropped):
+        calls.append(len(dropped))
+        return "summary"
+
+    original = context_compactor._request_summary
+    context_compactor._request_summary = fake_summary
+    context_compactor_summary_model = context_compactor.CONTEXT_SUMMARY_MODEL
+    context_compactor.CONTEXT_SUMMARY_MODEL = "summary-model"
+    try:
+        task = _make_task(turns=30)
+        messages = _compact(task, budget=1500)
+        assert messages[2]["content"].endswith("summary")
+        # 窗口未移动时复用任务上缓存的总结
+        _compact(task, budget=1500)
+        assert len(calls) == 1
+    finally:
+        context_compactor._request_summary = original
+        context_compactor.CONTEXT_SUMMARY_MODEL = context_compactor_summary_model
+
+
+if __name__ == "__main__":
+    test_within_budget_only_drops_old_reasoning()
+    test_sliding_window_keeps_tool_pairs_and_task_head()
+    test_old_tool_outputs_are_truncated_first()
+    test_message_count_limit_applies_within_budget()
+    test_summary_replaces_omission_note()
+    print("context_compactor tests passed")
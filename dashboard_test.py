@@ -0,0 +1,61 @@
+from fastapi.testclient import TestClient
+
+from src.common.models import Task
+from src.mcp_server.task_manager import _handling_task_list
+from src.user.web.dashboard import DashboardProjection
+from src.user.web.server import app
+
+
+def _task(name: str, model: str = "m1") -> Task:
+    task = Task(task_name=name, model=model, task_content="do it", task_id=f"task_{name}")
+    task.session_history = [{"role": "user", "content": "x" * 100000}]
+    return task
+
+
+def test_projection_tracks_changes_and_removals():
+    projection = DashboardProjection(max_tombstones=2)
+    v1 = projection.refresh({"tasks": [{"task_id": "a", "state": "waiting"}, {"task_id": "b", "state": "waiting"}]})
+    assert projection.refresh({"tasks": [{"task_id": "a", "state": "waiting"}, {"task_id": "b", "state": "waiting"}]}) == v1
+    v2 = projection.refresh({"tasks": [{"task_id": "a", "state": "handling"}]})
+    delta = projection.delta(v1)["tasks"]
+    assert delta == {"changed": [{"task_id": "a", "state": "handling"}], "removed": ["b"]}
+    assert projection.delta(v2)["tasks"] == {"changed": [], "removed": []}
+    # 墓碑被清理后，过旧的版本只能拿全量
+    for i in range(3):
+        projection.refresh({"tasks": [{"task_id": f"c{i}", "state": "waiting"}]})
+    assert projection.delta(v1) is None
+
+
+def test_dashboard_summary_etag_and_delta():
+    client = TestClient(app)
+    first, second = _task("first"), _task("second", "m2")
+    _handling_task_list.extend([first, second])
+    try:
+        res = client.get("/api/dashboard")
+        data = res.json()
+        tasks = {t["task_id"]: t for t in data["tasks"]}
+        assert "session_history" not in tasks["task_first"]
+        assert tasks["task_first"]["history_length"] == 1
+        assert len(res.content) < 10000
+
+        etag = res.headers["etag"]
+        assert client.get("/api/dashboard", headers={"If-None-Match": etag}).status_code == 304
+
+        first.session_history.append({"role": "assistant", "content": "ok"})
+        res = client.get("/api/dashboard", params={"since": data["version"]}, headers={"If-None-Match": etag})
+        assert res.status_code == 200
+        delta = res.json()
+        assert delta["delta"] is True
+        assert [t["task_id"] for t in delta["tasks"]["changed"]] == ["task_first"]
+
+        filtered = client.get("/api/dashboard", params={"model": "m2", "limit": 1}).json()
+        assert filtered["total"] == 1 and filtered["tasks"][0]["task_id"] == "task_second"
+    finally:
+        _handling_task_list.remove(first)
+        _handling_task_list.remove(second)
+
+
+if __name__ == "__main__":
+    test_projection_tracks_changes_and_removals()
+    test_dashboard_summary_etag_and_delta()
+    print("dashboard tests passed")
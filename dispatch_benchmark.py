@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import src.mcp_server.task_executor as task_executor
+import src.mcp_server.task_manager as task_manager
+from src.common.models import Task
+from src.mcp_server.model_manager import init_model, get_model, bind_model_task
+from src.mcp_server.task_manager import init_task, get_handling_task_count
+from src.config.settings import MAX_HANDLING_TASKS
+
+BENCH_MODEL = "bench-model"
+TASK_COUNT = 10
+SUBMIT_INTERVAL = 0.3
+
+# 工具调用场景：每个任务先调用一次工具，拿到结果后再给出最终回复
+TOOL_TASK_COUNT = 12
+MODEL_CALL_TIME = 0.1
+TOOL_CALL_TIME = 0.3
+
+_submit_time = {}
+_first_call_time = {}
+_model_busy_time = []
+
+
+async def fake_model_call(task: Task, logger=None):
+    """替代真实模型调用：记录首次调用时间并立即返回最终回复"""
+    _first_call_time.setdefault(task.task_id, time.perf_counter())
+    message = SimpleNamespace(content="ok", reasoning_content=None, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class FakeToolCall:
+    def __init__(self, call_id: str):
+        self.id = call_id
+        self.function = SimpleNamespace(name="bench__slow_tool", arguments="{}")
+
+    def model_dump(self):
+        return {"id": self.id, "type": "function",
+                "function": {"name": self.function.name, "arguments": self.function.arguments}}
+
+
+async def fake_tool_model_call(task: Task, logger=None):
+    """模拟耗时的模型调用：首轮发出工具调用，收到工具结果后结束"""
+    start = time.perf_counter()
+    await asyncio.sleep(MODEL_CALL_TIME)
+    _model_busy_time.append(time.perf_counter() - start)
+    if task.session_history[-1]["role"] == "tool":
+        message = SimpleNamespace(content="done", reasoning_content=None, tool_calls=None)
+    else:
+        call = FakeToolCall(f"call_{task.task_id}")
+        message = SimpleNamespace(content=None, reasoning_content=None, tool_calls=[call])
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+async def fake_plugin_call(record):
+    await asyncio.sleep(TOOL_CALL_TIME)
+    return "ok"
+
+
+def get_pending_task():
+    """旧版单一全局队列的出队方式：不看模型状态直接取队首"""
+    for queue in task_manager._model_queues.values():
+        if queue:
+            return queue.popleft()
+    return None
+
+
+def requeue_task(task: Task) -> None:
+    task_manager._model_queues.setdefault(task.model, deque()).append(task)
+
+
+async def legacy_task_handler() -> None:
+    """改造前的轮询式处理器（按原逻辑复刻，用于对比）"""
+    while True:
+        if get_handling_task_count() >= MAX_HANDLING_TASKS:
+            await asyncio.sleep(1.0)
+            continue
+        task = get_pending_task()
+        if not task:
+            await asyncio.sleep(1.0)
+            continue
+        model = get_model(task.model)
+        if not model:
+            requeue_task(task)
+            await asyncio.sleep(2.0)
+            continue
+        if model.state == "idle":
+            bind_model_task(task.model, task.task_id, task.task_name)
+            asyncio.create_task(task_executor.execute_task(task))
+        else:
+            await asyncio.sleep(2)
+            requeue_task(task)
+
+
+async def run_round(handler) -> list:
+    _submit_time.clear()
+    _first_call_time.clear()
+    runner = asyncio.create_task(handler())
+    await asyncio.sleep(0)
+
+    for i in range(TASK_COUNT):
+        task = Task(task_name=f"bench_{i}", model=BENCH_MODEL, task_content="ping")
+        init_task(task)
+        _submit_time[task.task_id] = time.perf_counter()
+        await asyncio.sleep(SUBMIT_INTERVAL)
+
+    while len(_first_call_time) < TASK_COUNT:
+        await asyncio.sleep(0.05)
+    runner.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await runner
+
+    return [(_first_call_time[k] - _submit_time[k]) * 1000 for k in _submit_time]
+
+
+async def run_tool_round(release_slot: bool) -> tuple:
+    """返回 (总耗时, 模型利用率)，利用率 = 模型调用耗时 / (总耗时 × 槽位数)"""
+    task_executor.RELEASE_MODEL_SLOT_ON_TOOL_CALL = release_slot
+    _model_busy_time.clear()
+    done = []
+    original_footer = task_executor.TaskLogger.print_footer
+
+    def print_footer(self, success: bool = True):
+        done.append(self.task_id)
+        original_footer(self, success)
+
+    task_executor.TaskLogger.print_footer = print_footer
+    runner = asyncio.create_task(task_executor.execute_task_handler())
+    start = time.perf_counter()
+    for i in range(TOOL_TASK_COUNT):
+        init_task(Task(task_name=f"tool_bench_{i}", model=BENCH_MODEL, task_content="use tool"))
+    while len(done) < TOOL_TASK_COUNT:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    runner.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await runner
+    task_executor.TaskLogger.print_footer = original_footer
+    slots = get_model(BENCH_MODEL).max_concurrency
+    return elapsed, sum(_model_busy_time) / (elapsed * slots)
+
+
+def report(name: str, latencies: list) -> None:
+    print(f"{name:<8} mean={statistics.mean(latencies):8.2f}ms  "
+          f"p50={statistics.median(latencies):8.2f}ms  max={max(latencies):8.2f}ms")
+
+
+async def main():
+    task_executor.model_call = fake_model_call
+    task_executor.write_task_history = lambda data: None
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_model(BENCH_MODEL)
+        legacy = await run_round(legacy_task_handler)
+        current = await run_round(task_executor.execute_task_handler)
+
+    print(f"submit -> first model call latency ({TASK_COUNT} tasks, every {SUBMIT_INTERVAL}s)")
+    report("legacy", legacy)
+    report("event", current)
+
+    task_executor.model_call = fake_tool_model_call
+    task_executor.call_plugin_function = fake_plugin_call
+    with contextlib.redirect_stdout(io.StringIO()):
+        hold = await run_tool_round(release_slot=False)
+        release = await run_tool_round(release_slot=True)
+
+    print(f"\nmodel utilisation with tool calls ({TOOL_TASK_COUNT} tasks, "
+          f"model {MODEL_CALL_TIME}s/turn, tool {TOOL_CALL_TIME}s)")
+    print(f"{'hold':<8} makespan={hold[0]:6.2f}s  utilisation={hold[1]:6.1%}")
+    print(f"{'release':<8} makespan={release[0]:6.2f}s  utilisation={release[1]:6.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import tempfile
+
+import src.plugins.plugin_manager as plugin_manager
+from src.common.models import Task
+from src.common.models.tool_record import ToolRecord
+from src.plugins.dispatch_table import rebuild_dispatch_table, get_tool_entry
+from src.plugins.plugin_manager import get_config_data, init_config_data, get_registry_version
+from src.plugins.tool_call import call_plugin_function
+
+PLUGIN_NAME = "dispatch_test_plugin"
+
+
+def _write_plugin(plugin_dir: str, version: int) -> None:
+    with open(os.path.join(plugin_dir, "__init__.py"), "w", encoding="utf-8") as f:
+        f.write("from .impl import get_version\n")
+    with open(os.path.join(plugin_dir, "impl.py"), "w", encoding="utf-8") as f:
+        f.write(f"def get_version():\n    return {version}\n")
+
+
+def _call(func_name: str):
+    record = ToolRecord(task_id="t", task_name="t", mcp_type=PLUGIN_NAME,
+                        tool_name=func_name, model="m", arguments={})
+    return asyncio.run(call_plugin_function(record))
+
+
+def test_reload_picks_up_new_plugin_code():
+    plugin_dir = os.path.join(tempfile.mkdtemp(), PLUGIN_NAME)
+    os.makedirs(plugin_dir)
+    config = {PLUGIN_NAME: {"dir_path": plugin_dir, "functions": {
+        "get_version": {"type": "function", "function": {"name": "get_version"}},
+        "missing": {"type": "function", "function": {"name": "missing"}},
+        "empty": None,
+    }}}
+    try:
+        _write_plugin(plugin_dir, 1)
+        rebuild_dispatch_table(config, reload_plugins=[PLUGIN_NAME])
+        assert _call("get_version") == 1
+
+        # 覆盖安装后重新导入（含子模块）
+        _write_plugin(plugin_dir, 20)
+        rebuild_dispatch_table(config, reload_plugins=[PLUGIN_NAME])
+        assert _call("get_version") == 20
+
+        try:
+            get_tool_entry(PLUGIN_NAME, "missing")
+            assert False, "missing function should not be dispatched"
+        except ValueError as e:
+            assert "missing" in str(e)
+
+        # 函数配置为空时与改造前一样拒绝调用
+        try:
+            get_tool_entry(PLUGIN_NAME, "empty")
+            assert False, "function without config should not be dispatched"
+        except ValueError as e:
+            assert "无函数配置" in str(e)
+    finally:
+        rebuild_dispatch_table(get_config_data())
+
+
+def test_task_tool_schemas_follow_registry_version():
+    init_config_data()
+    task = Task(task_name="t", model="m", task_content="c", available_tools=["mock", "mock/get_weather"])
+    schemas = task.get_tool_info()
+    assert [s["function"]["name"] for s in schemas] == ["mock__get_current_time", "mock__get_weather"]
+    assert task.get_tool_info() is schemas
+
+    # 配置内容不变时版本号不变，复用已解析的 schema
+    version = get_registry_version()
+    init_config_data()
+    assert get_registry_version() == version
+    assert task.get_tool_info() is schemas
+
+    # 插件配置变化后重新解析
+    plugin_manager._REGISTRY_VERSION += 1
+    assert task.get_tool_info() is not schemas
+    assert task.get_tool_info() == schemas
+
+
+if __name__ == "__main__":
+    test_reload_picks_up_new_plugin_code()
+    test_task_tool_schemas_follow_registry_version()
+    print("dispatch_table tests passed")
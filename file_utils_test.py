@@ -0,0 +1,129 @@
+import io
+import os
+import tempfile
+
+import pytest
+
+import src.common.utils.file_utils as file_utils
+from src.common.utils.file_utils import (
+    apply_image_detail, build_file_metadata, get_render_settings, normalize_image, parse_page_range,
+    payload_size, render_pdf_pages, split_page_spec
+)
+
+
+def test_page_range_parsing():
+    assert parse_page_range(None, 3) == [0, 1, 2]
+    assert parse_page_range("1-3,5,8-", 10) == [0, 1, 2, 4, 7, 8, 9]
+    assert parse_page_range("3,1-2,2", 10) == [0, 1, 2]
+    # 超出总页数的部分忽略
+    assert parse_page_range("4-20", 5) == [3, 4]
+    for bad in ("0", "5-2", "a-b"):
+        try:
+            parse_page_range(bad, 10)
+        except ValueError:
+            continue
+        raise AssertionError(f"{bad} 应当报错")
+    assert split_page_spec("docs/a.pdf#pages=2-5") == ("docs/a.pdf", "2-5")
+    assert split_page_spec("docs/a.pdf") == ("docs/a.pdf", None)
+
+
+def test_text_models_never_rasterise():
+    settings = get_render_settings("a.pdf", "LLM", "2-3")
+    assert settings["pdf_mode"] == "text" and settings["pdf_pages"] == "2-3"
+    assert get_render_settings("a.pdf", "VLM")["pdf_mode"] == "image"
+    assert get_render_settings("a.png", "VLM")["image_format"]
+    assert get_render_settings("a.png", "LLM") == {}
+
+
+def test_pdf_text_path_and_parallel_render():
+    pytest.importorskip("fitz")
+    original = file_utils.render_pdf_pages
+
+    def fail_render(*args, **kwargs):
+        raise AssertionError("文本模式不应渲染图片")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "doc.pdf")
+        doc = file_utils.fitz.open()
+        for i in range(6):
+            doc.new_page().insert_text((72, 72), f"page body {i + 1}")
+        doc.save(path)
+        doc.close()
+
+        file_utils.render_pdf_pages = fail_render
+        try:
+            payloads = build_file_metadata(path + "#pages=2,4", pdf_mode="text")
+        finally:
+            file_utils.render_pdf_pages = original
+        text = payloads[0]["text"]
+        assert "page body 2" in text and "page body 4" in text and "page body 1" not in text
+
+        # 并行渲染结果与逐页渲染一致且保持页序
+        serial = render_pdf_pages(path, list(range(6)), dpi=36, workers=1)
+        assert all(mime == "image/png" for _, mime in serial)
+        parallel = render_pdf_pages(path, list(range(6)), dpi=36, workers=3)
+        assert serial == parallel
+        file_utils.shutdown_pdf_render_pool()
+
+
+def test_image_normalization_and_detail():
+    payloads = [{"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}},
+                {"type": "text", "text": "hello"}]
+    detailed = apply_image_detail(payloads, "low")
+    # 缓存中共享的 payload 不被修改
+    assert "detail" not in payloads[0]["image_url"]
+    assert detailed[0]["image_url"]["detail"] == "low" and detailed[1] is payloads[1]
+    assert apply_image_detail(payloads, None) is payloads
+    assert payload_size(payloads) == len("data:image/png;base64,AAAA") + len("hello")
+
+    # 无法识别的数据原样返回
+    assert normalize_image(b"not an image") == (b"not an image", None)
+
+
+def _encode(img, fmt: str, **options) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def test_normalize_image_downscales_reencodes_and_strips_exif():
+    Image = pytest.importorskip("PIL.Image")
+
+    # 透明 PNG：缩到长边 1024，转成 JPEG 时铺白底
+    png = _encode(Image.new("RGBA", (4000, 3000), (200, 30, 30, 128)), "PNG")
+    data, mime = normalize_image(png, image_max_edge=1024, image_format="JPEG", image_quality=80)
+    assert mime == "image/jpeg" and len(data) < len(png)
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.format == "JPEG" and img.size == (1024, 768) and img.mode == "RGB"
+
+    # 带方向标记（6：顺时针旋转 90°）的照片：先按 EXIF 摆正，输出不带 EXIF
+    photo = Image.new("RGB", (400, 200), (10, 120, 200))
+    photo.paste((250, 250, 0), (0, 0, 100, 200))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010F] = "TestCam"
+    jpeg = _encode(photo, "JPEG", exif=exif.tobytes())
+    data, mime = normalize_image(jpeg, image_max_edge=2048, image_format="JPEG", image_quality=85)
+    assert mime == "image/jpeg"
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.size == (200, 400)
+        assert "exif" not in img.info and not img.getexif()
+        # 原图左侧的黄色条带旋转后位于顶部
+        assert img.getpixel((100, 20))[2] < 100 and img.getpixel((100, 380))[2] > 150
+
+    # WebP 输出；没有 EXIF、无需缩放且重新编码后更大时保留原数据
+    data, mime = normalize_image(png, image_max_edge=512, image_format="WEBP", image_quality=70)
+    assert mime == "image/webp"
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.format == "WEBP" and max(img.size) == 512
+    tiny = _encode(Image.new("L", (8, 8), 0), "PNG")
+    assert normalize_image(tiny, image_max_edge=1024, image_format="JPEG") == (tiny, None)
+
+
+if __name__ == "__main__":
+    test_page_range_parsing()
+    test_text_models_never_rasterise()
+    test_pdf_text_path_and_parallel_render()
+    test_image_normalization_and_detail()
+    test_normalize_image_downscales_reencodes_and_strips_exif()
+    print("file utils tests passed")
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import threading
+
+import src.common.utils.history_store as history_store
+from src.common.utils.history_store import TaskHistoryStore, close_task_history_store, get_task_history_store
+from src.common.utils.history_utils import write_task_history
+
+
+def _record(i: int, model: str = "m1") -> dict:
+    return {
+        "task_id": f"task-{i}", "task_name": f"t{i}", "task_result": f"result {i}",
+        "create_time": f"20260101000{i:03d}", "finish_time": f"20260101001{i:03d}", "model_name": model,
+    }
+
+
+def test_concurrent_appends_are_not_lost_and_paginate():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TaskHistoryStore(os.path.join(tmp, "history.db"), batch_size=16, flush_interval=0.05)
+        try:
+            threads = [
+                threading.Thread(target=lambda k=k: [store.append(_record(k * 25 + i, f"m{k % 2}")) for i in range(25)])
+                for k in range(8)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert store.flush(timeout=5)
+
+            seen, cursor = [], None
+            while True:
+                page = store.query(cursor=cursor, limit=30)
+                seen.extend(page["items"])
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            assert len(seen) == 200
+            assert len({r["task_id"] for r in seen}) == 200
+            assert [r["seq"] for r in seen] == sorted((r["seq"] for r in seen), reverse=True)
+
+            assert len(store.query(model="m1", limit=500)["items"]) == 100
+            assert store.get("task-7")["task_result"] == "result 7"
+            assert store.get("missing") is None
+        finally:
+            store.close()
+
+
+def test_legacy_json_is_migrated():
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, "task_history.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([_record(1), _record(2, "m2")], f)
+        store = TaskHistoryStore(os.path.join(tmp, "history.db"), legacy_file=legacy)
+        try:
+            assert not os.path.exists(legacy)
+            page = store.query(since="20260101001002")
+            assert [r["task_id"] for r in page["items"]] == ["task-2"]
+        finally:
+            store.close()
+
+
+def test_close_releases_readers_and_ignores_late_writes():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TaskHistoryStore(os.path.join(tmp, "history.db"), flush_interval=0.01)
+        store.append(_record(1))
+        assert store.flush(timeout=5)
+        # 其他线程打开的读连接
+        reader = threading.Thread(target=lambda: store.get("task-1"))
+        reader.start()
+        reader.join()
+        assert store.get("task-1") is not None and len(store._readers) == 2
+
+        original = history_store._store_instance, history_store._store_closed
+        history_store._store_instance = store
+        try:
+            close_task_history_store()
+            assert store._closed and not store._readers
+            # 服务退出后仍在收尾的任务：不报错，也不再创建新的实例
+            write_task_history(_record(2))
+            store.append(_record(3))
+            try:
+                get_task_history_store()
+                raise AssertionError("关闭后不应创建新的实例")
+            except RuntimeError:
+                pass
+            assert history_store._store_instance is None
+        finally:
+            history_store._store_instance, history_store._store_closed = original
+
+
+if __name__ == "__main__":
+    test_concurrent_appends_are_not_lost_and_paginate()
+    test_legacy_json_is_migrated()
+    test_close_releases_readers_and_ignores_late_writes()
+    print("history_store tests passed")
@@ -0,0 +1,84 @@
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from src.common.utils.log_sink import LogSink, DEBUG, INFO, ERROR
+
+
+def test_records_are_batched_filtered_and_rendered_off_thread():
+    stream = io.StringIO()
+    sink = LogSink(console_mode="plain", level=INFO, file_path=None, max_chars=20, stream=stream)
+    try:
+        start = time.perf_counter()
+        for i in range(2000):
+            sink.emit(INFO, "task_1", "line", f"line {i}\nsecond", "\033[34m")
+        sink.emit(DEBUG, "task_1", "line", "hidden reasoning")
+        sink.emit(ERROR, "task_1", "line", "x" * 100)
+        # 调用方只入队，不做 I/O
+        assert time.perf_counter() - start < 1.0
+        assert sink.flush(timeout=5)
+    finally:
+        sink.close()
+    output = stream.getvalue()
+    assert "│ line 0\n│ second\n" in output
+    assert "hidden reasoning" not in output
+    assert "\033[" not in output
+    assert "（共 100 字符）" in output
+
+
+def test_off_mode_skips_queue_and_file_gets_json_lines():
+    off = LogSink(console_mode="off", file_path=None)
+    off.emit(ERROR, "task_1", "line", "nothing")
+    assert off._writer is None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mmcp.log")
+        sink = LogSink(console_mode="off", file_path=path)
+        sink.emit(INFO, "task_2", "line", "\033[31mhello\033[0m")
+        sink.close()
+        with open(path, encoding="utf-8") as f:
+            record = json.loads(f.readline())
+        assert record["task_id"] == "task_2" and record["text"] == "hello" and record["level"] == "INFO"
+
+
+class _SlowStream(io.StringIO):
+    def write(self, s):
+        time.sleep(0.002)
+        return super().write(s)
+
+
+def test_dropped_records_are_all_reported():
+    stream = _SlowStream()
+    sink = LogSink(console_mode="plain", level=INFO, file_path=None, queue_size=8, batch_size=4, stream=stream)
+    per_thread, thread_count = 500, 8
+
+    def produce():
+        for _ in range(per_thread):
+            sink.emit(INFO, "task_1", "line", "record")
+
+    try:
+        threads = [threading.Thread(target=produce) for _ in range(thread_count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert sink.flush(timeout=10)
+    finally:
+        sink.close()
+    output = stream.getvalue()
+    written = output.count("│ record")
+    dropped = sum(int(n) for n in re.findall(r"丢弃 (\d+) 条", output))
+    assert dropped > 0
+    # 写出的与报告丢弃的条数之和等于提交的条数
+    assert written + dropped == per_thread * thread_count
+
+
+if __name__ == "__main__":
+    test_records_are_batched_filtered_and_rendered_off_thread()
+    test_off_mode_skips_queue_and_file_gets_json_lines()
+    test_dropped_records_are_all_reported()
+    print("log_sink tests passed")
@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+from src.common.utils.log_store import TaskLogStore
+
+
+def _entry(content: str, log_type: str = "tool_result") -> dict:
+    return {"timestamp": 0, "type": log_type, "content": content}
+
+
+def test_ring_buffer_and_streaming_accounting():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TaskLogStore(spill_dir=tmp, memory_limit=10 ** 9, max_entries=5, max_completed=10)
+        for i in range(8):
+            store.append("task_a", _entry(f"line {i}"))
+        logs = store.get("task_a")
+        assert [e["content"] for e in logs] == [f"line {i}" for i in range(3, 8)]
+        assert store.stats()["dropped_entries"] == 3
+
+        stream = store.append("task_a", _entry("", "response"))
+        before = store.stats()["memory_bytes"]
+        store.append_content("task_a", stream, "x" * 100)
+        assert store.stats()["memory_bytes"] == before + 100
+        store.set_content("task_a", stream, "done")
+        assert store.stats()["memory_bytes"] == before + 4
+
+
+def test_completed_tasks_spill_to_disk_and_load_lazily():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TaskLogStore(spill_dir=tmp, memory_limit=5000, max_entries=100, max_completed=10)
+        for task in range(4):
+            for i in range(5):
+                store.append(f"task_{task}", _entry(f"{task}-{i}-" + "y" * 300))
+            store.finish(f"task_{task}")
+        store.flush()
+        stats = store.stats()
+        assert stats["memory_bytes"] <= 5000
+        assert stats["spilled_tasks"] >= 1
+        assert os.path.exists(os.path.join(tmp, "task_0.jsonl.gz"))
+        # 落盘的任务按需从磁盘读取，内容完整
+        assert [e["content"][:4] for e in store.get("task_0")] == [f"0-{i}-" for i in range(5)]
+        assert "task_0" not in store
+        assert store.get("../etc/passwd") == []
+
+
+def test_running_tasks_are_trimmed_when_over_limit():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TaskLogStore(spill_dir=tmp, memory_limit=3000, max_entries=100, max_completed=10)
+        for i in range(20):
+            store.append("task_running", _entry("z" * 300))
+        stats = store.stats()
+        assert stats["memory_bytes"] <= 3000
+        assert stats["running_tasks"] == 1
+        assert store.get("task_running")
+
+
+if __name__ == "__main__":
+    test_ring_buffer_and_streaming_accounting()
+    test_completed_tasks_spill_to_disk_and_load_lazily()
+    test_running_tasks_are_trimmed_when_over_limit()
+    print("log_store tests passed")
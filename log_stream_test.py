@@ -0,0 +1,91 @@
+import asyncio
+import json
+import tempfile
+import threading
+import time
+
+import src.user.web.log_stream as log_stream
+from src.common.utils.log_store import TaskLogStore
+from src.user.web.log_stream import stream_task_logs
+
+
+def _entry(content: str, partial: bool = False) -> dict:
+    entry = {"timestamp": 0, "type": "response", "content": content}
+    if partial:
+        entry["partial"] = True
+    return entry
+
+
+def _parse(events):
+    parsed = []
+    for event in events:
+        lines = dict(line.split(": ", 1) for line in event.strip().split("\n") if not line.startswith(":"))
+        if "event" in lines:
+            parsed.append((lines["event"], json.loads(lines["data"])))
+    return parsed
+
+
+def test_since_cursor_returns_new_and_changed_entries():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TaskLogStore(spill_dir=tmp)
+        store.append("task_a", _entry("header"))
+        stream = store.append("task_a", _entry("", partial=True))
+        cursor = max(e["rev"] for e in store.get("task_a"))
+        assert store.get("task_a", cursor) == []
+
+        store.append_content("task_a", stream, "hello")
+        changed = store.get("task_a", cursor)
+        assert [(e["seq"], e["content"], e.get("partial")) for e in changed] == [(2, "hello", True)]
+
+        store.set_content("task_a", stream, "hello world", final=True)
+        store.append("task_a", _entry("next"))
+        changed = store.get("task_a", changed[-1]["rev"])
+        assert [(e["seq"], e.get("partial")) for e in changed] == [(2, None), (3, None)]
+
+
+def test_stream_pushes_updates_and_ends_when_task_finishes():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TaskLogStore(spill_dir=tmp)
+        store.append("task_s", _entry("header"))
+
+        def produce():
+            time.sleep(0.2)
+            stream = store.append("task_s", _entry("", partial=True))
+            for i in range(200):
+                store.append_content("task_s", stream, f"{i} ")
+            store.set_content("task_s", stream, stream["content"], final=True)
+            store.finish("task_s")
+
+        async def consume():
+            events = []
+            async for event in stream_task_logs(store, "task_s"):
+                events.append(event)
+            return events
+
+        original = log_stream.LOG_STREAM_MIN_INTERVAL
+        log_stream.LOG_STREAM_MIN_INTERVAL = 0.05
+        producer = threading.Thread(target=produce)
+        producer.start()
+        try:
+            events = _parse(asyncio.run(asyncio.wait_for(consume(), timeout=10)))
+        finally:
+            producer.join()
+            log_stream.LOG_STREAM_MIN_INTERVAL = original
+
+        assert events[-1][0] == "end"
+        merged = {}
+        for name, data in events:
+            if name == "log":
+                for entry in data:
+                    merged[entry["seq"]] = entry
+        assert merged[1]["content"] == "header"
+        assert merged[2]["content"].startswith("0 1 2") and "partial" not in merged[2]
+        # 200 次增量被合并成少量推送
+        assert len(events) < 50
+        assert store.stats()["subscribers"] == 0
+
+
+if __name__ == "__main__":
+    test_since_cursor_returns_new_and_changed_entries()
+    test_stream_pushes_updates_and_ends_when_task_finishes()
+    print("log_stream tests passed")
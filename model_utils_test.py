@@ -0,0 +1,177 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+from openai import BadRequestError
+
+import src.common.utils.model_utils as model_utils
+from src.common.utils import TaskLogger
+from src.common.utils.task_logger import TASK_LOG_STORAGE
+from src.common.utils.model_utils import (
+    close_openai_clients, get_openai_client, invalidate_openai_client, stream_chat_completion
+)
+from src.config.settings import API_KEYS, BASE_URL
+
+FIRST_TOKEN_DELAY = 0.05
+
+
+def _chunk(content=None, reasoning=None, tool_calls=None, finish_reason=None, usage=None):
+    delta = SimpleNamespace(content=content, reasoning_content=reasoning, tool_calls=tool_calls)
+    choices = [SimpleNamespace(delta=delta, finish_reason=finish_reason)] if usage is None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def _tool_delta(index, call_id=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+CHUNKS = [
+    _chunk(reasoning="Let me "),
+    _chunk(reasoning="think."),
+    _chunk(content="Checking "),
+    _chunk(content="files."),
+    _chunk(tool_calls=[_tool_delta(0, "call_a", "fs__read", '{"pa')]),
+    _chunk(tool_calls=[_tool_delta(1, "call_b", "fs__list", "")]),
+    _chunk(tool_calls=[_tool_delta(0, arguments='th": "a.txt"}'), _tool_delta(1, arguments="{}")]),
+    _chunk(finish_reason="tool_calls"),
+]
+
+
+class _FakeCompletions:
+    def __init__(self, chunks, reject_stream_options=False):
+        self.chunks = chunks
+        self.reject_stream_options = reject_stream_options
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.reject_stream_options and "stream_options" in kwargs:
+            request = httpx.Request("POST", "http://test/chat/completions")
+            raise BadRequestError("stream_options not supported", response=httpx.Response(400, request=request),
+                                  body=None)
+        return self._stream()
+
+    async def _stream(self):
+        await asyncio.sleep(FIRST_TOKEN_DELAY)
+        for chunk in self.chunks:
+            yield chunk
+
+
+def _client(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_stream_assembles_message_and_reports_deltas():
+    usage = SimpleNamespace(prompt_tokens=12, completion_tokens=7, total_tokens=19)
+    completions = _FakeCompletions(CHUNKS + [_chunk(usage=usage)])
+    logger = TaskLogger("stream-assembler-test", "t")
+    deltas = []
+
+    def on_delta(log_type, delta):
+        deltas.append((log_type, delta))
+        logger.log_stream_delta(log_type, delta)
+
+    async def run():
+        start = time.perf_counter()
+        response, ttft = await stream_chat_completion(_client(completions), on_delta=on_delta, model="m", messages=[])
+        return response, ttft, time.perf_counter() - start
+
+    response, ttft, elapsed = asyncio.run(run())
+    message = response.choices[0].message
+    assert message.content == "Checking files."
+    assert message.reasoning_content == "Let me think."
+    assert [(c.id, c.function.name, c.function.arguments) for c in message.tool_calls] == [
+        ("call_a", "fs__read", '{"path": "a.txt"}'),
+        ("call_b", "fs__list", "{}"),
+    ]
+    assert response.choices[0].finish_reason == "tool_calls"
+    assert response.usage is usage
+    assert FIRST_TOKEN_DELAY <= ttft <= elapsed
+    assert deltas == [("reasoning", "Let me "), ("reasoning", "think."),
+                      ("response", "Checking "), ("response", "files.")]
+    assert completions.calls[0]["stream_options"] == {"include_usage": True}
+    # 增量已实时写入任务日志（流式条目尚未收尾）
+    logs = TASK_LOG_STORAGE.get("stream-assembler-test")
+    assert [(e["type"], e["content"], e.get("partial")) for e in logs] == [
+        ("reasoning", "Let me think.", True), ("response", "Checking files.", True)]
+    logger.close_streams()
+    assert not any(e.get("partial") for e in TASK_LOG_STORAGE.get("stream-assembler-test"))
+
+
+def test_missing_usage_and_rejected_stream_options():
+    completions = _FakeCompletions(CHUNKS, reject_stream_options=True)
+    model_utils._no_stream_usage_models.discard("strict-model")
+
+    async def run():
+        return await stream_chat_completion(_client(completions), model="strict-model", messages=[])
+
+    try:
+        response, _ = asyncio.run(run())
+        # 不支持 stream_options 时去掉后重试，且不伪造用量
+        assert response.usage is None
+        assert response.choices[0].message.content == "Checking files."
+        assert ["stream_options" in call for call in completions.calls] == [True, False]
+
+        # 之后的请求直接不带 stream_options
+        asyncio.run(run())
+        assert "stream_options" not in completions.calls[-1] and len(completions.calls) == 3
+    finally:
+        model_utils._no_stream_usage_models.discard("strict-model")
+
+
+class _StubOpenAI:
+    """替代 AsyncOpenAI：只记录构造参数"""
+    created = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.closed = False
+        _StubOpenAI.created.append(self)
+
+    def is_closed(self):
+        return self.closed
+
+
+def test_clients_are_shared_and_invalidated():
+    models = {"client-a": ("http://one", "k1"), "client-b": ("http://one", "k1"), "client-c": ("http://two", "k2")}
+    original = model_utils.AsyncOpenAI
+    model_utils.AsyncOpenAI = _StubOpenAI
+    _StubOpenAI.created.clear()
+    for name, (url, key) in models.items():
+        BASE_URL[name], API_KEYS[name] = url, key
+    try:
+        a, b, c = (get_openai_client(name) for name in models)
+        # 相同 (base_url, api_key) 复用同一客户端，且共用一个 httpx 连接池
+        assert a is b and a is not c and len(_StubOpenAI.created) == 2
+        assert a.kwargs["http_client"] is c.kwargs["http_client"]
+        assert get_openai_client("client-a") is a
+
+        # 仍有其他模型使用时保留
+        invalidate_openai_client("client-a")
+        assert ("http://one", "k1") in model_utils._client_registry
+        invalidate_openai_client("client-b")
+        assert ("http://one", "k1") not in model_utils._client_registry
+
+        # 修改 api_key 后换用新客户端，旧客户端从注册表移除
+        API_KEYS["client-c"] = "k3"
+        new_c = get_openai_client("client-c")
+        assert new_c is not c and new_c.kwargs["api_key"] == "k3"
+        assert ("http://two", "k2") not in model_utils._client_registry
+
+        http_client = new_c.kwargs["http_client"]
+        asyncio.run(close_openai_clients())
+        assert not model_utils._client_registry and not model_utils._model_client_keys
+        assert http_client.is_closed
+    finally:
+        model_utils.AsyncOpenAI = original
+        for name in models:
+            BASE_URL.pop(name, None)
+            API_KEYS.pop(name, None)
+
+
+if __name__ == "__main__":
+    test_stream_assembles_message_and_reports_deltas()
+    test_missing_usage_and_rejected_stream_options()
+    test_clients_are_shared_and_invalidated()
+    print("model_utils tests passed")
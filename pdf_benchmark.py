@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import time
+
+import src.common.utils.file_utils as file_utils
+from src.common.utils.file_utils import build_file_metadata, render_pdf_pages, shutdown_pdf_render_pool
+from src.config.settings import PDF_DPI, PDF_RENDER_WORKERS, IMAGE_MAX_EDGE, IMAGE_FORMAT, IMAGE_QUALITY
+
+PAGE_COUNT = 100
+LINES_PER_PAGE = 40
+
+
+def make_document(path: str) -> None:
+    """生成 PAGE_COUNT 页的测试文档：每页若干行文字加几个矩形"""
+    doc = file_utils.fitz.open()
+    for page_no in range(PAGE_COUNT):
+        page = doc.new_page()
+        for line in range(LINES_PER_PAGE):
+            page.insert_text((50, 60 + line * 18), f"Page {page_no + 1} line {line + 1}: lorem ipsum dolor sit amet")
+        for i in range(4):
+            page.draw_rect(file_utils.fitz.Rect(50 + i * 120, 780, 150 + i * 120, 820), color=(0, 0, 1), fill=(0.8, 0.8, 1))
+    doc.save(path)
+    doc.close()
+
+
+def legacy_render(path: str) -> list:
+    """改造前的方式：逐页 2 倍缩放渲染，并把每页写一份 debug_page_N.png"""
+    images = []
+    doc = file_utils.fitz.open(path)
+    for page_num in range(len(doc)):
+        pix = doc.load_page(page_num).get_pixmap(matrix=file_utils.fitz.Matrix(2.0, 2.0))
+        images.append(pix.tobytes("png"))
+        pix.save(f"debug_page_{page_num}.png")
+    doc.close()
+    return images
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    if file_utils.fitz is None:
+        print("需要安装 PyMuPDF：pip install pymupdf")
+        sys.exit(1)
+    # 可通过第一个参数指定并行渲染的进程数，默认 PDF_RENDER_WORKERS
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else PDF_RENDER_WORKERS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.pdf")
+        make_document(path)
+        pages = list(range(PAGE_COUNT))
+
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            legacy_time, legacy_images = timed(legacy_render, path)
+        finally:
+            os.chdir(cwd)
+        serial_time, serial_images = timed(render_pdf_pages, path, pages, PDF_DPI, 1)
+        # 首次提交包含进程池启动，单独计一次预热
+        render_pdf_pages(path, pages[:workers * 2], PDF_DPI, workers)
+        parallel_time, parallel_images = timed(render_pdf_pages, path, pages, PDF_DPI, workers)
+        encoded_time, encoded_images = timed(render_pdf_pages, path, pages, PDF_DPI, workers, image_options={
+            "image_max_edge": IMAGE_MAX_EDGE, "image_format": IMAGE_FORMAT, "image_quality": IMAGE_QUALITY})
+        text_time, text_payloads = timed(build_file_metadata, path, pdf_mode="text", pdf_max_pages=PAGE_COUNT)
+        shutdown_pdf_render_pool()
+
+    def size_mb(images):
+        # 旧方式返回 PNG 数据，新方式返回 (图片数据, MIME 类型)
+        return sum(len(i if isinstance(i, bytes) else i[0]) for i in images) / 1024 / 1024
+
+    print(f"{PAGE_COUNT}-page PDF, {workers} render workers, {os.cpu_count()} CPUs")
+    print(f"{'legacy':<10} {legacy_time:7.2f}s  {size_mb(legacy_images):7.1f} MB png  (zoom 2.0, serial, debug files)")
+    print(f"{'serial':<10} {serial_time:7.2f}s  {size_mb(serial_images):7.1f} MB png  ({PDF_DPI} dpi, no re-encode)")
+    print(f"{'parallel':<10} {parallel_time:7.2f}s  {size_mb(parallel_images):7.1f} MB png  "
+          f"(x{serial_time / parallel_time:.1f} vs serial)")
+    print(f"{'encoded':<10} {encoded_time:7.2f}s  {size_mb(encoded_images):7.1f} MB       "
+          f"({IMAGE_FORMAT} q{IMAGE_QUALITY}, max edge {IMAGE_MAX_EDGE}; needs Pillow)")
+    print(f"{'text':<10} {text_time:7.2f}s  {len(text_payloads[0]['text']) / 1024:7.1f} KB text  (LLM models, no raster)")
+
+
+if __name__ == "__main__":
+    main()
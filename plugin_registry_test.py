@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+
+from src.plugins.plugin_registry import PluginRegistryStore
+
+
+def _write_yaml(path: str, desc: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"desc: \"{desc}\"\ndir_path: plugin_collection/demo/\nfunctions: {{}}\n")
+
+
+def _make_store(root: str) -> PluginRegistryStore:
+    return PluginRegistryStore(os.path.join(root, "registry"), os.path.join(root, "plugin_collection"),
+                               os.path.join(root, "tool.yaml"))
+
+
+def test_registry_seed_register_and_reload():
+    root = tempfile.mkdtemp()
+    with open(os.path.join(root, "tool.yaml"), "w", encoding="utf-8") as f:
+        f.write("mock:\n  desc: \"seed\"\n  dir_path: plugin_collection/mock/\n")
+    plugin_dir = os.path.join(root, "plugin_collection", "demo")
+    os.makedirs(plugin_dir)
+    source = os.path.join(plugin_dir, "demo.yaml")
+    _write_yaml(source, "v1")
+
+    # 首次加载从 tool.yaml 迁移
+    store = _make_store(root)
+    assert store.load() == {"mock": {"desc": "seed", "dir_path": "plugin_collection/mock/"}}
+
+    manifests = store.register("demo")
+    assert list(manifests) == ["mock", "demo"]
+    assert manifests["demo"]["desc"] == "v1"
+
+    # 重启后直接读取编译缓存；来源 YAML 修改后按 mtime 重新编译
+    assert _make_store(root).load()["demo"]["desc"] == "v1"
+    _write_yaml(source, "v2")
+    os.utime(source, ns=(0, os.stat(source).st_mtime_ns + 10 ** 9))
+    assert _make_store(root).load()["demo"]["desc"] == "v2"
+
+    assert list(store.unregister("demo")) == ["mock"]
+    with open(os.path.join(root, "registry", "index.json"), encoding="utf-8") as f:
+        assert json.load(f) == {"plugins": ["mock"]}
+    assert list(_make_store(root).load()) == ["mock"]
+
+
+if __name__ == "__main__":
+    test_registry_seed_register_and_reload()
+    print("plugin_registry tests passed")
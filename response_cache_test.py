@@ -0,0 +1,106 @@
+import asyncio
+import os
+import tempfile
+import time
+
+import src.mcp_server.task_executor as task_executor
+from src.common.models import Task
+from src.common.utils import TaskLogger
+from src.common.utils.model_utils import build_chat_response
+from src.common.utils.response_cache import ResponseCache, make_cache_key
+
+MODEL = "response-cache-test-model"
+
+
+def _cache(tmp: str, ttl: float = 3600, max_entries: int = 100, max_bytes: int = 10 ** 6) -> ResponseCache:
+    return ResponseCache(os.path.join(tmp, "cache"), ttl, max_entries, max_bytes)
+
+
+def test_expired_entry_is_a_miss():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = _cache(tmp, ttl=0.05)
+        cache.put("k", {"message": {"content": "hi"}})
+        assert cache.get("k") == {"message": {"content": "hi"}}
+        time.sleep(0.1)
+        assert cache.get("k") is None
+        assert cache.stats() == {"entries": 0, "bytes": 0, "hits": 1, "misses": 1}
+        assert not os.path.exists(os.path.join(tmp, "cache", "k.json"))
+
+
+def test_eviction_by_entry_count_and_bytes():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = _cache(tmp, max_entries=2)
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        # 读取 a 后 b 成为最久未使用的条目
+        cache.get("a")
+        cache.put("c", {"v": 3})
+        assert cache.get("b") is None
+        assert cache.get("a") == {"v": 1} and cache.get("c") == {"v": 3}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = _cache(tmp, max_bytes=250)
+        for key in ("a", "b", "c"):
+            cache.put(key, {"v": key * 100})
+        stats = cache.stats()
+        assert stats["bytes"] <= 250 and stats["entries"] == 2
+        assert cache.get("a") is None and cache.get("c") is not None
+
+
+def test_index_is_rebuilt_after_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = _cache(tmp)
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        restarted = _cache(tmp)
+        assert restarted.stats()["entries"] == 2
+        assert restarted.stats()["bytes"] == cache.stats()["bytes"]
+        assert restarted.get("b") == {"v": 2}
+        # 重启后仍按上限淘汰
+        assert _cache(tmp, max_entries=1).stats()["entries"] == 1
+
+
+def test_hit_skips_client_and_use_cache_false_bypasses():
+    sent = []
+
+    class _Completions:
+        async def create(self, **kwargs):
+            sent.append(kwargs)
+            return build_chat_response({"content": f"reply {len(sent)}"}, finish_reason="stop")
+
+    class _Client:
+        chat = type("Chat", (), {"completions": _Completions()})()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = _cache(tmp)
+        originals = (task_executor.get_openai_client, task_executor.get_response_cache)
+        task_executor.get_openai_client = lambda model_name: _Client()
+        task_executor.get_response_cache = lambda: cache
+        try:
+            def run(use_cache):
+                task = Task(task_name="t", model=MODEL, task_content="hello", use_cache=use_cache)
+                task.session_history = [{"role": "user", "content": "hello"}]
+                logger = TaskLogger("response-cache-test", "t")
+                hits = []
+                logger.log_cache_hit = hits.append
+                response = asyncio.run(task_executor.model_call(task, logger))
+                return response.choices[0].message.content, hits
+
+            assert run(True) == ("reply 1", [])
+            content, hits = run(True)
+            assert content == "reply 1" and len(sent) == 1
+            assert hits == [make_cache_key(MODEL, sent[0]["messages"], None)]
+
+            # 任务关闭缓存时既不读也不写
+            assert run(False) == ("reply 2", [])
+            assert cache.stats()["entries"] == 1 and cache.stats()["hits"] == 1
+        finally:
+            task_executor.get_openai_client, task_executor.get_response_cache = originals
+
+
+if __name__ == "__main__":
+    test_expired_entry_is_a_miss()
+    test_eviction_by_entry_count_and_bytes()
+    test_index_is_rebuilt_after_restart()
+    test_hit_skips_client_and_use_cache_false_bypasses()
+    print("response_cache tests passed")
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional, Set
 
 
 class Model:
@@ -8,9 +8,7 @@ class Model:
         self,
         name: str,
         model_type: str = "LLM",
-        state: str = "idle",
-        task_name: Optional[str] = None,
-        task_id: Optional[str] = None
+        max_concurrency: int = 1
     ):
         if not name.strip():
             raise ValueError("模型名（name）不能为空")
@@ -18,34 +16,68 @@ class Model:
         if model_type not in self.VALID_TYPES:
             raise ValueError(f"模型类型必须是 {self.VALID_TYPES} 中的一种，当前值：{model_type}")
         self.model_type = model_type
-        self._state = None
-        self.state = state
+        self._max_concurrency = 1
+        self.max_concurrency = max_concurrency
 
-        self.task_name = task_name
-        self.task_id = task_id
+        # 并发槽位：当前占用槽位的任务ID，及各任务的名称/状态
+        self.active_task_ids: Set[str] = set()
+        self._task_names: Dict[str, str] = {}
+        self._task_states: Dict[str, str] = {}
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    @max_concurrency.setter
+    def max_concurrency(self, value: int) -> None:
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f"模型并发数（max_concurrency）必须是正整数，当前值：{value}")
+        self._max_concurrency = value
 
     @property
     def state(self) -> str:
-        return self._state
+        """汇总状态：无任务为 idle，任一任务在思考为 think，否则为 wait"""
+        if not self.active_task_ids:
+            return "idle"
+        if "think" in self._task_states.values():
+            return "think"
+        return "wait"
+
+    def has_free_slot(self) -> bool:
+        return len(self.active_task_ids) < self.max_concurrency
+
+    def set_task_state(self, task_id: str, value: str) -> None:
+        """更新某个已绑定任务的状态"""
+        if value not in self.VALID_STATES or value == "idle":
+            raise ValueError(f"任务槽位状态必须是 think 或 wait，当前值：{value}")
+        if task_id in self.active_task_ids:
+            self._task_states[task_id] = value
 
-    @state.setter
-    def state(self, value: str) -> None:
-        if value not in self.VALID_STATES:
-            raise ValueError(f"模型状态必须是 {self.VALID_STATES} 中的一种，当前值：{value}")
-        self._state = value
+    def bind_task(self, task_id: str, task_name: str) -> bool:
+        """占用一个槽位绑定任务，槽位已满时返回 False"""
+        if task_id in self.active_task_ids:
+            return True
+        if not self.has_free_slot():
+            return False
+        self.active_task_ids.add(task_id)
+        self._task_names[task_id] = task_name
+        self._task_states[task_id] = "think"
+        return True
 
-    def bind_task(self, task_id: str, task_name: str) -> None:
-        """绑定当前执行的任务"""
-        self.task_id = task_id
-        self.task_name = task_name
+    def unbind_task(self, task_id: str) -> None:
+        """解绑任务，释放槽位"""
+        self.active_task_ids.discard(task_id)
+        self._task_names.pop(task_id, None)
+        self._task_states.pop(task_id, None)
 
-    def unbind_task(self) -> None:
-        """解绑任务"""
-        self.task_id = None
-        self.task_name = None
+    def get_active_tasks(self) -> List[Dict]:
+        return [
+            {"task_id": task_id, "task_name": self._task_names.get(task_id), "state": self._task_states.get(task_id)}
+            for task_id in self.active_task_ids
+        ]
 
     def __repr__(self) -> str:
         return (
-            f"Model(name={self.name!r}, model_type={self.type!r}, state={self.state!r}, "
-            f"task_id={self.task_id!r})"
+            f"Model(name={self.name!r}, model_type={self.model_type!r}, state={self.state!r}, "
+            f"slots={len(self.active_task_ids)}/{self.max_concurrency})"
         )
\ No newline at end of file
@@ -19,7 +19,8 @@ class Task:
         create_time: Optional[str] = None,
         session_history: Optional[List[Dict]] = None,
         state: str = "waiting",
-        finish_time: Optional[str] = None
+        finish_time: Optional[str] = None,
+        use_cache: Optional[bool] = None
     ):
         """
         初始化任务实例
@@ -32,6 +33,7 @@ class Task:
         :param session_history: 会话历史（可选，默认空列表）
         :param state: 任务状态（可选，默认waiting，仅支持VALID_STATES）
         :param finish_time: 完成时间（可选，任务完成后赋值）
+        :param use_cache: 是否使用模型响应缓存（可选，None 表示跟随全局配置）
         """
         # 必选属性（无默认值，强制校验非空）
         if not task_name.strip():
@@ -59,6 +61,16 @@ class Task:
         self.create_time = create_time  # 由MCP服务器调用init_task时赋值
         self.finish_time = finish_time
         self.file_path = file_path
+        self.use_cache = use_cache
+        # 已解析的工具 schema 及其对应的插件配置版本（插件变更后重新解析）
+        self._tool_schemas: Optional[List[Dict]] = None
+        self._tool_schemas_version: Optional[int] = None
+        # 上下文压缩时对较早消息的总结：{"count": 已总结的消息数, "summary": 总结内容}
+        self.context_summary: Optional[Dict] = None
+        # 消息/工具列表的 token 计数缓存（见 token_counter），未变化的消息不重复计数
+        self.token_cache: Dict[int, tuple] = {}
+        # 附件大小：[{"file": 文件名, "file_bytes": 原文件大小, "payload_bytes": 实际发送的大小}]，由 init_task 填写
+        self.attachment_sizes: List[Dict] = []
         # 会话历史：处理可变默认值问题（避免多个实例共享同一列表）
         self.session_history = session_history if isinstance(session_history, list) else []
 
@@ -85,16 +97,17 @@ class Task:
         """
         if not isinstance(record, dict) or "role" not in record or "content" not in record:
             raise ValueError("会话记录必须是包含role和content字段的字典")
-        # 可扩展：会话历史最大条数限制（从配置读取）
-        # from config.settings import SESSION_MAX_SIZE
-        # if len(self.session_history) >= SESSION_MAX_SIZE:
-        #     self.session_history.pop(0)  # 移除最早的记录
+        # 历史完整保留；发给模型前由 context_compactor 按 token 预算压缩，并限制在 SESSION_MAX_SIZE 条以内
         self.session_history.append(record)
 
     def get_tool_info(self):
         if self.available_tools:
-            from src.plugins.plugin_manager import get_plugin_tool_info
-            return get_plugin_tool_info(self.available_tools)
+            from src.plugins.plugin_manager import get_plugin_tool_info, get_registry_version
+            version = get_registry_version()
+            if self._tool_schemas_version != version:
+                self._tool_schemas = get_plugin_tool_info(self.available_tools)
+                self._tool_schemas_version = version
+            return self._tool_schemas
         else:
             return None
 
@@ -113,7 +126,24 @@ class Task:
             "available_tools": self.available_tools,
             "session_history": self.session_history,
             "state": self.state,
-            "finish_time": self.finish_time
+            "finish_time": self.finish_time,
+            "use_cache": self.use_cache
+        }
+
+    def to_summary(self) -> Dict:
+        """
+        轻量摘要（不含会话历史与工具列表），用于看板等频繁轮询的接口
+        """
+        return {
+            "task_id": self.task_id,
+            "task_name": self.task_name,
+            "model": self.model,
+            "create_time": self.create_time,
+            "state": self.state,
+            "finish_time": self.finish_time,
+            "use_cache": self.use_cache,
+            "tool_count": len(self.available_tools or []),
+            "history_length": len(self.session_history),
         }
 
     def __repr__(self) -> str:
@@ -3,7 +3,7 @@ from typing import Optional, Dict
 
 
 class ToolRecord:
-    VALID_STATES = ("executing", "completed")
+    VALID_STATES = ("executing", "completed", "timeout")
 
     def __init__(
         self,
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from src.common.utils.file_utils import build_file_metadata, get_render_settings, split_page_spec
+from src.config.settings import ATTACHMENT_PAYLOAD_CACHE_DIR, ATTACHMENT_PAYLOAD_CACHE_BYTES
+
+_CHUNK_SIZE = 1024 * 1024
+# 文件哈希记录的最大条数（按最近使用淘汰）
+_MAX_HASH_ENTRIES = 4096
+
+
+def _safe_filename(filename: Optional[str]) -> str:
+    """去掉客户端传来的目录部分，只保留文件名"""
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    return name if name not in ("", ".", "..") else "upload"
+
+
+def store_upload(fileobj: BinaryIO, filename: str, upload_dir: str) -> Tuple[str, str, bool]:
+    """
+    按内容 SHA-256 保存上传文件（边写边算哈希），相同内容只保留一份：
+    文件保存为 <upload_dir>/<sha256>/<原文件名>，同一内容换了文件名时硬链接到已保存的文件
+    :return: (sha256, 文件路径, 内容是否已存在)
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    name = _safe_filename(filename)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = fileobj.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+        sha256 = digest.hexdigest()
+        content_dir = os.path.join(upload_dir, sha256)
+        os.makedirs(content_dir, exist_ok=True)
+        path = os.path.join(content_dir, name)
+        saved = os.listdir(content_dir)
+        if name in saved:
+            os.remove(tmp_path)
+        elif saved:
+            try:
+                os.link(os.path.join(content_dir, saved[0]), path)
+                os.remove(tmp_path)
+            except OSError:
+                # 文件系统不支持硬链接时另存一份
+                os.replace(tmp_path, path)
+        else:
+            os.replace(tmp_path, path)
+        return sha256, path, bool(saved)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _is_cacheable(payloads: List[Dict]) -> bool:
+    """渲染失败时 build_file_metadata 返回错误提示文本，这类结果不缓存"""
+    return not any(
+        p.get("type") == "text" and str(p.get("text", "")).lstrip().startswith(("[System Error", "[Error"))
+        for p in payloads
+    )
+
+
+def _payload_size(payloads: List[Dict]) -> int:
+    return sum(len(json.dumps(p, ensure_ascii=False)) for p in payloads)
+
+
+class AttachmentPayloadCache:
+    """
+    附件编码结果缓存：键为 (内容 SHA-256, 模型类型, 渲染参数)
+    内存中按字节数做 LRU，同时写一份到磁盘，重启后无需重新渲染；同一个键并发请求时只编码一次
+    返回的列表中的条目在任务间共享，调用方不能原地修改
+    """
+
+    def __init__(self, cache_dir: str = ATTACHMENT_PAYLOAD_CACHE_DIR, max_bytes: int = ATTACHMENT_PAYLOAD_CACHE_BYTES,
+                 max_hash_entries: int = _MAX_HASH_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru: "OrderedDict[Tuple, Tuple[List[Dict], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # 正在编码的键 -> 锁（同键请求排队等待第一个完成）
+        self._building: Dict[Tuple, threading.Lock] = {}
+        # (路径, 大小, mtime) -> sha256，未改动的文件不重复计算哈希；按最近使用保留 max_hash_entries 条
+        self.max_hash_entries = max_hash_entries
+        self._hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+
+    def file_hash(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            sha256 = self._hashes.get(key)
+            if sha256 is not None:
+                self._hashes.move_to_end(key)
+                return sha256
+        # 计算哈希时不持有锁
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        with self._lock:
+            self._hashes[key] = sha256
+            self._hashes.move_to_end(key)
+            while len(self._hashes) > self.max_hash_entries:
+                self._hashes.popitem(last=False)
+        return sha256
+
+    def _disk_path(self, key: Tuple) -> str:
+        sha256, model_type, settings = key
+        settings_hash = hashlib.sha256(settings.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{sha256}_{model_type}_{settings_hash}.json")
+
+    def _get_memory(self, key: Tuple) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return None
+            self._lru.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _put_memory(self, key: Tuple, payloads: List[Dict]) -> None:
+        size = _payload_size(payloads)
+        with self._lock:
+            if key in self._lru:
+                return
+            self._lru[key] = (payloads, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._lru) > 1:
+                _, (_, evicted) = self._lru.popitem(last=False)
+                self._bytes -= evicted
+
+    def _load_disk(self, key: Tuple) -> Optional[List[Dict]]:
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_disk(self, key: Tuple, payloads: List[Dict]) -> None:
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payloads, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"附件缓存写入失败：{e}")
+
+    def get_payloads(self, file_path: str, model_type: str = "VLM") -> List[Dict[str, Any]]:
+        """
+        附件编码后的 payload 列表（同 build_file_metadata），命中缓存时不再读取、编码或渲染
+        文本内容带有文件名，因此展示名也是缓存键的一部分
+        """
+        file_path, pages = split_page_spec(file_path)
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件未找到: {file_path}")
+        settings = dict(get_render_settings(file_path, model_type, pages), display_name=os.path.basename(file_path))
+        key = (self.file_hash(file_path), model_type, json.dumps(settings, sort_keys=True, ensure_ascii=False))
+
+        payloads = self._get_memory(key)
+        if payloads is not None:
+            return list(payloads)
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        try:
+            with building:
+                payloads = self._get_memory(key)
+                if payloads is None:
+                    payloads = self._load_disk(key)
+                    if payloads is not None:
+                        with self._lock:
+                            self.disk_hits += 1
+                    else:
+                        with self._lock:
+                            self.misses += 1
+                        payloads = build_file_metadata(file_path, **settings)
+                        if not _is_cacheable(payloads):
+                            return payloads
+                        self._save_disk(key, payloads)
+                    self._put_memory(key, payloads)
+        finally:
+            # 编码失败时也要移除，避免锁对象残留
+            with self._lock:
+                self._building.pop(key, None)
+        return list(payloads)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._lru),
+                "memory_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+_cache_instance: Optional[AttachmentPayloadCache] = None
+_instance_lock = threading.Lock()
+
+
+def get_attachment_cache() -> AttachmentPayloadCache:
+    global _cache_instance
+    with _instance_lock:
+        if _cache_instance is None:
+            _cache_instance = AttachmentPayloadCache()
+        return _cache_instance
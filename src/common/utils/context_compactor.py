@@ -0,0 +1,185 @@
+import json
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from src.common.models import Task
+from src.common.utils.token_counter import estimate_messages_tokens
+from src.config.settings import (
+    SESSION_MAX_SIZE, CONTEXT_KEEP_RECENT_MESSAGES, CONTEXT_TOOL_OUTPUT_MAX_CHARS, CONTEXT_SUMMARY_MODEL,
+    get_model_context_budget
+)
+
+SUMMARY_PROMPT = (
+    "以下是一段智能体执行任务过程中较早的对话记录（含工具调用与结果）。"
+    "请用简洁的要点总结其中已经完成的操作、得到的关键结论与数据，以及尚未解决的问题，供后续步骤继续使用。"
+)
+
+
+class CompactionContext:
+    """一次压缩过程的参数与中间结果"""
+
+    def __init__(self, task: Task, budget: int):
+        self.task = task
+        self.budget = budget
+        self.keep_recent = CONTEXT_KEEP_RECENT_MESSAGES
+        self.tool_output_max_chars = CONTEXT_TOOL_OUTPUT_MAX_CHARS
+        self.summary_model = CONTEXT_SUMMARY_MODEL
+        # 被滑动窗口移出的消息（交给总结阶段）
+        self.dropped: List[Dict] = []
+        # 窗口中省略提示的位置
+        self.note_index: Optional[int] = None
+        # 实际执行过的阶段名
+        self.applied: List[str] = []
+
+
+CompactionStage = Callable[[List[Dict], CompactionContext], Awaitable[List[Dict]]]
+
+
+def _split_head(messages: List[Dict]) -> int:
+    """开头的 system 消息与首条 user 消息（任务本身）始终保留，返回其长度"""
+    index = 0
+    while index < len(messages) and messages[index].get("role") == "system":
+        index += 1
+    if index < len(messages) and messages[index].get("role") == "user":
+        index += 1
+    return index
+
+
+def _group_messages(messages: List[Dict]) -> List[List[Dict]]:
+    """把带 tool_calls 的 assistant 消息与紧随其后的 tool 结果分为一组，窗口只在组边界切分"""
+    groups: List[List[Dict]] = []
+    for message in messages:
+        if message.get("role") == "tool" and groups:
+            groups[-1].append(message)
+        else:
+            groups.append([message])
+    return groups
+
+
+async def drop_old_reasoning(messages: List[Dict], ctx: CompactionContext) -> List[Dict]:
+    """较早的 assistant 消息不再携带 reasoning_content"""
+    boundary = len(messages) - ctx.keep_recent
+    result = []
+    for index, message in enumerate(messages):
+        if index < boundary and message.get("role") == "assistant" and message.get("reasoning_content"):
+            message = {k: v for k, v in message.items() if k != "reasoning_content"}
+        result.append(message)
+    return result
+
+
+async def truncate_old_tool_outputs(messages: List[Dict], ctx: CompactionContext) -> List[Dict]:
+    boundary = len(messages) - ctx.keep_recent
+    limit = ctx.tool_output_max_chars
+    result = []
+    for index, message in enumerate(messages):
+        content = message.get("content")
+        if index < boundary and message.get("role") == "tool" and isinstance(content, str) and len(content) > limit:
+            message = {**message, "content": f"{content[:limit]}\n...[已截断，原长度 {len(content)} 字符]"}
+        result.append(message)
+    return result
+
+
+async def sliding_window(messages: List[Dict], ctx: CompactionContext) -> List[Dict]:
+    """保留开头的任务信息，其余按组从新到旧装入预算（且不超过 SESSION_MAX_SIZE 条），至少保留最后一组"""
+    head_size = _split_head(messages)
+    head, groups = messages[:head_size], _group_messages(messages[head_size:])
+    remaining = ctx.budget - estimate_messages_tokens(head, ctx.task.token_cache) - 64  # 预留省略提示
+
+    kept: List[List[Dict]] = []
+    kept_count = 0
+    for group in reversed(groups):
+        cost = estimate_messages_tokens(group, ctx.task.token_cache)
+        if kept and (cost > remaining or kept_count + len(group) > SESSION_MAX_SIZE):
+            break
+        kept.append(group)
+        kept_count += len(group)
+        remaining -= cost
+
+    dropped_groups = groups[:len(groups) - len(kept)]
+    if not dropped_groups:
+        return messages
+    ctx.dropped = [message for group in dropped_groups for message in group]
+    ctx.note_index = len(head)
+    note = {"role": "system", "content": f"[上下文压缩] 已省略 {len(ctx.dropped)} 条较早的消息。"}
+    return head + [note] + [message for group in reversed(kept) for message in group]
+
+
+async def summarise_dropped(messages: List[Dict], ctx: CompactionContext) -> List[Dict]:
+    """用指定模型总结被移出窗口的消息，替换省略提示；结果缓存在任务上，窗口前移时增量更新"""
+    if not ctx.summary_model or not ctx.dropped or ctx.note_index is None:
+        return messages
+    cached = ctx.task.context_summary
+    if cached and cached["count"] == len(ctx.dropped):
+        summary = cached["summary"]
+    else:
+        previous = cached["summary"] if cached and cached["count"] < len(ctx.dropped) else None
+        new_messages = ctx.dropped[cached["count"]:] if previous else ctx.dropped
+        try:
+            summary = await _request_summary(ctx.summary_model, previous, new_messages)
+        except Exception as e:
+            print(f"上下文总结失败，保留省略提示：{e}")
+            return messages
+        ctx.task.context_summary = {"count": len(ctx.dropped), "summary": summary}
+
+    result = list(messages)
+    result[ctx.note_index] = {"role": "system", "content": f"[较早对话的总结]\n{summary}"}
+    return result
+
+
+async def _request_summary(model: str, previous: Optional[str], messages: List[Dict]) -> str:
+    from src.common.utils.model_utils import get_openai_client
+    client = get_openai_client(model_name=model)
+    if not client:
+        raise ValueError(f"无法获取模型客户端: {model}")
+    transcript = json.dumps(
+        [{k: v for k, v in m.items() if k in ("role", "content", "tool_calls")} for m in messages],
+        ensure_ascii=False, default=str
+    )
+    if previous:
+        transcript = f"此前的总结：\n{previous}\n\n新增记录：\n{transcript}"
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+    )
+    return response.choices[0].message.content or ""
+
+
+# 超出预算时依次执行，直到回到预算以内
+COMPACTION_STAGES: List[CompactionStage] = [truncate_old_tool_outputs, sliding_window]
+
+
+def register_compaction_stage(stage: CompactionStage, index: Optional[int] = None) -> None:
+    """注册自定义压缩阶段（默认追加在最后）"""
+    if index is None:
+        COMPACTION_STAGES.append(stage)
+    else:
+        COMPACTION_STAGES.insert(index, stage)
+
+
+async def compact_messages(task: Task, logger=None) -> List[Dict]:
+    """
+    生成本轮发给模型的消息列表；task.session_history 本身保持完整
+    token 预算为 0 时不做 token 压缩，但 SESSION_MAX_SIZE 条数上限仍然生效
+    """
+    budget = get_model_context_budget(task.model)
+    ctx = CompactionContext(task, budget or float("inf"))
+    messages = task.session_history
+    before = estimate_messages_tokens(task.session_history, task.token_cache)
+    if budget:
+        # 较早的思考内容总是丢弃
+        messages = await drop_old_reasoning(messages, ctx)
+        for stage in COMPACTION_STAGES:
+            if estimate_messages_tokens(messages, task.token_cache) <= budget:
+                break
+            messages = await stage(messages, ctx)
+            ctx.applied.append(stage.__name__)
+
+    # 未超出预算但消息条数超过 SESSION_MAX_SIZE 时，单独按条数滑动窗口
+    if sliding_window.__name__ not in ctx.applied and len(messages) - _split_head(messages) > SESSION_MAX_SIZE:
+        messages = await sliding_window(messages, ctx)
+        ctx.applied.append(sliding_window.__name__)
+    if ctx.dropped:
+        messages = await summarise_dropped(messages, ctx)
+
+    if logger and ctx.applied:
+        logger.log_compaction(before, estimate_messages_tokens(messages, task.token_cache), len(ctx.dropped))
+    return messages
@@ -1,13 +1,29 @@
 import base64
+import io
 import mimetypes
 import os
 import logging
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 
 try:
-    import fitz  # PyMuPDF
+    import pymupdf as fitz  # PyMuPDF
 except ImportError:
-    fitz = None
+    try:
+        import fitz  # 旧版 PyMuPDF
+    except ImportError:
+        fitz = None
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+from src.config.settings import (
+    PDF_PAGE_RANGE, PDF_MAX_PAGES, PDF_TEXT_MAX_PAGES, PDF_DPI, PDF_RENDER_WORKERS, PDF_PARALLEL_MIN_PAGES,
+    IMAGE_MAX_EDGE, IMAGE_FORMAT, IMAGE_QUALITY
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +33,9 @@ TYPE_MAPPING = {
     'audio': {'api_type': 'audio_url', 'key_name': 'audio_url'}
 }
 
+# 附件路径中的页范围后缀，如 "report.pdf#pages=2-5"
+_PAGES_SUFFIX = "#pages="
+
 
 def get_file_type(file_path: str):
     ext = os.path.splitext(file_path)[1].lower().strip('.')
@@ -32,75 +51,282 @@ def get_file_type(file_path: str):
     return None
 
 
-def _pdf_to_images_payload(file_path: str, max_pages: int = 1) -> List[Dict[str, Any]]:
+def split_page_spec(file_path: str) -> Tuple[str, Optional[str]]:
+    """拆出附件路径中的页范围：'a.pdf#pages=2-5' -> ('a.pdf', '2-5')"""
+    path, sep, pages = file_path.partition(_PAGES_SUFFIX)
+    return (path, pages or None) if sep else (file_path, None)
+
+
+def parse_page_range(spec: Optional[str], total_pages: int) -> List[int]:
+    """
+    解析页范围（从 1 开始，如 "1-3,5,8-"），返回升序去重的页码（从 0 开始），超出总页数的部分忽略
+    spec 为空表示全部页
+    """
+    if not spec:
+        return list(range(total_pages))
+    pages = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        try:
+            start = int(first) if first else 1
+            end = (int(last) if last else total_pages) if sep else start
+        except ValueError:
+            raise ValueError(f"无效的页范围: {spec}")
+        if start < 1 or end < start:
+            raise ValueError(f"无效的页范围: {spec}")
+        pages.update(range(start - 1, min(end, total_pages)))
+    return sorted(pages)
+
+
+def _image_options() -> Dict[str, Any]:
+    return {"image_max_edge": IMAGE_MAX_EDGE, "image_format": IMAGE_FORMAT, "image_quality": IMAGE_QUALITY}
+
+
+def get_render_settings(file_path: str, model_type: str = "VLM", pages: Optional[str] = None) -> Dict[str, Any]:
+    """影响编码结果的参数（作为附件缓存键的一部分），参数变化后缓存自动失效"""
+    file_type = get_file_type(file_path)
+    if file_type == 'image':
+        return _image_options() if model_type == "VLM" else {}
+    if file_type != 'pdf':
+        return {}
+    pages = pages or PDF_PAGE_RANGE
+    if model_type != "VLM":
+        # 纯文本模型用不上图片，只提取文本层
+        return {"pdf_mode": "text", "pdf_pages": pages, "pdf_max_pages": PDF_TEXT_MAX_PAGES}
+    return {"pdf_mode": "image", "pdf_pages": pages, "pdf_max_pages": PDF_MAX_PAGES, "pdf_dpi": PDF_DPI,
+            **_image_options()}
+
+
+def normalize_image(data: bytes, image_max_edge: int = IMAGE_MAX_EDGE, image_format: Optional[str] = IMAGE_FORMAT,
+                    image_quality: int = IMAGE_QUALITY) -> Tuple[bytes, Optional[str]]:
     """
-    核心逻辑：将 PDF 每一页切成图片，转 Base64
+    base64 编码前压缩图片：按 EXIF 方向摆正后缩到长边不超过 image_max_edge，按 image_format 重新编码（不带 EXIF）
+    返回 (图片数据, MIME 类型)；未安装 Pillow、无法识别（如动图）或处理后反而更大时返回原数据与 None
+    """
+    if Image is None or (not image_max_edge and not image_format):
+        return data, None
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            if getattr(original, "is_animated", False):
+                return data, None
+            source_format = original.format
+            has_exif = "exif" in original.info
+            img = ImageOps.exif_transpose(original)
+            resized = bool(image_max_edge) and max(img.size) > image_max_edge
+            if resized:
+                img.thumbnail((image_max_edge, image_max_edge), Image.LANCZOS)
+
+            out_format = (image_format or source_format or "PNG").upper()
+            if out_format == "JPEG" and img.mode not in ("RGB", "L"):
+                # JPEG 不支持透明通道，铺白底
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.split()[-1])
+            options = {"quality": image_quality} if out_format in ("JPEG", "WEBP") else {}
+            if out_format == "JPEG":
+                options["optimize"] = True
+            buffer = io.BytesIO()
+            img.save(buffer, format=out_format, **options)
+    except Exception as e:
+        logger.warning(f"Image normalization skipped: {e}")
+        return data, None
+
+    encoded = buffer.getvalue()
+    if not resized and not has_exif and len(encoded) >= len(data):
+        return data, None
+    return encoded, Image.MIME.get(out_format, f"image/{out_format.lower()}")
+
+
+def apply_image_detail(payloads: List[Dict[str, Any]], detail: Optional[str]) -> List[Dict[str, Any]]:
+    """按模型设置图片的 detail 参数（返回新列表，不修改缓存中共享的 payload）"""
+    if not detail:
+        return payloads
+    return [
+        {**p, "image_url": {**p["image_url"], "detail": detail}} if p.get("type") == "image_url" else p
+        for p in payloads
+    ]
+
+
+def payload_size(payloads: List[Dict[str, Any]]) -> int:
+    """payload 中内联数据（data URL）与文本的字符数，即随请求发送的附件大小"""
+    size = 0
+    for p in payloads:
+        if p.get("type") == "text":
+            size += len(p.get("text") or "")
+        else:
+            config = next((c for c in TYPE_MAPPING.values() if c['api_type'] == p.get("type")), None)
+            if config:
+                size += len(p.get(config['key_name'], {}).get("url", ""))
+    return size
+
+
+def _select_pages(spec: Optional[str], total_pages: int, max_pages: Optional[int]) -> Tuple[List[int], bool]:
+    """按页范围与页数上限选出要处理的页，返回 (页码列表, 是否被截断)"""
+    selected = parse_page_range(spec, total_pages)
+    if not selected:
+        raise ValueError(f"页范围 {spec} 超出文档页数（共 {total_pages} 页）")
+    if max_pages and len(selected) > max_pages:
+        logger.warning(f"PDF too long ({len(selected)} pages selected). Only processing first {max_pages} pages.")
+        return selected[:max_pages], True
+    return selected, False
+
+
+def _truncation_note(processed: List[int], total_pages: int) -> Dict[str, Any]:
+    return {
+        "type": "text",
+        "text": f"\n[System Note: Only pages {processed[0] + 1}-{processed[-1] + 1} ({len(processed)} pages) "
+                f"of {total_pages} were processed due to size limits.]"
+    }
+
+
+def _render_pdf_pages(file_path: str, page_numbers: List[int], dpi: int,
+                      image_options: Optional[Dict[str, Any]] = None) -> List[Tuple[bytes, str]]:
+    """
+    把指定页渲染成 PNG，给出 image_options 时再经 normalize_image 压缩
+    可在进程池中执行：每个进程自己打开文档，只传回 (图片数据, MIME 类型)
+    """
+    doc = fitz.open(file_path)
+    try:
+        images = []
+        for n in page_numbers:
+            png = doc.load_page(n).get_pixmap(dpi=dpi).tobytes("png")
+            data, mime = normalize_image(png, **image_options) if image_options else (png, None)
+            images.append((data, mime or "image/png"))
+        return images
+    finally:
+        doc.close()
+
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_pool_lock = threading.Lock()
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS)
+        return _render_pool
+
+
+def shutdown_pdf_render_pool() -> None:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False, cancel_futures=True)
+            _render_pool = None
+
+
+def render_pdf_pages(file_path: str, page_numbers: List[int], dpi: int = PDF_DPI,
+                     workers: int = PDF_RENDER_WORKERS,
+                     image_options: Optional[Dict[str, Any]] = None) -> List[Tuple[bytes, str]]:
+    """
+    渲染多页 PDF：页数较少时直接在当前进程渲染；否则按连续页段分给进程池并行渲染（结果保持页序）
+    """
+    if workers <= 1 or len(page_numbers) < PDF_PARALLEL_MIN_PAGES:
+        return _render_pdf_pages(file_path, page_numbers, dpi, image_options)
+    chunk_count = min(workers, len(page_numbers))
+    size = -(-len(page_numbers) // chunk_count)
+    chunks = [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+    pool = _get_render_pool()
+    futures = [pool.submit(_render_pdf_pages, file_path, chunk, dpi, image_options) for chunk in chunks]
+    return [image for future in futures for image in future.result()]
+
+
+def _pdf_to_images_payload(file_path: str, pages: Optional[str] = None, max_pages: int = PDF_MAX_PAGES,
+                           dpi: int = PDF_DPI, image_options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    核心逻辑：将 PDF 选定页渲染成图片，转 Base64
     """
     if not fitz:
         return [{"type": "text", "text": "[System Error: PyMuPDF not installed]"}]
 
-    payloads = []
     try:
-        doc = fitz.open(file_path)
+        with fitz.open(file_path) as doc:
+            total_pages = len(doc)
         # 限制页数，防止 Token 爆炸或 Payload 过大
-        total_pages = len(doc)
-        process_pages = min(total_pages, max_pages)
+        page_numbers, truncated = _select_pages(pages, total_pages, max_pages)
+        images = render_pdf_pages(file_path, page_numbers, dpi, image_options=image_options)
 
-        if total_pages > max_pages:
-            logger.warning(f"PDF too long ({total_pages} pages). Only processing first {max_pages} pages.")
+        # 构造 Vision Payload
+        payloads = [{
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:{mime};base64,{base64.b64encode(img_data).decode('utf-8')}",
+                "detail": "high"  # 提示模型这是高清图
+            }
+        } for img_data, mime in images]
 
-        for page_num in range(process_pages):
-            page = doc.load_page(page_num)
+        # 如果截断了，可以在最后加一个提示文本（可选，视模型兼容性而定）
+        if truncated:
+            payloads.append(_truncation_note(page_numbers, total_pages))
 
-            # 设置缩放比例，2.0 表示 2 倍清晰度 (适合 OCR)
-            # 如果报错 Payload too large，可以改回 1.0 或 1.5
-            mat = fitz.Matrix(2, 2)
+        return payloads
 
-            pix = page.get_pixmap(matrix=mat)
+    except Exception as e:
+        logger.error(f"PDF conversion failed: {e}")
+        return [{"type": "text", "text": f"[Error processing PDF images: {str(e)}]"}]
 
-            # 转为 PNG 二进制
-            img_data = pix.tobytes("png")
-            pix.save(f"debug_page_{page_num}.png")
-            b64_str = base64.b64encode(img_data).decode('utf-8')
 
-            # 构造 Vision Payload
-            payloads.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/png;base64,{b64_str}",
-                    "detail": "high"  # 提示模型这是高清图
-                }
-            })
+def _pdf_to_text_payload(file_path: str, pages: Optional[str] = None, max_pages: int = PDF_TEXT_MAX_PAGES,
+                         display_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """纯文本模型：只提取 PDF 文本层，不渲染图片"""
+    if not fitz:
+        return [{"type": "text", "text": "[System Error: PyMuPDF not installed]"}]
 
-        doc.close()
+    try:
+        with fitz.open(file_path) as doc:
+            total_pages = len(doc)
+            page_numbers, truncated = _select_pages(pages, total_pages, max_pages)
+            texts = [(n, doc.load_page(n).get_text("text").strip()) for n in page_numbers]
 
-        # 如果截断了，可以在最后加一个提示文本（可选，视模型兼容性而定）
-        if total_pages > max_pages:
+        body = "\n\n".join(f"--- Page {n + 1} ---\n{text}" for n, text in texts if text)
+        payloads = [{"type": "text", "text": f"\n\n=== File: {display_name or os.path.basename(file_path)} ===\n{body}"}]
+        if not body:
             payloads.append({
                 "type": "text",
-                "text": f"\n[System Note: Only the first {max_pages} of {total_pages} pages were processed due to size limits.]"
+                "text": "\n[System Note: The PDF has no extractable text layer (possibly scanned); "
+                        "use a vision model to read it.]"
             })
-
+        if truncated:
+            payloads.append(_truncation_note(page_numbers, total_pages))
         return payloads
 
     except Exception as e:
-        logger.error(f"PDF conversion failed: {e}")
-        return [{"type": "text", "text": f"[Error processing PDF images: {str(e)}]"}]
+        logger.error(f"PDF text extraction failed: {e}")
+        return [{"type": "text", "text": f"[Error processing PDF text: {str(e)}]"}]
 
 
-def build_file_metadata(file_path: str) -> List[Dict[str, Any]]:
+def build_file_metadata(file_path: str, pdf_mode: str = "image", pdf_pages: Optional[str] = None,
+                        pdf_max_pages: int = PDF_MAX_PAGES, pdf_dpi: int = PDF_DPI,
+                        image_max_edge: Optional[int] = None, image_format: Optional[str] = None,
+                        image_quality: int = IMAGE_QUALITY, display_name: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     统一返回 List[Dict]。
     即使是单张图片，也返回包含一个元素的列表。
+    PDF 可在路径后加 "#pages=2-5" 或传 pdf_pages 指定页范围
+    给出 image_max_edge / image_format 时，图片与 PDF 渲染页先经 normalize_image 缩放、重新编码（get_render_settings 按模型类型给出）
+    display_name 为展示给模型的文件名（默认取路径中的文件名）
+    重复引用同一附件时请用 attachment_store.get_attachment_cache().get_payloads，避免重复编码/渲染
     """
+    file_path, page_spec = split_page_spec(file_path)
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"文件未找到: {file_path}")
 
     file_type = get_file_type(file_path)
+    display_name = display_name or os.path.basename(file_path)
+    image_options = None
+    if image_max_edge or image_format:
+        image_options = {"image_max_edge": image_max_edge, "image_format": image_format, "image_quality": image_quality}
 
-    # === 分支 1: PDF (切图) ===
+    # === 分支 1: PDF (切图；pdf_mode="text" 时只提取文本) ===
     if file_type == 'pdf':
-        return _pdf_to_images_payload(file_path)
+        pages = pdf_pages or page_spec
+        if pdf_mode == "text":
+            return _pdf_to_text_payload(file_path, pages, pdf_max_pages, display_name)
+        return _pdf_to_images_payload(file_path, pages, pdf_max_pages, pdf_dpi, image_options)
 
     # === 分支 2: 其他多模态文件 (Image/Video/Audio) ===
     # 下面的逻辑保持处理单文件，但返回 List 格式
@@ -114,15 +340,19 @@ def build_file_metadata(file_path: str) -> List[Dict[str, Any]]:
             # 兜底：当作纯文本处理
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
-                    return [{"type": "text", "text": f"\n\n=== File: {os.path.basename(file_path)} ===\n{f.read()}"}]
+                    return [{"type": "text", "text": f"\n\n=== File: {display_name} ===\n{f.read()}"}]
             except:
                 raise ValueError(f"Unknown file type: {file_path}")
 
     try:
         with open(file_path, "rb") as f:
-            b64_str = base64.b64encode(f.read()).decode('utf-8')
+            data = f.read()
     except Exception as e:
         raise Exception(f"Read file failed: {e}")
+    if file_type == 'image' and image_options:
+        data, normalized_mime = normalize_image(data, **image_options)
+        mime_type = normalized_mime or mime_type
+    b64_str = base64.b64encode(data).decode('utf-8')
 
     config = TYPE_MAPPING.get(file_type, TYPE_MAPPING['image'])
 
@@ -0,0 +1,227 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.config.settings import (
+    TASK_HISTORY_DB, TASK_HISTORY_FILE, TASK_HISTORY_BATCH_SIZE, TASK_HISTORY_FLUSH_INTERVAL
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT,
+    task_name TEXT,
+    model_name TEXT,
+    create_time TEXT,
+    finish_time TEXT,
+    task_result TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_task_id ON task_history(task_id);
+CREATE INDEX IF NOT EXISTS idx_history_model ON task_history(model_name, seq);
+CREATE INDEX IF NOT EXISTS idx_history_finish_time ON task_history(finish_time);
+"""
+
+_COLUMNS = ("task_id", "task_name", "model_name", "create_time", "finish_time", "task_result")
+
+
+def _to_row(record: Dict[str, Any]) -> tuple:
+    result = record.get("task_result")
+    # 结果可能是多模态内容列表等非字符串，统一存 JSON
+    return tuple(record.get(col) for col in _COLUMNS[:-1]) + (json.dumps(result, ensure_ascii=False, default=str),)
+
+
+def _from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    record = {col: row[col] for col in _COLUMNS}
+    record["task_result"] = json.loads(row["task_result"]) if row["task_result"] is not None else None
+    record["seq"] = row["seq"]
+    return record
+
+
+class TaskHistoryStore:
+    """
+    任务历史：SQLite（WAL 模式）只追加写入，按 task_id、模型、完成时间建索引
+    append 只把记录放进队列，由后台线程按批写入，任务完成时不阻塞事件循环
+    """
+
+    def __init__(self, db_path: str, batch_size: int = TASK_HISTORY_BATCH_SIZE,
+                 flush_interval: float = TASK_HISTORY_FLUSH_INTERVAL, legacy_file: Optional[str] = None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self._local = threading.local()
+        # 所有线程的读连接，关闭时统一关闭
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._closed = False
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.close()
+        if legacy_file:
+            self._migrate_legacy(legacy_file)
+        self._writer = threading.Thread(target=self._write_loop, name="task-history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=check_same_thread)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """每个线程一个只读连接；WAL 模式下读不会被写阻塞"""
+        if self._closed:
+            raise RuntimeError("任务历史已关闭")
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 只在本线程使用，但允许 close() 在其他线程中关闭
+            conn = self._local.conn = self._connect(check_same_thread=False)
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def _migrate_legacy(self, legacy_file: str) -> None:
+        """旧版 task_history.json 首次启动时导入，之后改名保留"""
+        if not os.path.exists(legacy_file):
+            return
+        try:
+            with open(legacy_file, "r", encoding="utf-8") as f:
+                content = f.read().strip()
+            records = json.loads(content) if content else []
+            if not isinstance(records, list):
+                records = [records]
+        except Exception as e:
+            print(f"读取历史文件失败：{e}")
+            return
+        conn = self._connect()
+        with conn:
+            self._insert(conn, [r for r in records if isinstance(r, dict)])
+        conn.close()
+        os.replace(legacy_file, f"{legacy_file}.migrated")
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, records: List[Dict]) -> None:
+        conn.executemany(
+            f"INSERT INTO task_history ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+            [_to_row(record) for record in records]
+        )
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        stop = False
+        while not stop:
+            batch: List[Dict] = []
+            waiters: List[threading.Event] = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with conn:
+                        self._insert(conn, batch)
+                except Exception as e:
+                    print(f"写入任务历史失败：{e}")
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        if self._closed:
+            # 关闭后（如服务退出时仍在收尾的任务）不再写入
+            print(f"任务历史已关闭，忽略记录：{record.get('task_id')}")
+            return
+        self._queue.put(dict(record))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的记录全部落盘"""
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for reader in readers:
+            reader.close()
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._reader().execute(
+            "SELECT * FROM task_history WHERE task_id = ? ORDER BY seq DESC LIMIT 1", (task_id,)
+        ).fetchone()
+        return _from_row(row) if row else None
+
+    def query(self, model: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              cursor: Optional[int] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        按完成顺序倒序分页（游标为上一页最后一条的 seq），since/until 为 finish_time 的闭区间
+        :return: {"items": [...], "next_cursor": 下一页游标，没有更多时为 None}
+        """
+        conditions, params = [], []
+        if model:
+            conditions.append("model_name = ?")
+            params.append(model)
+        if since:
+            conditions.append("finish_time >= ?")
+            params.append(since)
+        if until:
+            conditions.append("finish_time <= ?")
+            params.append(until)
+        if cursor is not None:
+            conditions.append("seq < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._reader().execute(
+            f"SELECT * FROM task_history {where} ORDER BY seq DESC LIMIT ?", (*params, limit + 1)
+        ).fetchall()
+        items = [_from_row(row) for row in rows[:limit]]
+        next_cursor = items[-1]["seq"] if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+
+_store_instance: Optional[TaskHistoryStore] = None
+_store_lock = threading.Lock()
+# close_task_history_store 之后不再创建新的实例（及写入线程）
+_store_closed = False
+
+
+def get_task_history_store() -> TaskHistoryStore:
+    global _store_instance
+    with _store_lock:
+        if _store_closed:
+            raise RuntimeError("任务历史已关闭")
+        if _store_instance is None:
+            _store_instance = TaskHistoryStore(TASK_HISTORY_DB, legacy_file=TASK_HISTORY_FILE)
+        return _store_instance
+
+
+def close_task_history_store() -> None:
+    global _store_instance, _store_closed
+    with _store_lock:
+        _store_closed = True
+        if _store_instance is not None:
+            _store_instance.close()
+            _store_instance = None
@@ -1,7 +1,5 @@
-import json
-import os
 from src.common.models import Task
-from src.config.settings import TASK_HISTORY_FILE
+from src.common.utils.history_store import get_task_history_store
 
 import asyncio
 from typing import Dict, Any
@@ -48,33 +46,10 @@ async def get_model_task_result(task_name: str) -> Any:
 
 def write_task_history(task_data: Dict[str, Any]) -> None:
     """
-    写入任务历史到文件
+    追加一条任务历史（只入队，由后台线程批量写入，不阻塞调用方）
     :param task_data: 包含任务关键信息的字典 (task_id, task_name, task_result, etc.)
     """
-
-    task_dict = task_data
-
-    history_list = []
-    if not os.path.exists(TASK_HISTORY_FILE):
-        with open(TASK_HISTORY_FILE, "w", encoding="utf-8") as f:
-            f.write('[]')
-
-    if os.path.exists(TASK_HISTORY_FILE):
-        try:
-            with open(TASK_HISTORY_FILE, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-                if content:
-                    history_list = json.loads(content)
-                    if not isinstance(history_list, list):
-                        history_list = [history_list]
-        except Exception as e:
-            print(f"读取历史文件失败：{e}")
-            return
-
-    history_list.append(task_dict)
-
     try:
-        with open(TASK_HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(history_list, f, ensure_ascii=False, indent=2)
+        get_task_history_store().append(task_data)
     except Exception as e:
-        print(f"写入任务历史失败：{e}")
\ No newline at end of file
+        print(f"写入任务历史失败：{e}")
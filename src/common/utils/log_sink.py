@@ -0,0 +1,178 @@
+import atexit
+import json
+import logging
+import queue
+import re
+import sys
+import threading
+import time
+from typing import List, Optional, TextIO
+
+from src.config.settings import (
+    LOG_CONSOLE_MODE, LOG_CONSOLE_LEVEL, LOG_CONSOLE_MAX_CHARS, LOG_FILE_PATH, LOG_SINK_QUEUE_SIZE,
+    LOG_SINK_BATCH_SIZE
+)
+
+# 沿用 logging 的级别数值
+DEBUG, INFO, WARNING, ERROR = logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR
+
+_ANSI = re.compile(r"\033\[[0-9;]*m")
+_BAR = "\033[2m│\033[0m"
+_RESET = "\033[0m"
+
+
+class LogRecord:
+    __slots__ = ("timestamp", "level", "task_id", "kind", "text", "color")
+
+    def __init__(self, level: int, task_id: Optional[str], kind: str, text: str, color: str = ""):
+        self.timestamp = time.time()
+        self.level = level
+        self.task_id = task_id
+        # line：带竖线前缀逐行输出；raw：原样输出（任务头尾）
+        self.kind = kind
+        self.text = text
+        self.color = color
+
+
+class LogSink:
+    """
+    控制台/文件日志：调用方只把记录放进有界队列（满了直接丢弃并计数，不阻塞事件循环），
+    后台线程批量渲染后一次写出
+    console_mode: color | plain | off；file_path 不为空时另写一份 JSON Lines
+    """
+
+    def __init__(self, console_mode: str = LOG_CONSOLE_MODE, level: int = INFO,
+                 file_path: Optional[str] = LOG_FILE_PATH, max_chars: int = LOG_CONSOLE_MAX_CHARS,
+                 queue_size: int = LOG_SINK_QUEUE_SIZE, batch_size: int = LOG_SINK_BATCH_SIZE,
+                 stream: Optional[TextIO] = None):
+        self.console_mode = console_mode
+        self.level = level
+        self.file_path = file_path
+        self.max_chars = max_chars
+        self.batch_size = batch_size
+        self.stream = stream
+        # 队列满时丢弃的记录数（生产方线程累加，写出线程读取并清零，需加锁）
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._file: Optional[TextIO] = None
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.console_mode != "off" or bool(self.file_path)
+
+    def emit(self, level: int, task_id: Optional[str], kind: str, text: str, color: str = "") -> None:
+        if level < self.level or not self.enabled:
+            return
+        if self._writer is None:
+            self._start()
+        try:
+            self._queue.put_nowait(LogRecord(level, task_id, kind, text, color))
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="log-sink", daemon=True)
+                self._writer.start()
+
+    def _render(self, record: LogRecord) -> str:
+        text = record.text
+        if self.max_chars and len(text) > self.max_chars:
+            text = text[:self.max_chars] + f"...（共 {len(text)} 字符）"
+        if record.kind == "raw":
+            rendered = text
+        else:
+            color = record.color
+            reset = _RESET if color else ""
+            rendered = "\n".join(f"{_BAR} {color}{line}{reset}" for line in text.split("\n"))
+        if self.console_mode == "plain":
+            rendered = _ANSI.sub("", rendered)
+        return rendered
+
+    def _write_batch(self, records: List[LogRecord]) -> None:
+        if self.console_mode != "off":
+            stream = self.stream or sys.stdout
+            stream.write("".join(self._render(r) + "\n" for r in records))
+            stream.flush()
+        if self.file_path:
+            if self._file is None:
+                self._file = open(self.file_path, "a", encoding="utf-8")
+            self._file.write("".join(
+                json.dumps({"timestamp": r.timestamp, "level": logging.getLevelName(r.level), "task_id": r.task_id,
+                            "text": _ANSI.sub("", r.text)}, ensure_ascii=False) + "\n"
+                for r in records
+            ))
+            self._file.flush()
+
+    def _write_loop(self) -> None:
+        while True:
+            records: List[LogRecord] = []
+            waiters: List[threading.Event] = []
+            stop = False
+            item = self._queue.get()
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    records.append(item)
+                if stop or len(records) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            with self._dropped_lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                records.append(LogRecord(WARNING, None, "line", f"日志队列已满，丢弃 {dropped} 条"))
+            try:
+                if records:
+                    self._write_batch(records)
+            except Exception as e:
+                sys.stderr.write(f"日志输出失败：{e}\n")
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的记录全部写出"""
+        if self._writer is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """写完队列中剩余的记录"""
+        if self._writer is not None:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self._writer.join(timeout)
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_sink = LogSink(level=logging.getLevelName(LOG_CONSOLE_LEVEL))
+
+
+def get_log_sink() -> LogSink:
+    return _sink
+
+
+def close_log_sink() -> None:
+    _sink.close()
+
+
+atexit.register(close_log_sink)
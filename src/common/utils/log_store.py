@@ -0,0 +1,252 @@
+import gzip
+import json
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Optional, Set
+
+from src.config.settings import (
+    TASK_LOG_MAX_ENTRIES_PER_TASK, TASK_LOG_MEMORY_LIMIT, TASK_LOG_MAX_COMPLETED_IN_MEMORY, TASK_LOG_SPILL_DIR
+)
+
+# 每条日志除内容外的估算开销（dict、时间戳、类型字段）
+_ENTRY_OVERHEAD_BYTES = 200
+_SAFE_TASK_ID = re.compile(r"[\w\-]+")
+
+
+def _entry_size(entry: Dict) -> int:
+    return _ENTRY_OVERHEAD_BYTES + len(entry.get("content") or "")
+
+
+class _TaskBuffer:
+    def __init__(self, max_entries: int):
+        self.entries: Deque[Dict] = deque()
+        # 仍在缓冲区中的条目 id（流式条目追加内容时据此判断是否已被丢弃）
+        self.entry_ids = set()
+        self.max_entries = max_entries
+        self.bytes = 0
+        self.dropped = 0
+        self.finished = False
+        # seq：条目序号（不变）；rev：任务内的修改版本号，条目新增或内容变化时取新值，作为增量查询的游标
+        self.next_seq = 1
+        self.rev = 0
+
+
+class TaskLogStore:
+    """
+    任务日志的有界内存存储
+    - 每个任务一个环形缓冲区，超过条数上限时丢弃最早的条目
+    - 全局内存上限：超出时先把已完成任务的日志写到磁盘（gzip 压缩的 JSONL 段文件），仍超出再裁剪运行中任务的最早条目
+    - 已完成任务在内存中最多保留若干个，其余落盘；查询时按需从磁盘加载
+    日志条目只能通过 append/set_content/append_content 修改，以保证内存统计与增量游标准确；
+    每次变化后通知该任务的订阅者（回调在写入方线程中执行，必须立即返回）
+    """
+
+    def __init__(self, spill_dir: str = TASK_LOG_SPILL_DIR, memory_limit: int = TASK_LOG_MEMORY_LIMIT,
+                 max_entries: int = TASK_LOG_MAX_ENTRIES_PER_TASK,
+                 max_completed: int = TASK_LOG_MAX_COMPLETED_IN_MEMORY):
+        self.spill_dir = spill_dir
+        self.memory_limit = memory_limit
+        self.max_entries = max_entries
+        self.max_completed = max_completed
+        self._buffers: Dict[str, _TaskBuffer] = {}
+        # 内存中已完成的任务，按完成先后排序，落盘时从最早完成的开始
+        self._completed: "OrderedDict[str, None]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # 正在写盘的任务（写完前查询仍从这里返回）
+        self._spilling: Dict[str, List[Dict]] = {}
+        self._spilled_tasks = 0
+        self._spilled_bytes = 0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-log-spill")
+        self._listeners: Dict[str, Set[Callable[[], None]]] = {}
+
+    def _spill_path(self, task_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{task_id}.jsonl.gz")
+
+    def append(self, task_id: str, entry: Dict) -> Dict:
+        with self._lock:
+            buffer = self._buffers.get(task_id)
+            if buffer is None:
+                buffer = self._buffers[task_id] = _TaskBuffer(self.max_entries)
+            if len(buffer.entries) >= buffer.max_entries:
+                self._drop_oldest(buffer)
+            entry["seq"] = buffer.next_seq
+            buffer.next_seq += 1
+            buffer.rev += 1
+            entry["rev"] = buffer.rev
+            buffer.entries.append(entry)
+            buffer.entry_ids.add(id(entry))
+            size = _entry_size(entry)
+            buffer.bytes += size
+            self._bytes += size
+            self._enforce_limits()
+        self._notify(task_id)
+        return entry
+
+    def set_content(self, task_id: str, entry: Dict, content: str, final: bool = False) -> None:
+        """替换条目内容；final=True 表示流式条目结束（去掉 partial 标记）"""
+        self._resize(task_id, entry, content, final)
+
+    def append_content(self, task_id: str, entry: Dict, delta: str) -> None:
+        self._resize(task_id, entry, (entry.get("content") or "") + delta)
+
+    def _resize(self, task_id: str, entry: Dict, content: str, final: bool = False) -> None:
+        with self._lock:
+            diff = len(content) - len(entry.get("content") or "")
+            entry["content"] = content
+            if final:
+                entry.pop("partial", None)
+            buffer = self._buffers.get(task_id)
+            # 条目可能已被环形缓冲区丢弃，此时不再计入
+            if buffer is None or id(entry) not in buffer.entry_ids:
+                return
+            buffer.rev += 1
+            entry["rev"] = buffer.rev
+            buffer.bytes += diff
+            self._bytes += diff
+            self._enforce_limits()
+        self._notify(task_id)
+
+    def _drop_oldest(self, buffer: _TaskBuffer) -> None:
+        entry = buffer.entries.popleft()
+        buffer.entry_ids.discard(id(entry))
+        size = _entry_size(entry)
+        buffer.bytes -= size
+        self._bytes -= size
+        buffer.dropped += 1
+
+    def finish(self, task_id: str) -> None:
+        """任务结束：其日志可以落盘"""
+        with self._lock:
+            buffer = self._buffers.get(task_id)
+            if buffer is None or buffer.finished:
+                return
+            buffer.finished = True
+            self._completed[task_id] = None
+            self._enforce_limits()
+        self._notify(task_id)
+
+    def _enforce_limits(self) -> None:
+        while self._completed and (len(self._completed) > self.max_completed or self._bytes > self.memory_limit):
+            task_id, _ = self._completed.popitem(last=False)
+            self._spill(task_id)
+        if self._bytes <= self.memory_limit:
+            return
+        # 只剩运行中任务仍超限：从占用最大的任务开始丢弃最早的条目
+        running = sorted((b for b in self._buffers.values() if b.entries), key=lambda b: b.bytes, reverse=True)
+        for buffer in running:
+            while len(buffer.entries) > 1 and self._bytes > self.memory_limit:
+                self._drop_oldest(buffer)
+            if self._bytes <= self.memory_limit:
+                break
+
+    def _spill(self, task_id: str) -> None:
+        buffer = self._buffers.pop(task_id)
+        self._bytes -= buffer.bytes
+        entries = list(buffer.entries)
+        self._spilling[task_id] = entries
+        self._writer.submit(self._write_segment, task_id, entries)
+
+    def _write_segment(self, task_id: str, entries: List[Dict]) -> None:
+        path = self._spill_path(task_id)
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False, default=str))
+                    f.write("\n")
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._spilled_tasks += 1
+                self._spilled_bytes += os.path.getsize(path)
+        except Exception as e:
+            print(f"任务日志落盘失败（{task_id}）：{e}")
+        finally:
+            with self._lock:
+                self._spilling.pop(task_id, None)
+
+    def _load_segment(self, task_id: str) -> Optional[List[Dict]]:
+        if not _SAFE_TASK_ID.fullmatch(task_id):
+            return None
+        try:
+            with gzip.open(self._spill_path(task_id), "rt", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return None
+
+    def get(self, task_id: str, since: Optional[int] = None) -> List[Dict]:
+        """
+        任务日志快照（条目的副本）；已落盘的任务从磁盘加载（不回填内存）
+        :param since: 只返回 rev 大于该值的条目（新增的或内容有变化的），客户端按 seq 合并
+        """
+        with self._lock:
+            buffer = self._buffers.get(task_id)
+            if buffer is not None:
+                entries = buffer.entries
+            else:
+                entries = self._spilling.get(task_id)
+            if entries is not None:
+                return [dict(e) for e in entries if since is None or e["rev"] > since]
+        entries = self._load_segment(task_id) or []
+        return [e for e in entries if since is None or e.get("rev", 0) > since]
+
+    def __contains__(self, task_id: str) -> bool:
+        with self._lock:
+            return task_id in self._buffers
+
+    def is_finished(self, task_id: str) -> bool:
+        """任务日志不会再变化（已结束或已落盘）"""
+        with self._lock:
+            buffer = self._buffers.get(task_id)
+            if buffer is not None:
+                return buffer.finished
+            if task_id in self._spilling:
+                return True
+        return _SAFE_TASK_ID.fullmatch(task_id) is not None and os.path.exists(self._spill_path(task_id))
+
+    def subscribe(self, task_id: str, listener: Callable[[], None]) -> None:
+        with self._lock:
+            self._listeners.setdefault(task_id, set()).add(listener)
+
+    def unsubscribe(self, task_id: str, listener: Callable[[], None]) -> None:
+        with self._lock:
+            listeners = self._listeners.get(task_id)
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners:
+                    del self._listeners[task_id]
+
+    def _notify(self, task_id: str) -> None:
+        if task_id not in self._listeners:
+            return
+        with self._lock:
+            listeners = list(self._listeners.get(task_id, ()))
+        for listener in listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"日志订阅通知失败：{e}")
+
+    def flush(self) -> None:
+        """等待落盘任务全部完成"""
+        self._writer.submit(lambda: None).result()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            buffers = list(self._buffers.values())
+            return {
+                "tasks_in_memory": len(buffers),
+                "running_tasks": sum(1 for b in buffers if not b.finished),
+                "entries": sum(len(b.entries) for b in buffers),
+                "memory_bytes": self._bytes,
+                "memory_limit": self.memory_limit,
+                "dropped_entries": sum(b.dropped for b in buffers),
+                "spilling_tasks": len(self._spilling),
+                "spilled_tasks": self._spilled_tasks,
+                "spilled_bytes": self._spilled_bytes,
+                "subscribers": sum(len(ls) for ls in self._listeners.values()),
+            }
@@ -1,10 +1,60 @@
-from openai import AsyncOpenAI
-from src.config.settings import get_api_key, get_base_url
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, BadRequestError
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
+from src.config.settings import (
+    get_api_key, get_base_url, MODEL_REQUEST_TIMEOUT,
+    HTTP_POOL_MAX_CONNECTIONS, HTTP_POOL_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY, HTTP_ENABLE_HTTP2
+)
+
+try:
+    import h2  # HTTP/2 可选依赖（pip install httpx[http2]）
+except ImportError:
+    h2 = None
+
+# 客户端注册表：(base_url, api_key) -> AsyncOpenAI，所有客户端共享同一个 httpx 连接池
+_client_registry: Dict[Tuple[str, str], AsyncOpenAI] = {}
+# 模型名 -> 注册表 key，用于配置变更时失效
+_model_client_keys: Dict[str, Tuple[str, str]] = {}
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_client_lock = threading.Lock()
+# 不接受 stream_options 的模型（首次 400 后记录，之后不再携带）
+_no_stream_usage_models = set()
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """获取共享的 httpx 客户端（调用方需持有 _client_lock）"""
+    global _http_client, _http_client_loop
+    if _http_client is None or _http_client.is_closed:
+        http2 = HTTP_ENABLE_HTTP2 and h2 is not None
+        if HTTP_ENABLE_HTTP2 and not http2:
+            print("Warning: 未安装 h2，HTTP/2 已回退为 HTTP/1.1")
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            timeout=MODEL_REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        try:
+            _http_client_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            _http_client_loop = None
+    return _http_client
+
 
 def get_openai_client(model_name: str):
     """
     动态获取 OpenAI 客户端
-    根据 settings.py 中的配置自动适配不同的模型
+    根据 settings.py 中的配置自动适配不同的模型，同一 (base_url, api_key) 复用同一客户端
     """
     api_key = get_api_key(model_name)
     base_url = get_base_url(model_name)
@@ -13,13 +63,172 @@ def get_openai_client(model_name: str):
         print(f"Error: 模型 {model_name} 缺少 api_key 或 base_url 配置")
         return None
 
-    try:
-        client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            timeout=300.0,
-        )
+    key = (base_url, api_key)
+    with _client_lock:
+        # 该模型的 base_url / api_key 已变更：旧客户端不再有模型使用时丢弃
+        previous = _model_client_keys.get(model_name)
+        if previous is not None and previous != key:
+            _release_client_key(model_name)
+        client = _client_registry.get(key)
+        if client is not None and not client.is_closed():
+            _model_client_keys[model_name] = key
+            return client
+        try:
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=MODEL_REQUEST_TIMEOUT,
+                http_client=_get_http_client(),
+            )
+        except Exception as e:
+            print(f"创建模型客户端失败: {e}")
+            return None
+        _client_registry[key] = client
+        _model_client_keys[model_name] = key
         return client
+
+
+def _release_client_key(model_name: str) -> None:
+    """解除模型与缓存客户端的关联（调用方需持有 _client_lock）；其他模型仍在使用同一 (base_url, api_key) 时保留客户端"""
+    key = _model_client_keys.pop(model_name, None)
+    if key is not None and key not in _model_client_keys.values():
+        # 客户端共享 httpx 连接池，只从注册表移除，不关闭
+        _client_registry.pop(key, None)
+
+
+def invalidate_openai_client(model_name: str) -> None:
+    """模型配置变更/删除时调用：丢弃该模型对应的缓存客户端"""
+    with _client_lock:
+        _release_client_key(model_name)
+
+
+async def close_openai_clients(timeout: float = 5.0) -> None:
+    """
+    关闭所有缓存客户端及共享连接池
+    连接池绑定在创建它的事件循环（执行器线程）上，需在该循环中关闭
+    """
+    global _http_client, _http_client_loop
+    with _client_lock:
+        http_client, loop = _http_client, _http_client_loop
+        _client_registry.clear()
+        _model_client_keys.clear()
+        _http_client = None
+        _http_client_loop = None
+
+    if http_client is None or http_client.is_closed:
+        return
+    try:
+        if loop is None or loop is asyncio.get_running_loop():
+            await http_client.aclose()
+        elif loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(http_client.aclose(), loop)
+            await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
     except Exception as e:
-        print(f"创建模型客户端失败: {e}")
-        return None
\ No newline at end of file
+        print(f"关闭模型客户端连接池失败: {e}")
+
+
+async def stream_chat_completion(client: AsyncOpenAI, on_delta: Optional[Callable[[str, str], None]] = None, **kwargs):
+    """
+    以流式方式调用模型，并将增量拼装成与非流式接口一致的响应结构
+    :param on_delta: 增量回调 on_delta(log_type, text)，log_type 为 reasoning / response
+    :return: (response, ttft)，response.choices[0].message 与非流式返回的 message 字段一致
+    """
+    start = time.perf_counter()
+    ttft = None
+    content_parts = []
+    reasoning_parts = []
+    tool_calls = {}  # index -> {"id", "name", "arguments"}
+    finish_reason = None
+    usage = None
+
+    model = kwargs.get("model")
+    if model in _no_stream_usage_models:
+        stream = await client.chat.completions.create(stream=True, **kwargs)
+    else:
+        try:
+            stream = await client.chat.completions.create(
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs
+            )
+        except BadRequestError:
+            # 部分兼容 OpenAI 接口的服务不支持 stream_options，去掉后重试（仍失败则照常抛出）
+            stream = await client.chat.completions.create(stream=True, **kwargs)
+            _no_stream_usage_models.add(model)
+    async for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        delta = choice.delta
+        finish_reason = choice.finish_reason or finish_reason
+
+        reasoning = getattr(delta, "reasoning_content", None)
+        if reasoning:
+            reasoning_parts.append(reasoning)
+            if on_delta:
+                on_delta("reasoning", reasoning)
+        if delta.content:
+            content_parts.append(delta.content)
+            if on_delta:
+                on_delta("response", delta.content)
+        for tool_delta in delta.tool_calls or []:
+            slot = tool_calls.setdefault(tool_delta.index, {"id": None, "name": "", "arguments": ""})
+            if tool_delta.id:
+                slot["id"] = tool_delta.id
+            if tool_delta.function:
+                if tool_delta.function.name:
+                    slot["name"] += tool_delta.function.name
+                if tool_delta.function.arguments:
+                    slot["arguments"] += tool_delta.function.arguments
+
+        if ttft is None and (reasoning or delta.content or delta.tool_calls):
+            ttft = time.perf_counter() - start
+
+    message_data = {
+        "content": "".join(content_parts) or None,
+        "reasoning_content": "".join(reasoning_parts) or None,
+        "tool_calls": [
+            {
+                "id": call["id"] or f"call_{index}",
+                "type": "function",
+                "function": {"name": call["name"], "arguments": call["arguments"] or "{}"},
+            }
+            for index, call in sorted(tool_calls.items())
+        ],
+    }
+    # 服务端未返回用量时 usage 为 None，不做估算
+    response = build_chat_response(message_data, usage=usage, finish_reason=finish_reason)
+    return response, (ttft if ttft is not None else time.perf_counter() - start)
+
+
+def build_chat_response(message: Dict, usage=None, finish_reason: Optional[str] = None):
+    """由消息字典构造与非流式接口一致的响应结构（choices[0].message / usage）"""
+    chat_message = ChatCompletionMessage(
+        role="assistant",
+        content=message.get("content"),
+        reasoning_content=message.get("reasoning_content"),
+        tool_calls=[ChatCompletionMessageToolCall(**call) for call in message.get("tool_calls") or []] or None,
+    )
+    return SimpleNamespace(
+        choices=[SimpleNamespace(index=0, message=chat_message, finish_reason=finish_reason)],
+        usage=usage,
+    )
+
+
+def response_to_cache_data(response) -> Dict:
+    """提取响应中可复用的部分（用于响应缓存）"""
+    choice = response.choices[0]
+    message = choice.message
+    tool_calls = []
+    for call in message.tool_calls or []:
+        tool_calls.append(call.model_dump() if hasattr(call, "model_dump") else call.dict())
+    return {
+        "message": {
+            "content": message.content,
+            "reasoning_content": getattr(message, "reasoning_content", None),
+            "tool_calls": tool_calls,
+        },
+        "finish_reason": getattr(choice, "finish_reason", None),
+    }
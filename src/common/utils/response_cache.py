@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from src.config.settings import (
+    RESPONSE_CACHE_DIR, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES
+)
+
+
+def make_cache_key(model: str, messages: Any, tools: Any) -> str:
+    """对模型、消息与工具 schema 做规范化序列化后取 SHA-256（请求不带采样参数）"""
+    payload = {"model": model, "messages": messages, "tools": tools}
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    模型响应的磁盘缓存：每个 key 一个 JSON 文件，内存中维护 LRU 索引
+    超过条目数或总字节数上限时淘汰最久未使用的条目，过期条目在读取时删除
+    """
+
+    def __init__(self, cache_dir: str, ttl: float, max_entries: int, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> (文件大小, 写入时间)，按最近使用排序
+        self._index: "OrderedDict[str, tuple]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index(self) -> None:
+        """启动时扫描缓存目录，按最后访问时间重建 LRU 索引"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_atime, name[:-5], stat.st_size, stat.st_mtime))
+        for _, key, size, created in sorted(entries):
+            self._index[key] = (size, created)
+            self._total_bytes += size
+        self._evict()
+
+    def _remove(self, key: str) -> None:
+        size, _ = self._index.pop(key, (0, 0))
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        while self._index and (len(self._index) > self.max_entries or self._total_bytes > self.max_bytes):
+            oldest_key = next(iter(self._index))
+            self._remove(oldest_key)
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None:
+                self.misses += 1
+                return None
+            if self.ttl and time.time() - meta[1] > self.ttl:
+                self._remove(key)
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: Dict) -> None:
+        content = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = self._path(key) + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(content)
+                os.replace(tmp_path, self._path(key))
+            except Exception as e:
+                print(f"写入响应缓存失败：{e}")
+                return
+            size = len(content.encode("utf-8"))
+            old_size, _ = self._index.pop(key, (0, 0))
+            self._total_bytes += size - old_size
+            self._index[key] = (size, time.time())
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+_cache_instance: Optional[ResponseCache] = None
+_instance_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache_instance
+    with _instance_lock:
+        if _cache_instance is None:
+            _cache_instance = ResponseCache(
+                RESPONSE_CACHE_DIR, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES
+            )
+        return _cache_instance
@@ -1,15 +1,17 @@
 import time
 import json
-from collections import defaultdict
+from typing import Optional
 from src.common.models import Task
+from src.common.utils.log_store import TaskLogStore
+from src.common.utils.log_sink import get_log_sink, DEBUG, INFO, ERROR
 
 # --- 全局日志存储 ---
-# 结构: { "task_id": [ {type: "reasoning", content: "..."}, ... ] }
-TASK_LOG_STORAGE = defaultdict(list)
+# 结构: { "task_id": [ {type: "reasoning", content: "..."}, ... ] }，有内存上限，已完成任务的日志会落盘
+TASK_LOG_STORAGE = TaskLogStore()
 
 
 class TaskLogger:
-    """负责任务执行过程中的流式日志输出"""
+    """负责任务执行过程中的流式日志输出：结构化日志写入内存（WebUI），控制台输出交给 log_sink 异步批量写出"""
     # 颜色定义（保留用于控制台输出）
     c_reset = "\033[0m"
     c_dim = "\033[2m"
@@ -25,35 +27,62 @@ class TaskLogger:
         self.start_time = time.time()
         self.task_id = task_id
         self.task_name = task_name
-        self.usage = {"prompt": 0, "completion": 0, "total": 0}
-
-    def _save_log(self, log_type: str, content: str):
-        """保存结构化日志到内存"""
-        TASK_LOG_STORAGE[self.task_id].append({
+        # turns：每轮请求的估算输入大小 estimated 与服务端返回的实际值 prompt
+        self.usage = {"prompt": 0, "completion": 0, "total": 0, "turns": []}
+        # 每次模型调用的性能指标：首 token 时延、生成速度
+        self.call_metrics = []
+        # 流式输出中尚未结束的日志条目：{log_type: entry}
+        self._open_streams = {}
+
+    def _save_log(self, log_type: str, content: str, partial: bool = False) -> dict:
+        """保存结构化日志到内存（若该类型有流式条目，则用完整内容收尾）"""
+        entry = self._open_streams.pop(log_type, None)
+        if entry is not None:
+            TASK_LOG_STORAGE.set_content(self.task_id, entry, content, final=True)
+            return entry
+        entry = {
             "timestamp": time.time(),
             "type": log_type,
             "content": content
-        })
+        }
+        if partial:
+            entry["partial"] = True
+        return TASK_LOG_STORAGE.append(self.task_id, entry)
+
+    def log_stream_delta(self, log_type: str, delta: str):
+        """流式输出：增量写入内存日志（控制台在整段结束后统一打印）"""
+        if not delta: return
+        entry = self._open_streams.get(log_type)
+        if entry is None:
+            entry = self._open_streams[log_type] = self._save_log(log_type, "", partial=True)
+        TASK_LOG_STORAGE.append_content(self.task_id, entry, delta)
+
+    def close_streams(self):
+        """结束所有未收尾的流式条目（如调用中途异常）"""
+        for entry in self._open_streams.values():
+            TASK_LOG_STORAGE.set_content(self.task_id, entry, entry["content"], final=True)
+        self._open_streams.clear()
 
     def print_header(self, task: Task):
         # 控制台输出
-        print(f"\n{self.c_green}🔰 任务启动：{task.task_name}{self.c_reset}")
-        print(f"   任务描述：{task.task_content}")
-        print(f"   调用模型：{task.model}")
-        print(f"{self.c_dim}┌── 🏃 执行记录 {'─' * 30}{self.c_reset}")
+        self._emit_raw(INFO, f"\n{self.c_green}🔰 任务启动：{task.task_name}{self.c_reset}\n"
+                             f"   任务描述：{task.task_content}\n"
+                             f"   调用模型：{task.model}\n"
+                             f"{self.c_dim}┌── 🏃 执行记录 {'─' * 30}{self.c_reset}")
 
         # 内存存储
         self._save_log("header", f"任务启动：{task.task_name}\n描述：{task.task_content}\n模型：{task.model}")
 
-    def log_line(self, content: str, color: str = ""):
-        """打印带竖线的行（仅控制台）"""
-        prefix = f"{self.c_dim}│{self.c_reset}"
-        for line in content.split('\n'):
-            print(f"{prefix} {color}{line}{self.c_reset}")
+    def log_line(self, content: str, color: str = "", level: int = INFO):
+        """打印带竖线的行（仅控制台，按行拆分与着色在后台线程完成）"""
+        get_log_sink().emit(level, self.task_id, "line", content, color)
+
+    def _emit_raw(self, level: int, text: str):
+        get_log_sink().emit(level, self.task_id, "raw", text)
 
     def log_reasoning(self, content: str):
         if not content: return
-        self.log_line(f"🧠 {content}", self.c_yellow)
+        self.log_line(f"🧠 {content}", self.c_yellow, DEBUG)
         self._save_log("reasoning", content)
 
     def log_response(self, content: str):
@@ -81,14 +110,65 @@ class TaskLogger:
         self._save_log("tool_result", res_str)
 
     def log_error(self, error: str):
-        self.log_line(f"❌ {error}", self.c_red)
+        self.close_streams()
+        self.log_line(f"❌ {error}", self.c_red, ERROR)
         self._save_log("error", error)
 
+    def log_cache_hit(self, cache_key: str):
+        hit_str = f"命中响应缓存（{cache_key[:12]}），跳过模型请求"
+        self.log_line(f"♻️ {hit_str}", self.c_green)
+        self._save_log("cache_hit", hit_str)
+
+    def log_attachments(self, sizes: list):
+        """附件原文件大小与实际随请求发送的大小（base64 / 文本）"""
+        if not sizes:
+            return
+        lines = [f"{s['file']}：{s['file_bytes'] / 1024:.1f} KB → {s['payload_bytes'] / 1024:.1f} KB" for s in sizes]
+        total_before = sum(s["file_bytes"] for s in sizes)
+        total_after = sum(s["payload_bytes"] for s in sizes)
+        attach_str = f"附件大小（原文件 → 发送）：共 {total_before / 1024:.1f} KB → {total_after / 1024:.1f} KB\n" + "\n".join(lines)
+        self.log_line(f"📎 {attach_str}", self.c_dim)
+        self._save_log("attachments", attach_str)
+
+    def log_compaction(self, before_tokens: int, after_tokens: int, dropped: int):
+        compact_str = f"上下文压缩：约 {before_tokens} → {after_tokens} tokens"
+        if dropped:
+            compact_str += f"，移出窗口 {dropped} 条消息"
+        self.log_line(f"🗜️ {compact_str}", self.c_yellow)
+        self._save_log("compaction", compact_str)
+
+    def log_call_metrics(self, ttft: float, duration: float, completion_tokens: Optional[int], streamed: bool):
+        """记录单次模型调用的首 token 时延与生成速度（服务端未返回用量时 completion_tokens 为 None）"""
+        gen_time = duration - ttft if streamed else duration
+        if completion_tokens is None:
+            tokens_per_sec = None
+        else:
+            tokens_per_sec = completion_tokens / gen_time if gen_time > 0 else 0.0
+        self.call_metrics.append({
+            "ttft": ttft,
+            "duration": duration,
+            "completion_tokens": completion_tokens,
+            "tokens_per_sec": tokens_per_sec,
+            "streamed": streamed
+        })
+        if tokens_per_sec is None:
+            metrics_str = f"TTFT {ttft:.2f}s | 服务端未返回用量 | {duration:.2f}s"
+        else:
+            metrics_str = f"TTFT {ttft:.2f}s | {tokens_per_sec:.1f} tokens/s | {completion_tokens} tokens in {duration:.2f}s"
+        self.log_line(f"⏱ {metrics_str}", self.c_dim)
+        self._save_log("metrics", metrics_str)
+
+    def record_prompt_size(self, estimated_tokens: int, limit: int):
+        """记录本轮请求发送前的估算大小"""
+        self.usage["turns"].append({"estimated": estimated_tokens, "prompt": None, "limit": limit})
+
     def update_usage(self, response_usage):
         if response_usage:
             self.usage["prompt"] += response_usage.prompt_tokens
             self.usage["completion"] += response_usage.completion_tokens
             self.usage["total"] += response_usage.total_tokens
+            if self.usage["turns"] and self.usage["turns"][-1]["prompt"] is None:
+                self.usage["turns"][-1]["prompt"] = response_usage.prompt_tokens
 
     def print_footer(self, success: bool = True):
         duration = time.time() - self.start_time
@@ -100,9 +180,19 @@ class TaskLogger:
             end_line = f"{self.c_dim}└──{self.c_reset} {self.c_red}× 任务异常{self.c_reset}"
             status_text = "× 任务异常"
 
-        print(end_line)
         stats = f"Token Usage: {self.usage['total']} (P:{self.usage['prompt']} + C:{self.usage['completion']})\nTotal Time : {duration:.2f}s"
-        print(f"    {stats.replace(chr(10), chr(10) + '    ')}")  # 简单的缩进处理
-        print("-" * 50 + "\n\n\n\n\n")
-
-        self._save_log("footer", f"{status_text}\n{stats}")
\ No newline at end of file
+        if self.call_metrics:
+            avg_ttft = sum(m["ttft"] for m in self.call_metrics) / len(self.call_metrics)
+            stats += f"\nAvg TTFT   : {avg_ttft:.2f}s ({len(self.call_metrics)} calls)"
+        if self.usage["turns"]:
+            peak = max(turn["estimated"] for turn in self.usage["turns"])
+            stats += f"\nPeak Prompt: ~{peak} tokens ({len(self.usage['turns'])} turns)"
+        indented = stats.replace(chr(10), chr(10) + '    ')  # 简单的缩进处理
+        self._emit_raw(ERROR if not success else INFO, f"{end_line}\n    {indented}\n{'-' * 50}\n\n\n\n")
+
+        self._save_log("footer", f"{status_text}\n{stats}")
+
+    def finish(self):
+        """任务结束后调用：日志不再增长，可以落盘"""
+        self.close_streams()
+        TASK_LOG_STORAGE.finish(self.task_id)
\ No newline at end of file
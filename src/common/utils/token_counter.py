@@ -0,0 +1,209 @@
+import base64
+import binascii
+import json
+import math
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# 编码表在首次计数时才加载（本地没有缓存时会联网下载，不能阻塞模块导入）；加载失败后不再重试，退回字符估算
+_NOT_LOADED = object()
+_encoding: Any = _NOT_LOADED
+_encoding_lock = threading.Lock()
+
+# 每条消息的角色/分隔符等固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+# 每个工具定义的固定开销
+TOOL_OVERHEAD_TOKENS = 8
+# 无法解析尺寸的图片及音视频等非文本片段的估算值
+MEDIA_PART_TOKENS = 765
+# 图片按 512px 分块计费：低清固定 85，高清 85 + 170/块
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+# 解析图片尺寸时最多解码的 base64 前缀长度（JPEG 的 SOF 段可能在 EXIF 之后）
+_IMAGE_HEADER_B64_CHARS = 96 * 1024
+
+# 计数缓存：id(对象) -> (对象, token 数)；会话历史中的消息只追加不修改，同一对象的计数可以复用
+TokenCache = Dict[int, Tuple[Any, int]]
+
+
+class PromptTooLargeError(ValueError):
+    """请求估算大小超过模型的上下文上限，未发送"""
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is _NOT_LOADED:
+        with _encoding_lock:
+            if _encoding is _NOT_LOADED:
+                try:
+                    _encoding = tiktoken.get_encoding("cl100k_base") if tiktoken else None
+                except Exception as e:
+                    print(f"Warning: tiktoken 编码表加载失败，改用字符估算：{e}")
+                    _encoding = None
+    return _encoding
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return 0x4E00 <= code <= 0x9FFF or 0x3000 <= code <= 0x303F or 0xFF00 <= code <= 0xFFEF
+
+
+def estimate_text_tokens(text: Any) -> int:
+    """安装了 tiktoken 时精确计数，否则粗略估算：中日韩字符约 1 token/字，其余约 4 字符/token"""
+    if not text:
+        return 0
+    if not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False, default=str)
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = sum(1 for char in text if _is_cjk(char))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    index = 2
+    while index + 9 < len(data):
+        if data[index] != 0xFF:
+            return None
+        marker = data[index + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            index += 2
+            continue
+        # SOF0~SOF15（C4/C8/CC 不是帧头）
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[index + 5:index + 9])
+            return width, height
+        (length,) = struct.unpack(">H", data[index + 2:index + 4])
+        index += 2 + length
+    return None
+
+
+def image_size_from_bytes(data: bytes) -> Optional[Tuple[int, int]]:
+    """只读文件头解析 PNG/JPEG/GIF/WebP 的宽高，无法识别时返回 None"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] == b"\xff\xd8":
+        return _jpeg_size(data)
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8X":
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    return None
+
+
+def _data_url_image_size(url: str) -> Optional[Tuple[int, int]]:
+    if not url.startswith("data:") or ";base64," not in url:
+        return None
+    payload = url.split(";base64,", 1)[1][:_IMAGE_HEADER_B64_CHARS]
+    payload = payload[:len(payload) - len(payload) % 4]
+    try:
+        return image_size_from_bytes(base64.b64decode(payload))
+    except (binascii.Error, struct.error, ValueError):
+        return None
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "auto") -> int:
+    """按 OpenAI 的分块规则估算：先缩放到 2048 以内、短边不超过 768，再按 512px 分块"""
+    if detail == "low":
+        return IMAGE_BASE_TOKENS
+    if max(width, height) > 2048:
+        scale = 2048 / max(width, height)
+        width, height = width * scale, height * scale
+    if min(width, height) > 768:
+        scale = 768 / min(width, height)
+        width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+
+def _estimate_part_tokens(part: Any) -> int:
+    if not isinstance(part, dict):
+        return estimate_text_tokens(part)
+    part_type = part.get("type")
+    if part_type == "text":
+        return estimate_text_tokens(part.get("text"))
+    if part_type == "image_url":
+        image = part.get("image_url") or {}
+        detail = image.get("detail", "auto")
+        if detail == "low":
+            return IMAGE_BASE_TOKENS
+        size = _data_url_image_size(image.get("url") or "")
+        if size:
+            return estimate_image_tokens(size[0], size[1], detail)
+    return MEDIA_PART_TOKENS
+
+
+def _estimate_content_tokens(content: Any) -> int:
+    if isinstance(content, list):
+        return sum(_estimate_part_tokens(part) for part in content)
+    return estimate_text_tokens(content)
+
+
+def _count_message(message: Dict) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + _estimate_content_tokens(message.get("content"))
+    tokens += estimate_text_tokens(message.get("reasoning_content"))
+    if message.get("tool_calls"):
+        tokens += estimate_text_tokens(message["tool_calls"])
+    return tokens
+
+
+def _cached(obj: Any, cache: Optional[TokenCache], count) -> int:
+    if cache is None:
+        return count(obj)
+    entry = cache.get(id(obj))
+    if entry is not None and entry[0] is obj:
+        return entry[1]
+    tokens = count(obj)
+    cache[id(obj)] = (obj, tokens)
+    return tokens
+
+
+def estimate_message_tokens(message: Dict, cache: Optional[TokenCache] = None) -> int:
+    return _cached(message, cache, _count_message)
+
+
+def estimate_messages_tokens(messages: List[Dict], cache: Optional[TokenCache] = None) -> int:
+    return sum(estimate_message_tokens(message, cache) for message in messages)
+
+
+def _count_tools(tools: List[Dict]) -> int:
+    return sum(TOOL_OVERHEAD_TOKENS + estimate_text_tokens(tool.get("function", tool)) for tool in tools)
+
+
+def estimate_tools_tokens(tools: Optional[List[Dict]], cache: Optional[TokenCache] = None) -> int:
+    """工具 schema 随请求一起发送，同样占用上下文"""
+    if not tools:
+        return 0
+    return _cached(tools, cache, _count_tools)
+
+
+def count_prompt_tokens(messages: List[Dict], tools: Optional[List[Dict]] = None,
+                        cache: Optional[TokenCache] = None) -> int:
+    """估算一次请求的输入大小；传入 cache 时未变化的消息直接复用上次的计数"""
+    return estimate_messages_tokens(messages, cache) + estimate_tools_tokens(tools, cache)
+
+
+def prune_token_cache(cache: TokenCache, *live: Any) -> None:
+    """只保留仍在使用的消息/工具列表的计数，避免压缩产生的临时消息堆积"""
+    alive = set()
+    for objs in live:
+        if isinstance(objs, list):
+            alive.add(id(objs))
+            alive.update(id(obj) for obj in objs)
+    for key in [key for key in cache if key not in alive]:
+        del cache[key]
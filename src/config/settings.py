@@ -1,10 +1,97 @@
 import os
 import json
+from typing import Optional
 
 # 任务核心配置
 MAX_COUNT = 50
+# 每次发给模型的会话消息条数上限（不含开头的任务信息），与 token 预算分别生效；完整历史仍保留在任务上
 SESSION_MAX_SIZE = 50
 MAX_HANDLING_TASKS = 4
+DEFAULT_MODEL_CONCURRENCY = 1
+# 模型发出工具调用后释放槽位，工具结果就绪后再重新排队
+RELEASE_MODEL_SLOT_ON_TOOL_CALL = True
+
+# 模型请求 HTTP 连接池配置
+MODEL_REQUEST_TIMEOUT = 300.0
+HTTP_POOL_MAX_CONNECTIONS = 100
+HTTP_POOL_MAX_KEEPALIVE = 20
+HTTP_KEEPALIVE_EXPIRY = 30.0
+HTTP_ENABLE_HTTP2 = False  # 需要安装 h2（pip install httpx[http2]）
+# 流式接收模型回复（可在 models_config.json 的 streaming 中按模型覆盖）
+DEFAULT_MODEL_STREAMING = False
+
+# 相同参数的并发工具调用合并为一次执行：默认关闭，只读函数在 YAML 中声明 singleflight: true 开启
+TOOL_SINGLEFLIGHT_ENABLED = False
+# 工具调用默认超时（秒）与插件默认并发上限，插件/函数可在 YAML 中用 timeout、max_concurrency 覆盖；None 表示不限制
+TOOL_DEFAULT_TIMEOUT = 300
+TOOL_DEFAULT_MAX_CONCURRENCY = None
+# 同步插件函数的执行位置（YAML 中 executor: loop|thread|process 可覆盖）及线程池/进程池大小
+TOOL_DEFAULT_EXECUTOR = "thread"
+TOOL_THREAD_POOL_SIZE = 16
+TOOL_PROCESS_POOL_SIZE = os.cpu_count() or 2
+# 插件声明 isolation: process 时，每个插件默认启动的工作进程数（YAML 中 workers 可覆盖）
+PLUGIN_WORKER_COUNT = 2
+
+# 上下文压缩：每次模型调用前把会话历史压到 token 预算以内（可在 models_config.json 的 context_budget 中按模型覆盖，0 表示不压缩）
+DEFAULT_CONTEXT_BUDGET = 64000
+# 最近的若干条消息保持原样，不截断工具输出、不丢弃思考内容
+CONTEXT_KEEP_RECENT_MESSAGES = 6
+# 较早的工具输出超过该字符数时截断
+CONTEXT_TOOL_OUTPUT_MAX_CHARS = 2000
+# 用于总结被移出窗口的消息的模型，None 表示只插入省略提示
+CONTEXT_SUMMARY_MODEL = None
+# 模型上下文上限：发送前估算请求大小（消息 + 工具 schema + 图片），超出则直接报错而不上传
+# （可在 models_config.json 的 context_limit 中按模型覆盖，0 表示不检查）
+DEFAULT_CONTEXT_LIMIT = 128000
+
+# 模型响应磁盘缓存（任务可通过 use_cache 单独开启/关闭）
+RESPONSE_CACHE_ENABLED = False
+RESPONSE_CACHE_DIR = "response_cache"
+RESPONSE_CACHE_TTL = 24 * 3600
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# 控制台日志：color | plain | off，低于 LOG_CONSOLE_LEVEL 的记录（如思考内容为 DEBUG）不输出；
+# 单条内容超过 LOG_CONSOLE_MAX_CHARS 时截断（0 表示不截断），LOG_FILE_PATH 不为空时另写一份 JSON Lines
+# 输出由后台线程批量写出，队列满时丢弃而不阻塞任务执行；WebUI 中的日志不受这些配置影响
+LOG_CONSOLE_MODE = "color"
+LOG_CONSOLE_LEVEL = "INFO"
+LOG_CONSOLE_MAX_CHARS = 500
+LOG_FILE_PATH = None
+LOG_SINK_QUEUE_SIZE = 10000
+LOG_SINK_BATCH_SIZE = 256
+# 任务日志内存上限：每个任务最多保留的条目数、全部任务的总内存，以及内存中保留的已完成任务数，其余落盘到 TASK_LOG_SPILL_DIR
+TASK_LOG_MAX_ENTRIES_PER_TASK = 2000
+TASK_LOG_MEMORY_LIMIT = 64 * 1024 * 1024
+TASK_LOG_MAX_COMPLETED_IN_MEMORY = 50
+TASK_LOG_SPILL_DIR = "task_logs"
+# 看板增量：保留的已移除条目记录数，客户端版本早于被清理的记录时返回全量
+DASHBOARD_MAX_TOMBSTONES = 1000
+# 实时日志（SSE）：无变化时的心跳间隔，以及合并流式增量的最小推送间隔（秒）
+LOG_STREAM_HEARTBEAT = 15.0
+LOG_STREAM_MIN_INTERVAL = 0.1
+# PDF 附件：默认页范围（如 "1-3,5"，None 表示全部），附件路径也可写成 "xxx.pdf#pages=2-5" 单独指定；
+# VLM 模型按 PDF_DPI 渲染成图片，最多 PDF_MAX_PAGES 页，页数达到 PDF_PARALLEL_MIN_PAGES 时交给进程池并行渲染；
+# LLM 模型只提取文本层（不渲染），最多 PDF_TEXT_MAX_PAGES 页
+PDF_PAGE_RANGE = None
+PDF_MAX_PAGES = 10
+PDF_TEXT_MAX_PAGES = 100
+PDF_DPI = 144
+PDF_RENDER_WORKERS = os.cpu_count() or 2
+PDF_PARALLEL_MIN_PAGES = 4
+# 发给 VLM 的图片（含 PDF 渲染页）在 base64 编码前统一处理：长边缩到 IMAGE_MAX_EDGE 以内（0 表示不缩放），
+# 按 IMAGE_FORMAT（JPEG | WEBP，None 保持原格式）与 IMAGE_QUALITY 重新编码并去掉 EXIF；需要安装 Pillow，未安装时原样发送
+IMAGE_MAX_EDGE = 2048
+IMAGE_FORMAT = "JPEG"
+IMAGE_QUALITY = 85
+# 图片的 detail 参数（low | high | auto），可在 models_config.json 的 image_detail 中按模型覆盖，None 表示不设置
+DEFAULT_IMAGE_DETAIL = None
+# 附件编码结果缓存（按内容 SHA-256、模型类型与渲染参数），内存中按字节数 LRU，磁盘上一份 JSON
+ATTACHMENT_PAYLOAD_CACHE_DIR = "attachment_cache"
+ATTACHMENT_PAYLOAD_CACHE_BYTES = 256 * 1024 * 1024
+# 任务历史：SQLite 只追加存储，后台线程按批写入（TASK_HISTORY_FILE 为旧版 JSON，首次启动时导入）
+TASK_HISTORY_DB = "task_history.db"
+TASK_HISTORY_BATCH_SIZE = 100
+TASK_HISTORY_FLUSH_INTERVAL = 0.5
 TASK_HISTORY_FILE = "task_history.json"
 MODELS_CONFIG_FILE = "models_config.json"
 
@@ -27,6 +114,11 @@ DEFAULT_MODELS = _config_data.get("models", [])
 API_KEYS = _config_data.get("api_keys", {})
 BASE_URL = _config_data.get("base_urls", {})
 MODEL_TYPES = _config_data.get("model_types", {})
+MODEL_CONCURRENCY = _config_data.get("max_concurrency", {})
+MODEL_STREAMING = _config_data.get("streaming", {})
+MODEL_CONTEXT_BUDGET = _config_data.get("context_budget", {})
+MODEL_CONTEXT_LIMIT = _config_data.get("context_limit", {})
+MODEL_IMAGE_DETAIL = _config_data.get("image_detail", {})
 
 def _save_to_file():
     """内部辅助函数：保存当前内存配置到文件"""
@@ -34,7 +126,12 @@ def _save_to_file():
         "models": DEFAULT_MODELS,
         "api_keys": API_KEYS,
         "base_urls": BASE_URL,
-        "model_types": MODEL_TYPES
+        "model_types": MODEL_TYPES,
+        "max_concurrency": MODEL_CONCURRENCY,
+        "streaming": MODEL_STREAMING,
+        "context_budget": MODEL_CONTEXT_BUDGET,
+        "context_limit": MODEL_CONTEXT_LIMIT,
+        "image_detail": MODEL_IMAGE_DETAIL
     }
     try:
         with open(MODELS_CONFIG_FILE, "w", encoding="utf-8") as f:
@@ -45,13 +142,22 @@ def _save_to_file():
         return False
 
 
-def save_model_config(name: str, base_url: str, api_key: str, model_type: str = "LLM"):
+def _invalidate_client(name: str):
+    """模型配置变更后丢弃缓存的模型客户端"""
+    from src.common.utils.model_utils import invalidate_openai_client
+    invalidate_openai_client(name)
+
+
+def save_model_config(name: str, base_url: str, api_key: str, model_type: str = "LLM",
+                      max_concurrency: int = DEFAULT_MODEL_CONCURRENCY):
     """添加/更新模型配置"""
     if name not in DEFAULT_MODELS:
         DEFAULT_MODELS.append(name)
     API_KEYS[name] = api_key
     BASE_URL[name] = base_url
     MODEL_TYPES[name] = model_type
+    MODEL_CONCURRENCY[name] = max_concurrency
+    _invalidate_client(name)
     return _save_to_file()
 
 def delete_model_config(name: str):
@@ -62,6 +168,12 @@ def delete_model_config(name: str):
     API_KEYS.pop(name, None)
     BASE_URL.pop(name, None)
     MODEL_TYPES.pop(name, None)
+    MODEL_CONCURRENCY.pop(name, None)
+    MODEL_STREAMING.pop(name, None)
+    MODEL_CONTEXT_BUDGET.pop(name, None)
+    MODEL_CONTEXT_LIMIT.pop(name, None)
+    MODEL_IMAGE_DETAIL.pop(name, None)
+    _invalidate_client(name)
 
     print(f"模型 {name} 已从配置中移除")
     return _save_to_file()
@@ -70,6 +182,26 @@ def get_model_type(model_name: str) -> str:
     return MODEL_TYPES.get(model_name, "LLM")
 
 
+def get_model_concurrency(model_name: str) -> int:
+    return MODEL_CONCURRENCY.get(model_name, DEFAULT_MODEL_CONCURRENCY)
+
+
+def get_model_streaming(model_name: str) -> bool:
+    return MODEL_STREAMING.get(model_name, DEFAULT_MODEL_STREAMING)
+
+
+def get_model_context_budget(model_name: str) -> int:
+    return MODEL_CONTEXT_BUDGET.get(model_name, DEFAULT_CONTEXT_BUDGET)
+
+
+def get_model_context_limit(model_name: str) -> int:
+    return MODEL_CONTEXT_LIMIT.get(model_name, DEFAULT_CONTEXT_LIMIT)
+
+
+def get_model_image_detail(model_name: str) -> Optional[str]:
+    return MODEL_IMAGE_DETAIL.get(model_name, DEFAULT_IMAGE_DETAIL)
+
+
 def get_api_key(model_name: str) -> str:
     return API_KEYS.get(model_name, "")
 
@@ -1,21 +1,27 @@
 from typing import Dict, Optional, List
 from src.common.models import Model
 from src.config.settings import DEFAULT_MODELS
-from src.config.settings import DEFAULT_MODELS, get_model_type
+from src.config.settings import DEFAULT_MODELS, get_model_type, get_model_concurrency
 # 全局模型池
 # Key: 模型名称 (str), Value: Model 对象
 _model_pool: Dict[str, Model] = {}
 
 
 def init_model(model_name: str) -> Model:
-    """动态添加/初始化单个模型到内存池"""
+    """动态添加/初始化单个模型到内存池（已存在时刷新并发配置）"""
+    from src.mcp_server.task_manager import mark_model_ready
     if model_name in _model_pool:
-        return _model_pool[model_name]
+        model = _model_pool[model_name]
+        model.max_concurrency = get_model_concurrency(model_name)
+        mark_model_ready(model_name)
+        return model
     m_type = get_model_type(model_name)
-    model = Model(name=model_name, model_type=m_type)
+    model = Model(name=model_name, model_type=m_type, max_concurrency=get_model_concurrency(model_name))
 
     _model_pool[model_name] = model
-    print(f"已初始化模型: {model_name} ({m_type})")
+    print(f"已初始化模型: {model_name} ({m_type}, 并发槽位: {model.max_concurrency})")
+    # 新模型可能让等待中的任务变为可执行
+    mark_model_ready(model_name)
     return model
 
 
@@ -43,36 +49,40 @@ def list_models() -> List[Model]:
 def remove_model(model_name: str):
     """[核心修复] 从内存池中移除模型"""
     global _model_pool
+    from src.mcp_server.task_manager import discard_model_tasks
 
     # 必须使用字典的删除方式，不能用列表推导式
     if model_name in _model_pool:
         del _model_pool[model_name]
         print(f"已从内存移除模型: {model_name}")
+        # 排队中的任务不会再被调度，交给执行器以失败结束
+        discard_model_tasks(model_name)
     else:
         print(f"尝试移除模型 {model_name} 失败: 内存池中未找到")
 
 
 # --- 状态管理辅助函数 ---
 
-def update_model_state(model_name: str, state: str) -> None:
-    """更新模型状态"""
+def update_model_state(model_name: str, state: str, task_id: str) -> None:
+    """更新模型上某个任务槽位的状态"""
     model = get_model(model_name)
     if model:
         try:
-            model.state = state
+            model.set_task_state(task_id, state)
         except ValueError as e:
             print(f"状态更新失败: {e}")
 
 
-def bind_model_task(model_name: str, task_id: str, task_name: str) -> None:
-    """绑定模型到任务"""
+def bind_model_task(model_name: str, task_id: str, task_name: str) -> bool:
+    """为任务占用模型的一个并发槽位"""
     model = get_model(model_name)
     if model:
-        model.bind_task(task_id, task_name)
+        return model.bind_task(task_id, task_name)
+    return False
 
 
-def unbind_model_task(model_name: str) -> None:
-    """解绑模型任务"""
+def unbind_model_task(model_name: str, task_id: str) -> None:
+    """释放任务占用的模型槽位"""
     model = get_model(model_name)
     if model:
-        model.unbind_task()
\ No newline at end of file
+        model.unbind_task(task_id)
\ No newline at end of file
@@ -2,66 +2,131 @@ import asyncio
 import json
 import threading
 import re
+import time
+from typing import Dict, Optional
 from src.common.models import Task, ToolRecord
 from src.common.utils import get_current_datetime, datetime_to_str, TaskLogger
-from src.common.utils.model_utils import get_openai_client
-from src.config.settings import MAX_COUNT, MAX_HANDLING_TASKS
+from src.common.utils.model_utils import (
+    get_openai_client, stream_chat_completion, build_chat_response, response_to_cache_data
+)
+from src.common.utils.response_cache import get_response_cache, make_cache_key
+from src.common.utils.context_compactor import compact_messages
+from src.common.utils.token_counter import PromptTooLargeError, count_prompt_tokens, prune_token_cache
+from src.config.settings import (
+    MAX_COUNT, MAX_HANDLING_TASKS, RELEASE_MODEL_SLOT_ON_TOOL_CALL, RESPONSE_CACHE_ENABLED, get_model_streaming,
+    get_model_context_limit
+)
 from src.mcp_server.task_manager import (
     get_pending_task, add_handling_task, remove_handling_task,
-    get_handling_task_count, requeue_task
+    get_handling_task_count, bind_dispatcher, mark_model_ready, requeue_task, take_orphaned_tasks
 )
-from src.mcp_server.model_manager import get_model, update_model_state, bind_model_task, unbind_model_task
+from src.mcp_server.model_manager import update_model_state, bind_model_task, unbind_model_task
 from src.common.utils.history_utils import write_task_history, add_model_task_result
 from src.mcp_server.tool_manager import add_executing_tool, remove_executing_tool
 from src.plugins.tool_call import call_plugin_function
 
+# 等待下一轮模型槽位的执行中任务：task_id -> Future（调度器授予槽位时完成）
+_turn_waiters: Dict[str, asyncio.Future] = {}
+
+
+class ModelUnavailableError(RuntimeError):
+    """任务所用模型已被移除或无法占用槽位"""
+
 
 async def execute_task_handler() -> None:
-    """任务执行处理器（持续监控队列）"""
+    """任务执行处理器（事件驱动：任务入队、任务完成、模型上线时被唤醒）"""
     print(">>> 任务执行处理器已启动，正在监听队列...")
+    wakeup = bind_dispatcher(asyncio.get_running_loop())
     while True:
+        # 先清除信号再扫描队列，扫描期间到达的通知不会丢失
+        wakeup.clear()
         try:
-            if get_handling_task_count() >= MAX_HANDLING_TASKS:
-                await asyncio.sleep(1.0)
-                continue
+            dispatch_pending_tasks()
+        except Exception as e:
+            print(f"Handler Loop 异常: {e}")
+        await wakeup.wait()
 
-            task = get_pending_task()
-            if not task:
-                await asyncio.sleep(1.0)
-                continue
 
-            # 捕获任务后不立即打印大段信息，交给 logger 在 execute_task 里打印
-            model = get_model(task.model)
-            if not model:
-                print(f"警告：模型 {task.model} 未初始化，任务 {task.task_name} 重新入队")
-                requeue_task(task)
-                await asyncio.sleep(2.0)
-                continue
+def dispatch_pending_tasks() -> int:
+    """
+    持续取出模型有空闲槽位的任务并派发：
+    续跑任务唤醒其等待中的协程，新任务在处理名额内启动
+    返回本轮派发的次数
+    """
+    dispatched = 0
+    for task in take_orphaned_tasks():
+        fail_task_turn(task, f"模型 {task.model} 已被移除，任务终止")
 
-            if model.state == "idle":
-                update_model_state(task.model, "think")
-                asyncio.create_task(execute_task(task))
-            else:
-                await asyncio.sleep(2)
-                requeue_task(task)
-
-        except Exception as e:
-            print(f"Handler Loop 异常: {e}")
-            await asyncio.sleep(1.0)
+    while True:
+        task = get_pending_task(allow_new=get_handling_task_count() < MAX_HANDLING_TASKS)
+        if not task:
+            break
+
+        # 同步占用模型槽位与处理名额，避免同一轮内重复派发
+        if not bind_model_task(task.model, task.task_id, task.task_name):
+            # 取出后模型被移除或槽位已被占用，不能在没有槽位的情况下运行
+            fail_task_turn(task, f"无法占用模型 {task.model} 的槽位，任务终止")
+            continue
+        waiter = _turn_waiters.pop(task.task_id, None)
+        if waiter is not None:
+            if waiter.done():
+                # 等待方已被取消，归还槽位
+                release_model_slot(task)
+                continue
+            waiter.set_result(None)
+        else:
+            add_handling_task(task)
+            asyncio.create_task(execute_task(task))
+        dispatched += 1
+    return dispatched
+
+
+def fail_task_turn(task: Task, err_msg: str) -> None:
+    """
+    无法再调度的任务以失败结束：
+    续跑任务让其等待中的协程抛出 ModelUnavailableError，新任务直接记录结果
+    """
+    waiter = _turn_waiters.pop(task.task_id, None)
+    if waiter is not None:
+        if not waiter.done():
+            waiter.set_exception(ModelUnavailableError(err_msg))
+        return
+
+    print(f"任务 {task.task_name} 未执行: {err_msg}")
+    task.add_session_history({"role": "system", "content": err_msg})
+    task.state = "completed"
+    task.finish_time = datetime_to_str(get_current_datetime())
+    record_task_result(task)
+
+
+def release_model_slot(task: Task) -> None:
+    """释放任务占用的模型槽位，让同模型的其他任务可以调度"""
+    unbind_model_task(task.model, task.task_id)
+    mark_model_ready(task.model)
+
+
+async def wait_for_model_turn(task: Task) -> None:
+    """排回模型队列，等待调度器重新分配槽位"""
+    waiter = asyncio.get_running_loop().create_future()
+    _turn_waiters[task.task_id] = waiter
+    requeue_task(task)
+    await waiter
 
 
 async def execute_task(task: Task) -> None:
     """执行单个任务"""
     add_handling_task(task)
     task.state = "handling"
-    bind_model_task(task.model, task.task_id, task.task_name)
 
     # 使用从 utils 导入的 Logger
     logger = TaskLogger(task.task_id, task.task_name)
     logger.print_header(task)
+    logger.log_attachments(task.attachment_sizes)
 
     count = 0
     is_success = False
+    # 首轮槽位由调度器在派发时占用
+    holds_slot = True
 
     try:
         while True:
@@ -72,12 +137,19 @@ async def execute_task(task: Task) -> None:
                 logger.log_error(err_msg)
                 break
 
-            update_model_state(task.model, "think")
-            bind_model_task(task.model, task.task_id, task.task_name)
+            if not holds_slot:
+                try:
+                    await wait_for_model_turn(task)
+                except ModelUnavailableError as e:
+                    logger.log_error(str(e))
+                    task.add_session_history({"role": "system", "content": str(e)})
+                    break
+                holds_slot = True
+            update_model_state(task.model, "think", task.task_id)
 
             # --- 模型调用 ---
             try:
-                response = await model_call(task)
+                response = await model_call(task, logger)
 
                 if not response:
                     raise ValueError("模型未返回有效响应")
@@ -116,7 +188,6 @@ async def execute_task(task: Task) -> None:
                         logger.log_tool_call(tool_call.function.name, tool_call.function.arguments)
 
                 # 更新历史
-                update_model_state(task.model, "wait")
                 task.add_session_history({
                     'role': 'assistant',
                     'content': content,
@@ -124,6 +195,13 @@ async def execute_task(task: Task) -> None:
                     'tool_calls': tool_calls_dict if tool_calls_dict else None,
                 })
 
+                # 工具执行期间不占用模型，结果就绪后重新排队
+                if tool_calls and RELEASE_MODEL_SLOT_ON_TOOL_CALL:
+                    release_model_slot(task)
+                    holds_slot = False
+                else:
+                    update_model_state(task.model, "wait", task.task_id)
+
             except Exception as e:
                 err_msg = f"模型调用异常: {str(e)}"
                 logger.log_error(err_msg)
@@ -213,39 +291,84 @@ async def execute_task(task: Task) -> None:
         logger.print_footer(success=is_success)
 
     finally:
+        if holds_slot:
+            unbind_model_task(task.model, task.task_id)
         remove_handling_task(task)
-        last_result = "No result"
-        if task.session_history and len(task.session_history) > 0:
-            last_msg = task.session_history[-1]
-            last_result = last_msg.get('content', '')
-        add_model_task_result(task.task_name, last_result)
-        update_model_state(task.model, "idle")
-        unbind_model_task(task.model)
-        history_data = {
-            "task_id": task.task_id,
-            "task_name": task.task_name,
-            "task_result": last_result,
-            "create_time": task.create_time,
-            "finish_time": task.finish_time,
-            "model_name": task.model
-        }
-        write_task_history(history_data)
-
-
-
-async def model_call(task: Task):
+        record_task_result(task)
+        logger.finish()
+        mark_model_ready(task.model)
+
+
+def record_task_result(task: Task) -> None:
+    """记录任务最终结果并写入任务历史"""
+    last_result = "No result"
+    if task.session_history and len(task.session_history) > 0:
+        last_msg = task.session_history[-1]
+        last_result = last_msg.get('content', '')
+    add_model_task_result(task.task_name, last_result)
+    history_data = {
+        "task_id": task.task_id,
+        "task_name": task.task_name,
+        "task_result": last_result,
+        "create_time": task.create_time,
+        "finish_time": task.finish_time,
+        "model_name": task.model
+    }
+    write_task_history(history_data)
+
+
+
+async def model_call(task: Task, logger: Optional[TaskLogger] = None):
     if task.model:
         client = get_openai_client(model_name=task.model)
         if not client:
             raise ValueError(f"无法获取模型客户端: {task.model}")
 
-        # 使用 await 调用
-        response = await client.chat.completions.create(
+        request = dict(
             model=task.model,
-            messages=task.session_history,
-            tools=task.get_tool_info() if task.get_tool_info() else None,
-
+            messages=await compact_messages(task, logger),
+            tools=task.get_tool_info() or None,
         )
+
+        # 发送前估算请求大小，超出模型上下文上限时不上传
+        prompt_tokens = count_prompt_tokens(request["messages"], request["tools"], task.token_cache)
+        prune_token_cache(task.token_cache, task.session_history, request["messages"], request["tools"])
+        limit = get_model_context_limit(task.model)
+        if logger:
+            logger.record_prompt_size(prompt_tokens, limit)
+        if limit and prompt_tokens > limit:
+            raise PromptTooLargeError(f"请求约 {prompt_tokens} tokens，超过模型 {task.model} 的上下文上限 {limit}，未发送")
+
+        # 响应缓存：命中时完全跳过网络请求
+        cache_key = None
+        use_cache = task.use_cache if task.use_cache is not None else RESPONSE_CACHE_ENABLED
+        if use_cache:
+            cache_key = make_cache_key(task.model, request["messages"], request["tools"])
+            cached = await asyncio.to_thread(get_response_cache().get, cache_key)
+            if cached is not None:
+                if logger:
+                    logger.log_cache_hit(cache_key)
+                return build_chat_response(cached["message"], finish_reason=cached.get("finish_reason"))
+
+        start = time.perf_counter()
+
+        if get_model_streaming(task.model):
+            # 流式：思考/回复增量实时写入日志
+            on_delta = logger.log_stream_delta if logger else None
+            response, ttft = await stream_chat_completion(client, on_delta=on_delta, **request)
+            streamed = True
+        else:
+            # 使用 await 调用
+            response = await client.chat.completions.create(**request)
+            ttft = time.perf_counter() - start
+            streamed = False
+
+        if logger and response:
+            usage = getattr(response, "usage", None)
+            completion_tokens = getattr(usage, "completion_tokens", None)
+            logger.log_call_metrics(ttft, time.perf_counter() - start, completion_tokens, streamed)
+        if cache_key and response:
+            await asyncio.to_thread(get_response_cache().put, cache_key, response_to_cache_data(response))
         return response
     return None
 
@@ -1,15 +1,54 @@
-from typing import List, Deque, Optional
+import asyncio
+import os
+import threading
+from typing import List, Deque, Dict, Optional, Set
 from collections import deque
 from src.common.models import Task
 from src.common.utils import generate_task_id
 from src.common.utils import get_current_datetime, datetime_to_str
-from src.common.utils.file_utils import build_file_metadata
+from src.common.utils.attachment_store import get_attachment_cache
+from src.common.utils.file_utils import apply_image_detail, payload_size, split_page_spec
+from src.config.settings import get_model_image_detail
 from src.mcp_server.model_manager import get_model
-# 全局任务队列（等待执行）
-_task_queue: Deque[Task] = deque()
+# 按模型划分的等待队列（同一模型内保持 FIFO）
+_model_queues: Dict[str, Deque[Task]] = {}
+# 已在执行中、等待下一轮模型调用的任务（同一模型内优先于新任务，保持 FIFO）
+_resume_queues: Dict[str, Deque[Task]] = {}
+# 有等待任务且可能可调度的模型轮转环，配合集合去重，单次调度决策 O(1)
+_ready_models: Deque[str] = deque()
+_ready_model_set: Set[str] = set()
+# 只剩新任务、但处理名额已满而暂停调度的模型
+_capacity_parked_models: Set[str] = set()
+# 模型已被移除、等待调度器以失败结束的任务
+_orphaned_tasks: Deque[Task] = deque()
+# 队列会被 WebUI 线程与执行器线程同时访问
+_queue_lock = threading.Lock()
 # 全局处理中任务列表
 _handling_task_list: List[Task] = []
 
+# 调度器唤醒信号（由执行器事件循环绑定，任务入队/完成时触发）
+_dispatch_event: Optional[asyncio.Event] = None
+_dispatch_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def bind_dispatcher(loop: asyncio.AbstractEventLoop) -> asyncio.Event:
+    """执行器启动时调用：在其事件循环上创建唤醒信号"""
+    global _dispatch_event, _dispatch_loop
+    _dispatch_loop = loop
+    _dispatch_event = asyncio.Event()
+    return _dispatch_event
+
+
+def notify_dispatcher() -> None:
+    """唤醒调度器（线程安全，可在 WebUI 线程或执行器线程中调用）"""
+    if _dispatch_event is None or _dispatch_loop is None:
+        return
+    try:
+        _dispatch_loop.call_soon_threadsafe(_dispatch_event.set)
+    except RuntimeError:
+        # 事件循环已关闭
+        pass
+
 
 def init_task(task: Task) -> None:
     task.task_id = generate_task_id()
@@ -34,11 +73,15 @@ def init_task(task: Task) -> None:
         model_obj = get_model(task.model)
         # 如果模型还没初始化(理论上不会)，默认当作 LLM 处理
         is_vlm = (model_obj is not None) and getattr(model_obj, 'model_type', 'LLM') == 'VLM'
+        attachment_cache = get_attachment_cache()
 
         # 2. 处理附件
         for file_path in task.file_path:
             try:
-                media_payloads = build_file_metadata(file_path)
+                # 同一附件按内容哈希缓存编码结果，多个任务引用时只读取/渲染一次
+                media_payloads = attachment_cache.get_payloads(file_path, "VLM" if is_vlm else "LLM")
+                if is_vlm:
+                    media_payloads = apply_image_detail(media_payloads, get_model_image_detail(task.model))
 
                 # [新增] 过滤逻辑
                 filtered_payloads = []
@@ -58,6 +101,12 @@ def init_task(task: Task) -> None:
                         })
 
                 content_list.extend(filtered_payloads)
+                source_path = split_page_spec(file_path)[0]
+                task.attachment_sizes.append({
+                    "file": os.path.basename(source_path),
+                    "file_bytes": os.path.getsize(source_path),
+                    "payload_bytes": payload_size(filtered_payloads)
+                })
 
             except Exception as e:
                 print(f"Warning: 附件处理失败 {file_path}: {e}")
@@ -78,24 +127,122 @@ def init_task(task: Task) -> None:
             "content": task.task_content
         })
 
+    # 入队前解析好工具 schema，之后每轮直接复用（插件变更时自动重新解析）
+    task.get_tool_info()
+
     task.state = "waiting"
-    _task_queue.append(task)
+    _enqueue_task(task)
+    notify_dispatcher()
+
+
+def _enqueue_task(task: Task, resume: bool = False) -> None:
+    queues = _resume_queues if resume else _model_queues
+    with _queue_lock:
+        queues.setdefault(task.model, deque()).append(task)
+        _mark_ready(task.model)
+
+
+def _mark_ready(model_name: str) -> None:
+    """将模型放入轮转环（调用方需持有 _queue_lock）"""
+    if model_name not in _ready_model_set:
+        _ready_model_set.add(model_name)
+        _ready_models.append(model_name)
+
+
+def _has_queued(model_name: str) -> bool:
+    return bool(_resume_queues.get(model_name) or _model_queues.get(model_name))
+
 
-def get_pending_task() -> Optional[Task]:
-    """获取队列首任务（非阻塞）"""
-    if _task_queue:
-        return _task_queue.popleft()
+def mark_model_ready(model_name: str) -> None:
+    """模型释放槽位/上线时调用：若其仍有等待任务，则重新参与调度"""
+    with _queue_lock:
+        if _has_queued(model_name):
+            _mark_ready(model_name)
+    notify_dispatcher()
+
+
+def get_pending_task(allow_new: bool = True) -> Optional[Task]:
+    """
+    取出下一个可执行任务（非阻塞）
+    按模型轮转，只返回模型有空闲槽位的任务，续跑任务优先于新任务；
+    槽位占满时将模型移出轮转环，待 mark_model_ready 再放回，因此每次决策均摊 O(1)
+    :param allow_new: 处理名额已满时为 False，只派发续跑任务
+    """
+    with _queue_lock:
+        while _ready_models:
+            model_name = _ready_models.popleft()
+            _ready_model_set.discard(model_name)
+
+            resume_queue = _resume_queues.get(model_name)
+            new_queue = _model_queues.get(model_name)
+            if not resume_queue and not new_queue:
+                _resume_queues.pop(model_name, None)
+                _model_queues.pop(model_name, None)
+                continue
+
+            model = get_model(model_name)
+            if not model:
+                # 模型已被移除（如移除后才排回的续跑任务），交给调度器以失败结束
+                _drain_model_queues(model_name)
+                continue
+            if not model.has_free_slot():
+                continue
+
+            if resume_queue:
+                task = resume_queue.popleft()
+            elif allow_new:
+                task = new_queue.popleft()
+            else:
+                _capacity_parked_models.add(model_name)
+                continue
+
+            if _has_queued(model_name):
+                _mark_ready(model_name)
+            return task
     return None
 
+
+def _drain_model_queues(model_name: str) -> None:
+    """将模型的续跑队列与新任务队列移入待失败列表（调用方需持有 _queue_lock）"""
+    _orphaned_tasks.extend(_resume_queues.pop(model_name, ()))
+    _orphaned_tasks.extend(_model_queues.pop(model_name, ()))
+    _capacity_parked_models.discard(model_name)
+
+
+def discard_model_tasks(model_name: str) -> None:
+    """模型被移除时调用：清空其等待队列，由调度器让这些任务以失败结束"""
+    with _queue_lock:
+        _drain_model_queues(model_name)
+    notify_dispatcher()
+
+
+def take_orphaned_tasks() -> List[Task]:
+    """取出所有因模型被移除而无法调度的任务"""
+    with _queue_lock:
+        tasks = list(_orphaned_tasks)
+        _orphaned_tasks.clear()
+    return tasks
+
+
+def get_pending_tasks() -> List[Task]:
+    """获取所有等待中的任务（按模型分组，组内保持入队顺序）"""
+    with _queue_lock:
+        return [task for queue in _model_queues.values() for task in queue]
+
 def add_handling_task(task: Task) -> None:
     """添加到处理中列表"""
     if task not in _handling_task_list:
         _handling_task_list.append(task)
 
 def remove_handling_task(task: Task) -> None:
-    """从处理中列表移除"""
+    """从处理中列表移除，并让因名额已满而暂停的模型重新参与调度"""
     if task in _handling_task_list:
         _handling_task_list.remove(task)
+    with _queue_lock:
+        for model_name in _capacity_parked_models:
+            _mark_ready(model_name)
+        _capacity_parked_models.clear()
+    notify_dispatcher()
 
 def get_handling_task_count() -> int:
     """获取处理中任务数"""
@@ -103,9 +250,11 @@ def get_handling_task_count() -> int:
 
 
 def get_task_queue_size() -> int:
-    """获取队列大小"""
-    return len(_task_queue)
+    """获取等待中的新任务数"""
+    with _queue_lock:
+        return sum(len(queue) for queue in _model_queues.values())
 
 def requeue_task(task: Task) -> None:
-    if task not in _task_queue:
-        _task_queue.append(task)
\ No newline at end of file
+    """执行中的任务排回其模型的续跑队列，等待下一轮模型调用"""
+    _enqueue_task(task, resume=True)
+    notify_dispatcher()
\ No newline at end of file
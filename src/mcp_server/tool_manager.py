@@ -14,9 +14,15 @@ def add_executing_tool(tool: ToolRecord) -> None:
 def remove_executing_tool(tool: ToolRecord) -> None:
     """从处理中列表移除"""
     if tool in _executing_tool_list:
-        tool.state = "completed"
+        if tool.state == "executing":
+            tool.state = "completed"
         _executing_tool_list.remove(tool)
 
+def mark_tool_timeout(tool: ToolRecord) -> None:
+    """标记工具调用超时（执行器收集完本轮结果后再移除）"""
+    if tool in _executing_tool_list:
+        tool.state = "timeout"
+
 def get_handling_tool_count() -> int:
     """获取处理中任务数"""
     return len(_executing_tool_list)
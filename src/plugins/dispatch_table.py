@@ -0,0 +1,155 @@
+import asyncio
+import importlib
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from src.config.settings import (
+    TOOL_SINGLEFLIGHT_ENABLED, TOOL_DEFAULT_TIMEOUT, TOOL_DEFAULT_MAX_CONCURRENCY, TOOL_DEFAULT_EXECUTOR
+)
+from src.plugins.tool_pool import VALID_EXECUTORS
+
+PLUGINS_ROOT = Path(__file__).parent.resolve()
+
+
+VALID_ISOLATIONS = ("none", "process")
+
+
+class ToolEntry:
+    """已解析好的插件函数：可调用对象 + 调度配置，调用时无需再读配置或导入模块"""
+
+    def __init__(self, mcp_type: str, func_name: str, func: Optional[Callable], plugin_config: Dict,
+                 func_config: Dict, plugin_collection_dir: str):
+        self.mcp_type = mcp_type
+        self.func_name = func_name
+        # isolation: process 的插件不在主进程导入，func 为 None，调用转发给工作进程
+        self.func = func
+        self.is_async = asyncio.iscoroutinefunction(func)
+        self.plugin_collection_dir = plugin_collection_dir
+        self.isolation = plugin_config.get("isolation", "none")
+        self.workers = plugin_config.get("workers")
+        self.cache_config: Optional[Dict] = func_config.get("cache")
+        self.singleflight = _get_option(plugin_config, func_config, "singleflight", TOOL_SINGLEFLIGHT_ENABLED)
+        self.timeout = _get_option(plugin_config, func_config, "timeout", TOOL_DEFAULT_TIMEOUT)
+        self.executor = _get_option(plugin_config, func_config, "executor", TOOL_DEFAULT_EXECUTOR)
+        self.plugin_max_concurrency = plugin_config.get("max_concurrency", TOOL_DEFAULT_MAX_CONCURRENCY)
+        self.max_concurrency = func_config.get("max_concurrency")
+
+
+class _DispatchTable:
+    """一次构建完成后整体替换，调用方拿到的始终是完整的一份"""
+
+    def __init__(self, entries: Dict[str, ToolEntry], errors: Dict[str, str], plugins: Set[str]):
+        self.entries = entries
+        self.errors = errors
+        self.plugins = plugins
+
+
+_table = _DispatchTable({}, {}, set())
+_build_lock = threading.Lock()
+
+
+def _get_option(plugin_config: Dict, func_config: Dict, field: str, default: Any) -> Any:
+    """函数级配置优先，其次插件级配置，最后是全局默认值"""
+    return func_config.get(field, plugin_config.get(field, default))
+
+
+def make_tool_key(mcp_type: str, func_name: str) -> str:
+    return f"{mcp_type}__{func_name}"
+
+
+def drop_plugin_modules(mcp_type: str) -> None:
+    """从 sys.modules 移除插件包及其子模块，下次导入时读取磁盘上的新代码"""
+    for name in [m for m in sys.modules if m == mcp_type or m.startswith(mcp_type + ".")]:
+        del sys.modules[name]
+
+
+def _check_plugin_dir(plugin_dir: Path) -> None:
+    if not plugin_dir.is_dir():
+        raise ValueError(f"插件目录不存在：{plugin_dir}")
+    init_file = plugin_dir / "__init__.py"
+    if not init_file.exists():
+        raise ValueError(f"插件目录缺少__init__.py：{init_file}")
+
+
+def _import_plugin(mcp_type: str, plugin_dir: Path, reload: bool):
+    _check_plugin_dir(plugin_dir)
+
+    plugin_collection_dir = str(plugin_dir.parent)
+    if plugin_collection_dir not in sys.path:
+        sys.path.append(plugin_collection_dir)
+
+    module = sys.modules.get(mcp_type)
+    if module is not None and not reload:
+        return module
+    # 热替换：整包（含子模块）重新导入，避免只 reload 包本身时子模块仍是旧代码
+    drop_plugin_modules(mcp_type)
+    importlib.invalidate_caches()
+    try:
+        return importlib.import_module(mcp_type)  # mcp_type=插件目录名=包名
+    except Exception as e:
+        raise ValueError(f"导入插件包失败 {mcp_type}：{str(e)}")
+
+
+def rebuild_dispatch_table(config_data: Dict, reload_plugins: Iterable[str] = ()) -> None:
+    """
+    根据插件配置构建 mcp_type__func_name -> ToolEntry 的调度表
+    reload_plugins 中的插件会重新导入（注册/覆盖安装插件时使用）
+    """
+    global _table
+    reload_plugins = set(reload_plugins)
+    with _build_lock:
+        entries: Dict[str, ToolEntry] = {}
+        errors: Dict[str, str] = {}
+        for mcp_type, plugin_config in (config_data or {}).items():
+            if not isinstance(plugin_config, dict):
+                continue
+            functions = plugin_config.get("functions") or {}
+            isolation = plugin_config.get("isolation", "none")
+            try:
+                if isolation not in VALID_ISOLATIONS:
+                    raise ValueError(f"插件{mcp_type}配置了无效的 isolation：{isolation}")
+                plugin_dir = (PLUGINS_ROOT / plugin_config["dir_path"]).resolve()
+                if isolation == "process":
+                    _check_plugin_dir(plugin_dir)
+                    module = None
+                else:
+                    module = _import_plugin(mcp_type, plugin_dir, mcp_type in reload_plugins)
+            except Exception as e:
+                # 导入失败不影响其他插件，调用时再把原因返回给模型
+                print(f"Warning: 插件 {mcp_type} 加载失败：{e}")
+                for func_name in functions:
+                    errors[make_tool_key(mcp_type, func_name)] = str(e)
+                continue
+
+            for func_name, func_config in functions.items():
+                key = make_tool_key(mcp_type, func_name)
+                if not func_config:
+                    errors[key] = f"插件{mcp_type}无函数配置：{func_name}"
+                    continue
+                if module is not None and not hasattr(module, func_name):
+                    errors[key] = f"插件包{mcp_type}中无函数：{func_name}"
+                    continue
+                entry = ToolEntry(mcp_type, func_name, getattr(module, func_name, None), plugin_config, func_config,
+                                  str(plugin_dir.parent))
+                if entry.executor not in VALID_EXECUTORS:
+                    errors[key] = f"插件{mcp_type}的函数{func_name}配置了无效的 executor：{entry.executor}"
+                    continue
+                entries[key] = entry
+
+        _table = _DispatchTable(entries, errors, set(config_data or {}))
+
+
+def get_tool_entry(mcp_type: str, func_name: str) -> ToolEntry:
+    """按 mcp_type__func_name 查表，找不到时抛出 ValueError 说明原因"""
+    table = _table
+    key = make_tool_key(mcp_type, func_name)
+    entry = table.entries.get(key)
+    if entry is not None:
+        return entry
+    if key in table.errors:
+        raise ValueError(table.errors[key])
+    if mcp_type not in table.plugins:
+        raise ValueError(f"未找到插件配置：{mcp_type}")
+    raise ValueError(f"插件{mcp_type}无函数配置：{func_name}")
@@ -1,37 +1,70 @@
 import os
-import yaml
-from typing import Dict, Optional, List
-
-GLOBAL_TOOL_YAML = os.path.join(os.path.dirname(__file__), "tool.yaml")
-PLUGIN_COLLECTION_DIR = os.path.join(os.path.dirname(__file__), "plugin_collection")
+import threading
+from typing import Dict, Optional, List, Iterable
+from src.plugins.dispatch_table import rebuild_dispatch_table, drop_plugin_modules
+from src.plugins.plugin_registry import PLUGIN_COLLECTION_DIR, PluginRegistryStore
+from src.plugins.tool_cache import invalidate_plugin_cache
+from src.plugins.worker_pool import close_plugin_workers
 
 CONFIG_DATA = {}
+# 插件配置版本号：配置内容变化时递增，任务据此判断缓存的工具 schema 是否过期
+_REGISTRY_VERSION = 0
+# "plugin/func" -> 发给模型的 schema；plugin -> 该插件下所有 "plugin/func"
+_SCHEMA_INDEX: Dict[str, Dict] = {}
+_PLUGIN_TOOLS: Dict[str, List[str]] = {}
+
+_registry_store = PluginRegistryStore()
+# 串行化注册/注销，保证注册表文件、CONFIG_DATA、调度表与 schema 索引一致
+_registry_lock = threading.Lock()
 
 
 def load_global_tool_yaml() -> Dict:
-    """加载全局tool.yaml配置（返回扁平字典，顶层为mcp_type）"""
+    """从注册表加载全部插件配置（返回扁平字典，顶层为mcp_type；首次启动时由tool.yaml迁移）"""
     try:
-        with open(GLOBAL_TOOL_YAML, "r", encoding="utf-8") as f:
-            global CONFIG_DATA
-            CONFIG_DATA = yaml.safe_load(f) or {}
-        if not isinstance(CONFIG_DATA, dict):
-            raise TypeError(f"tool.yaml格式错误，需为字典结构（当前类型：{type(CONFIG_DATA)}）")
-        return CONFIG_DATA
-    except yaml.YAMLError as e:
-        raise ValueError(f"解析tool.yaml失败：{str(e)}")
+        return _registry_store.load()
+    except (ValueError, TypeError):
+        raise
     except Exception as e:
-        # 首次启动可能文件不存在，允许返回空
-        if isinstance(e, FileNotFoundError):
-            return {}
-        raise RuntimeError(f"加载tool.yaml异常：{str(e)}")
+        raise RuntimeError(f"加载插件注册表异常：{str(e)}")
 
 
 def get_config_data():
     return CONFIG_DATA
 
 
-def init_config_data():
-    load_global_tool_yaml()
+def get_registry_version() -> int:
+    return _REGISTRY_VERSION
+
+
+def _build_schema_index(config_data: Dict) -> None:
+    global _SCHEMA_INDEX, _PLUGIN_TOOLS
+    schema_index, plugin_tools = {}, {}
+    for mcp_type, plugin_config in config_data.items():
+        if not isinstance(plugin_config, dict) or 'functions' not in plugin_config:
+            continue
+        identifiers = plugin_tools.setdefault(mcp_type, [])
+        for func_name, tool_config in (plugin_config['functions'] or {}).items():
+            identifier = f"{mcp_type}/{func_name}"
+            schema_index[identifier] = _to_tool_schema(tool_config or {})
+            identifiers.append(identifier)
+    _SCHEMA_INDEX, _PLUGIN_TOOLS = schema_index, plugin_tools
+
+
+def _apply_config(config_data: Dict, reload_plugins: Iterable[str] = ()) -> None:
+    """以新的插件配置替换内存视图，并重建调度表与 schema 索引"""
+    global CONFIG_DATA, _REGISTRY_VERSION
+    previous = CONFIG_DATA
+    CONFIG_DATA = config_data
+    rebuild_dispatch_table(config_data, reload_plugins)
+    if config_data != previous or _REGISTRY_VERSION == 0:
+        _build_schema_index(config_data)
+        _REGISTRY_VERSION += 1
+
+
+def init_config_data(reload_plugins: Iterable[str] = ()):
+    """从注册表加载插件配置并重建调度表与 schema 索引（启动时调用）"""
+    with _registry_lock:
+        _apply_config(load_global_tool_yaml(), reload_plugins)
 
 
 def get_plugin_config(mcp_type: str) -> Optional[Dict]:
@@ -46,6 +79,11 @@ def get_plugin_config(mcp_type: str) -> Optional[Dict]:
         return {}
 
 
+def _to_tool_schema(tool_config: Dict) -> Dict:
+    """只保留发给模型的 schema 字段，去掉 cache 等调度配置"""
+    return {"type": tool_config.get("type", "function"), "function": tool_config.get("function", {})}
+
+
 def get_plugin_tool_info(tools: List[str]) -> Optional[List[Dict]]:
     """
     根据工具列表获取详细配置
@@ -53,7 +91,6 @@ def get_plugin_tool_info(tools: List[str]) -> Optional[List[Dict]]:
     1. "plugin_name/func_name" -> 获取指定函数
     2. "plugin_name" -> 获取该插件下所有函数
     """
-    global_config = get_config_data()
     tool_pool = []
     # 用于去重，防止同一个函数被添加多次（key: 真实函数名）
     added_func_names = set()
@@ -61,47 +98,29 @@ def get_plugin_tool_info(tools: List[str]) -> Optional[List[Dict]]:
     for tool_identifier in tools:
         if not tool_identifier: continue
 
-        # -------------------------------------------------
-        # Case 1: 指定具体函数 (例如: base_tools/get_weather)
-        # -------------------------------------------------
+        # "plugin_name/func_name" 直接查索引；"plugin_name" 展开为该插件下所有函数
         if '/' in tool_identifier:
-            try:
+            identifiers = [tool_identifier]
+            if tool_identifier not in _SCHEMA_INDEX:
                 mcp_type, func_name = tool_identifier.split('/', 1)
-                if mcp_type in global_config and 'functions' in global_config[mcp_type]:
-                    tool_config = global_config[mcp_type]['functions'].get(func_name)
-                    if tool_config:
-                        real_name = tool_config.get('function', {}).get('name')
-                        if real_name and real_name not in added_func_names:
-                            tool_pool.append(tool_config)
-                            added_func_names.add(real_name)
-                    else:
-                        print(f"Warning: 函数 {func_name} 未在 {mcp_type} 中定义")
-            except Exception as e:
-                print(f"Error parsing tool identifier '{tool_identifier}': {e}")
-
-        # -------------------------------------------------
-        # Case 2: 指定整个插件 (例如: base_tools)
-        # -------------------------------------------------
+                print(f"Warning: 函数 {func_name} 未在 {mcp_type} 中定义")
+                continue
         else:
-            mcp_type = tool_identifier
-            if mcp_type in global_config and 'functions' in global_config[mcp_type]:
-                all_funcs = global_config[mcp_type]['functions']
-                for _, tool_config in all_funcs.items():
-                    real_name = tool_config.get('function', {}).get('name')
-                    if real_name and real_name not in added_func_names:
-                        tool_pool.append(tool_config)
-                        added_func_names.add(real_name)
-            else:
-                print(f"Warning: 插件 {mcp_type} 不存在或无导出函数")
+            identifiers = _PLUGIN_TOOLS.get(tool_identifier)
+            if not identifiers:
+                print(f"Warning: 插件 {tool_identifier} 不存在或无导出函数")
+                continue
+
+        for identifier in identifiers:
+            schema = _SCHEMA_INDEX[identifier]
+            real_name = schema['function'].get('name')
+            if real_name and real_name not in added_func_names:
+                tool_pool.append(schema)
+                added_func_names.add(real_name)
 
     return tool_pool
 
 
-# 注册/注销逻辑复用之前的代码，此处为了文件完整性省略，
-# 但请确保保留 register_plugin 和 unregister_plugin 函数
-# (如果需要我完整提供请告知，否则假设你保留了上次添加的注册注销函数)
-# 为了保证代码能跑，我把注册注销函数补全在下面：
-
 def register_plugin(plugin_name: str) -> bool:
     print(f"正在尝试注册插件: {plugin_name} ...")
     plugin_dir = os.path.join(PLUGIN_COLLECTION_DIR, plugin_name)
@@ -112,26 +131,11 @@ def register_plugin(plugin_name: str) -> bool:
         return False
 
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            new_config = yaml.safe_load(f)
-
-        # 提取配置内容
-        content = new_config
-        if isinstance(new_config, dict) and len(new_config) == 1 and plugin_name in new_config:
-            content = new_config[plugin_name]
-
-        # 读取全局配置
-        current = {}
-        if os.path.exists(GLOBAL_TOOL_YAML):
-            with open(GLOBAL_TOOL_YAML, 'r', encoding='utf-8') as f:
-                current = yaml.safe_load(f) or {}
-
-        # 写入
-        current[plugin_name] = content
-        with open(GLOBAL_TOOL_YAML, 'w', encoding='utf-8') as f:
-            yaml.dump(current, f, allow_unicode=True, sort_keys=False, indent=2)
-
-        init_config_data()  # 刷新内存
+        with _registry_lock:
+            # 只编译并写入该插件的 manifest，重新导入插件代码
+            _apply_config(_registry_store.register(plugin_name), reload_plugins=[plugin_name])
+        close_plugin_workers(plugin_name)
+        invalidate_plugin_cache(plugin_name)
         return True
     except Exception as e:
         print(f"注册插件异常：{e}")
@@ -141,18 +145,12 @@ def register_plugin(plugin_name: str) -> bool:
 def unregister_plugin(plugin_name: str) -> bool:
     print(f"正在尝试注销插件: {plugin_name} ...")
     try:
-        with open(GLOBAL_TOOL_YAML, 'r', encoding='utf-8') as f:
-            current = yaml.safe_load(f) or {}
-
-        if plugin_name in current:
-            del current[plugin_name]
-            with open(GLOBAL_TOOL_YAML, 'w', encoding='utf-8') as f:
-                if not current:
-                    f.write("")
-                else:
-                    yaml.dump(current, f, allow_unicode=True, sort_keys=False, indent=2)
-            init_config_data()  # 刷新
+        with _registry_lock:
+            _apply_config(_registry_store.unregister(plugin_name))
+        drop_plugin_modules(plugin_name)
+        close_plugin_workers(plugin_name)
+        invalidate_plugin_cache(plugin_name)
         return True
     except Exception as e:
         print(f"注销插件异常：{e}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import yaml
+
+PLUGINS_DIR = os.path.dirname(os.path.abspath(__file__))
+GLOBAL_TOOL_YAML = os.path.join(PLUGINS_DIR, "tool.yaml")
+PLUGIN_COLLECTION_DIR = os.path.join(PLUGINS_DIR, "plugin_collection")
+REGISTRY_DIR = os.path.join(PLUGINS_DIR, "registry")
+
+
+def _write_json_atomic(path: str, data) -> None:
+    """先写临时文件再 os.replace，读方不会看到写了一半的文件"""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _source_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_manifest_yaml(plugin_name: str, config_file: str) -> Dict:
+    """解析插件自带的 <plugin>.yaml，兼容外层包一层插件名的写法"""
+    with open(config_file, "r", encoding="utf-8") as f:
+        content = yaml.safe_load(f)
+    if isinstance(content, dict) and len(content) == 1 and plugin_name in content:
+        content = content[plugin_name]
+    if not isinstance(content, dict):
+        raise TypeError(f"{config_file} 格式错误，需为字典结构（当前类型：{type(content)}）")
+    return content
+
+
+class PluginRegistryStore:
+    """
+    插件注册表：registry/index.json 记录已注册插件（保持注册顺序），
+    每个插件一个编译好的 registry/<plugin>.json，记录来源 YAML 的 mtime，YAML 改动后自动重新编译
+    注册/注销只改动单个插件文件和索引，内存中的 manifests 整体替换，读方无需加锁也不碰磁盘
+    """
+
+    def __init__(self, registry_dir: str = REGISTRY_DIR, collection_dir: str = PLUGIN_COLLECTION_DIR,
+                 seed_yaml: str = GLOBAL_TOOL_YAML):
+        self.registry_dir = registry_dir
+        self.collection_dir = collection_dir
+        self.seed_yaml = seed_yaml
+        self.manifests: Dict[str, Dict] = {}
+        # 索引中的全部插件名（含加载失败的，避免改写索引时把它们丢掉）
+        self._names: List[str] = []
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.registry_dir, "index.json")
+
+    def _manifest_path(self, plugin_name: str) -> str:
+        return os.path.join(self.registry_dir, f"{plugin_name}.json")
+
+    def _source_path(self, plugin_name: str) -> str:
+        return os.path.join(self.collection_dir, plugin_name, f"{plugin_name}.yaml")
+
+    def _write_index(self, names: List[str]) -> None:
+        _write_json_atomic(self._index_path(), {"plugins": names})
+
+    def _write_manifest(self, plugin_name: str, manifest: Dict) -> None:
+        source = self._source_path(plugin_name)
+        _write_json_atomic(self._manifest_path(plugin_name), {
+            "source_mtime": _source_mtime(source),
+            "manifest": manifest,
+        })
+
+    def _seed_from_tool_yaml(self) -> List[str]:
+        """首次启动时从 tool.yaml 迁移出注册表"""
+        seed = {}
+        if os.path.exists(self.seed_yaml):
+            try:
+                with open(self.seed_yaml, "r", encoding="utf-8") as f:
+                    seed = yaml.safe_load(f) or {}
+            except yaml.YAMLError as e:
+                raise ValueError(f"解析tool.yaml失败：{str(e)}")
+        if not isinstance(seed, dict):
+            raise TypeError(f"tool.yaml格式错误，需为字典结构（当前类型：{type(seed)}）")
+        names = [name for name, manifest in seed.items() if isinstance(manifest, dict)]
+        for name in names:
+            self._write_manifest(name, seed[name])
+        self._write_index(names)
+        return names
+
+    def _load_manifest(self, plugin_name: str) -> Optional[Dict]:
+        """读取编译缓存；来源 YAML 比缓存新时重新编译"""
+        source = self._source_path(plugin_name)
+        cached = None
+        try:
+            with open(self._manifest_path(plugin_name), "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            pass
+        mtime = _source_mtime(source)
+        if cached is not None and (mtime is None or cached.get("source_mtime") == mtime):
+            return cached["manifest"]
+        if mtime is None:
+            return None
+        manifest = load_manifest_yaml(plugin_name, source)
+        self._write_manifest(plugin_name, manifest)
+        return manifest
+
+    def load(self) -> Dict[str, Dict]:
+        """从磁盘加载全部插件（启动时调用）"""
+        with self._lock:
+            os.makedirs(self.registry_dir, exist_ok=True)
+            try:
+                with open(self._index_path(), "r", encoding="utf-8") as f:
+                    names = json.load(f)["plugins"]
+            except FileNotFoundError:
+                names = self._seed_from_tool_yaml()
+
+            manifests = {}
+            for name in names:
+                try:
+                    manifest = self._load_manifest(name)
+                except Exception as e:
+                    print(f"Warning: 插件 {name} 配置加载失败：{e}")
+                    continue
+                if manifest is not None:
+                    manifests[name] = manifest
+            self.manifests = manifests
+            self._names = list(names)
+            self._loaded = True
+            return manifests
+
+    def register(self, plugin_name: str) -> Dict:
+        """编译插件 YAML 并加入注册表，返回新的 manifests"""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            source = self._source_path(plugin_name)
+            if not os.path.isfile(source):
+                raise FileNotFoundError(f"插件目录或配置文件不存在 -> {source}")
+            os.makedirs(self.registry_dir, exist_ok=True)
+            # 覆盖安装时即使 mtime 相同也重新编译
+            manifest = load_manifest_yaml(plugin_name, source)
+            self._write_manifest(plugin_name, manifest)
+            if plugin_name not in self._names:
+                self._names = self._names + [plugin_name]
+                self._write_index(self._names)
+            self.manifests = {**self.manifests, plugin_name: manifest}
+            return self.manifests
+
+    def unregister(self, plugin_name: str) -> Dict:
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            if plugin_name not in self._names:
+                return self.manifests
+            self._names = [name for name in self._names if name != plugin_name]
+            self._write_index(self._names)
+            try:
+                os.remove(self._manifest_path(plugin_name))
+            except OSError:
+                pass
+            self.manifests = {k: v for k, v in self.manifests.items() if k != plugin_name}
+            return self.manifests
@@ -0,0 +1,111 @@
+"""
+插件工作进程：由 worker_pool 以 `python -m src.plugins.plugin_worker <插件集合目录> <插件名>` 启动
+
+IPC 协议（stdin/stdout）：每帧 = 4 字节大端长度 + UTF-8 JSON
+    请求  {"id": 1, "f": "函数名", "a": {参数}}
+    取消  {"id": 1, "c": 1}
+    响应  {"id": 1, "r": 结果} 或 {"id": 1, "e": "错误信息"}
+同一进程内的请求并发执行（同步函数进线程池），响应按完成顺序返回
+"""
+import asyncio
+import importlib
+import json
+import os
+import struct
+import sys
+import threading
+from typing import Dict
+
+HEADER = struct.Struct(">I")
+
+
+def encode_frame(message: Dict) -> bytes:
+    body = json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    return HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Dict:
+    header = await reader.readexactly(HEADER.size)
+    (length,) = HEADER.unpack(header)
+    return json.loads(await reader.readexactly(length))
+
+
+def _read_exactly(stream, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+
+def _read_requests(stream, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue) -> None:
+    """后台线程阻塞读取 stdin（Windows 下子进程的 stdin 无法交给事件循环）"""
+    try:
+        while True:
+            (length,) = HEADER.unpack(_read_exactly(stream, HEADER.size))
+            loop.call_soon_threadsafe(queue.put_nowait, json.loads(_read_exactly(stream, length)))
+    except (EOFError, OSError, ValueError):
+        loop.call_soon_threadsafe(queue.put_nowait, None)
+
+
+async def _serve(plugin_module, requests: asyncio.Queue, output) -> None:
+    running: Dict[int, asyncio.Task] = {}
+
+    def send(message: Dict) -> None:
+        output.write(encode_frame(message))
+        output.flush()
+
+    async def handle(request_id: int, func_name: str, arguments: Dict) -> None:
+        try:
+            target_func = getattr(plugin_module, func_name, None)
+            if target_func is None:
+                raise ValueError(f"插件包{plugin_module.__name__}中无函数：{func_name}")
+            if asyncio.iscoroutinefunction(target_func):
+                result = await target_func(**arguments)
+            else:
+                result = await asyncio.to_thread(target_func, **arguments)
+            send({"id": request_id, "r": result})
+        except asyncio.CancelledError:
+            send({"id": request_id, "e": "调用已取消"})
+        except Exception as e:
+            send({"id": request_id, "e": f"{type(e).__name__}: {e}"})
+        finally:
+            running.pop(request_id, None)
+
+    while True:
+        message = await requests.get()
+        if message is None:
+            # 主进程退出或关闭了管道
+            break
+        request_id = message["id"]
+        if message.get("c"):
+            task = running.get(request_id)
+            if task is not None:
+                task.cancel()
+            continue
+        running[request_id] = asyncio.create_task(handle(request_id, message["f"], message.get("a") or {}))
+
+    for task in list(running.values()):
+        task.cancel()
+
+
+async def main(plugin_collection_dir: str, mcp_type: str) -> None:
+    # 协议独占原 stdout，插件里的 print 改写到 stderr，避免破坏帧
+    output = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    if plugin_collection_dir not in sys.path:
+        sys.path.append(plugin_collection_dir)
+    plugin_module = importlib.import_module(mcp_type)
+
+    requests: asyncio.Queue = asyncio.Queue()
+    threading.Thread(target=_read_requests, args=(sys.stdin.buffer, asyncio.get_running_loop(), requests),
+                     daemon=True).start()
+    await _serve(plugin_module, requests, output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1], sys.argv[2]))
@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_TOOL_CACHE_TTL = 60
+DEFAULT_TOOL_CACHE_MAX_ENTRIES = 1000
+
+# 未命中标记（函数结果本身可能为 None）
+MISS = object()
+
+
+class _FunctionCache:
+    """单个插件函数的结果缓存：LRU + TTL"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+# (mcp_type, func_name) -> _FunctionCache
+_caches: Dict[Tuple[str, str], _FunctionCache] = {}
+_lock = threading.Lock()
+
+
+def make_arguments_key(arguments: Optional[Dict]) -> str:
+    """参数规范化：键排序后序列化，保证等价参数得到同一个 key"""
+    return json.dumps(arguments or {}, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _get_function_cache(mcp_type: str, func_name: str, cache_config: Dict) -> _FunctionCache:
+    ttl = cache_config.get("ttl", DEFAULT_TOOL_CACHE_TTL)
+    max_entries = cache_config.get("max_entries", DEFAULT_TOOL_CACHE_MAX_ENTRIES)
+    cache = _caches.get((mcp_type, func_name))
+    if cache is None:
+        cache = _caches[(mcp_type, func_name)] = _FunctionCache(ttl, max_entries)
+    else:
+        # 插件 YAML 热更新后同步配置
+        cache.ttl, cache.max_entries = ttl, max_entries
+    return cache
+
+
+def get_cached_result(mcp_type: str, func_name: str, args_key: str, cache_config: Dict) -> Any:
+    """查询缓存，未命中或已过期时返回 MISS"""
+    with _lock:
+        cache = _get_function_cache(mcp_type, func_name, cache_config)
+        item = cache.entries.get(args_key)
+        if item is not None and (not cache.ttl or item[0] > time.monotonic()):
+            cache.entries.move_to_end(args_key)
+            cache.hits += 1
+            return item[1]
+        if item is not None:
+            del cache.entries[args_key]
+        cache.misses += 1
+        return MISS
+
+
+def set_cached_result(mcp_type: str, func_name: str, args_key: str, cache_config: Dict, result: Any) -> None:
+    with _lock:
+        cache = _get_function_cache(mcp_type, func_name, cache_config)
+        cache.entries[args_key] = (time.monotonic() + (cache.ttl or 0), result)
+        cache.entries.move_to_end(args_key)
+        while len(cache.entries) > cache.max_entries:
+            cache.entries.popitem(last=False)
+
+
+def invalidate_plugin_cache(mcp_type: str) -> int:
+    """清空某个插件所有函数的缓存结果，返回清除的条目数"""
+    removed = 0
+    with _lock:
+        for (plugin, _), cache in _caches.items():
+            if plugin == mcp_type:
+                removed += len(cache.entries)
+                cache.entries.clear()
+    return removed
+
+
+def get_tool_cache_stats() -> Dict[str, Dict]:
+    """按 "插件/函数" 返回缓存条目数与命中/未命中计数"""
+    with _lock:
+        return {
+            f"{plugin}/{func}": {"entries": len(cache.entries), "hits": cache.hits, "misses": cache.misses}
+            for (plugin, func), cache in _caches.items()
+        }
@@ -1,55 +1,127 @@
 import asyncio
-import importlib
-import sys
-from pathlib import Path
+import contextlib
+from typing import Awaitable, Callable, Dict, Optional, Tuple
 from src.common.models.tool_record import ToolRecord
-from src.plugins.plugin_manager import get_plugin_config
+from src.mcp_server.tool_manager import mark_tool_timeout
+from src.plugins.dispatch_table import ToolEntry, get_tool_entry
+from src.plugins.tool_cache import MISS, make_arguments_key, get_cached_result, set_cached_result
+from src.plugins.tool_pool import run_sync_function
+from src.plugins.worker_pool import call_isolated
 
 
-async def call_plugin_function(record: ToolRecord):
+class _Flight:
+    """一次正在执行的工具调用，以及等待其结果的调用方数量"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+# 正在执行的工具调用：(mcp_type, func_name, 参数key) -> _Flight
+_inflight: Dict[Tuple[str, str, str], _Flight] = {}
+_singleflight_stats = {"executed": 0, "joined": 0}
+
+
+async def _join_flight(key: Tuple[str, str, str], factory: Callable[[], Awaitable]):
     """
-    动态调用插件函数（直接导入插件目录包，调用函数）
+    singleflight：相同 key 的并发调用共享同一次执行，结果/异常分发给所有等待方
+    单个等待方被取消不影响其他人；所有等待方都离开后才取消底层执行
     """
-    mcp_type = record.mcp_type
-    func_name = record.tool_name
+    flight = _inflight.get(key)
+    if flight is None:
+        flight = _Flight(asyncio.ensure_future(factory()))
+        _inflight[key] = flight
+        _singleflight_stats["executed"] += 1
+
+        def _cleanup(_, flight=flight):
+            if _inflight.get(key) is flight:
+                del _inflight[key]
+        flight.task.add_done_callback(_cleanup)
+    else:
+        _singleflight_stats["joined"] += 1
+
+    flight.waiters += 1
+    try:
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
 
-    plugin_config = get_plugin_config(mcp_type)
-    if not plugin_config:
-        raise ValueError(f"未找到插件配置：{mcp_type}")
 
-    func_config = plugin_config.get("functions", {}).get(func_name, {})
-    if not func_config:
-        raise ValueError(f"插件{mcp_type}无函数配置：{func_name}")
+# 并发限制：(mcp_type, func_name 或 None) -> (上限, Semaphore)
+_semaphores: Dict[Tuple[str, Optional[str]], Tuple[int, asyncio.Semaphore]] = {}
 
-    current_script_dir = Path(__file__).parent.resolve()
-    plugin_dir = (current_script_dir / plugin_config["dir_path"]).resolve()
-    print(f"| 🔎 Found the called tool in: {plugin_dir}")
 
-    plugin_collection_dir = plugin_dir.parent
-    if str(plugin_collection_dir) not in sys.path:
-        sys.path.append(str(plugin_collection_dir))
+def _get_semaphore(mcp_type: str, func_name: Optional[str], limit: Optional[int]) -> Optional[asyncio.Semaphore]:
+    if not limit:
+        return None
+    key = (mcp_type, func_name)
+    current = _semaphores.get(key)
+    if current is None or current[0] != limit:
+        # YAML 中的上限变更后换用新信号量，已持有旧信号量的调用照常结束
+        current = _semaphores[key] = (limit, asyncio.Semaphore(limit))
+    return current[1]
 
-    # 验证插件包（必须有__init__.py）
-    init_file = plugin_dir / "__init__.py"
-    if not plugin_dir.is_dir():
-        raise ValueError(f"插件目录不存在：{plugin_dir}")
-    if not init_file.exists():
-        raise ValueError(f"插件目录缺少__init__.py：{init_file}")
 
-    # 直接导入插件包
+def get_singleflight_stats() -> Dict[str, int]:
+    """实际执行次数、被合并的调用次数、当前执行中的调用数"""
+    return {**_singleflight_stats, "inflight": len(_inflight)}
+
+
+async def call_plugin_function(record: ToolRecord):
+    """
+    调用插件函数：从注册时构建的调度表中取出已导入的函数直接执行
+    """
+    mcp_type = record.mcp_type
+    func_name = record.tool_name
+    entry = get_tool_entry(mcp_type, func_name)
+
+    # 只读函数可在 YAML 中声明 cache: {ttl, max_entries}，相同参数直接复用结果
+    args_key = None
+    if entry.cache_config:
+        args_key = make_arguments_key(record.arguments)
+        cached = get_cached_result(mcp_type, func_name, args_key, entry.cache_config)
+        if cached is not MISS:
+            return cached
+
+    # 相同参数的并发调用合并为一次执行（只读函数在 YAML 中声明 singleflight: true）
+    if entry.singleflight:
+        key = (mcp_type, func_name, args_key or make_arguments_key(record.arguments))
+        call = _join_flight(key, lambda: _execute_plugin_function(entry, record.arguments, args_key))
+    else:
+        call = _execute_plugin_function(entry, record.arguments, args_key)
+
+    # 超时（含等待并发名额的时间）后取消调用，并以工具错误返回给模型
+    if not entry.timeout:
+        return await call
     try:
-        plugin_module = importlib.import_module(mcp_type)  # mcp_type=插件目录名=包名
-    except ImportError as e:
-        raise ValueError(f"导入插件包失败 {mcp_type}：{str(e)}")
+        return await asyncio.wait_for(call, timeout=entry.timeout)
+    except asyncio.TimeoutError:
+        mark_tool_timeout(record)
+        raise TimeoutError(f"工具 {mcp_type}/{func_name} 执行超时（{entry.timeout}s），已取消")
 
-    # 执行函数
-    if not hasattr(plugin_module, func_name):
-        raise ValueError(f"插件包{mcp_type}中无函数：{func_name}")
 
-    target_func = getattr(plugin_module, func_name)
-    if asyncio.iscoroutinefunction(target_func):
-        result = await target_func(**record.arguments)
+async def _execute_plugin_function(entry: ToolEntry, arguments: Dict, args_key: Optional[str]):
+    """在并发限制内执行函数，并按需写入结果缓存"""
+    # 函数级上限优先：函数声明了 max_concurrency 时只受自己的上限约束，否则共用插件级上限
+    if entry.max_concurrency:
+        semaphore = _get_semaphore(entry.mcp_type, entry.func_name, entry.max_concurrency)
     else:
-        result = target_func(**record.arguments)
+        semaphore = _get_semaphore(entry.mcp_type, None, entry.plugin_max_concurrency)
+    async with semaphore if semaphore is not None else contextlib.nullcontext():
+        if entry.isolation == "process":
+            # 独立工作进程中执行，插件崩溃或占满 CPU 不影响主进程
+            result = await call_isolated(entry.plugin_collection_dir, entry.mcp_type, entry.func_name, arguments,
+                                         entry.workers)
+        elif entry.is_async:
+            result = await entry.func(**arguments)
+        else:
+            # 同步函数默认交给线程池，避免阻塞事件循环中的其他任务
+            result = await run_sync_function(entry.executor, entry.func, arguments,
+                                             entry.plugin_collection_dir, entry.mcp_type, entry.func_name)
 
-    return result if result else None
\ No newline at end of file
+    result = result if result else None
+    if entry.cache_config:
+        set_cached_result(entry.mcp_type, entry.func_name, args_key, entry.cache_config, result)
+    return result
@@ -0,0 +1,93 @@
+import asyncio
+import functools
+import importlib
+import sys
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from src.config.settings import TOOL_THREAD_POOL_SIZE, TOOL_PROCESS_POOL_SIZE
+
+VALID_EXECUTORS = ("loop", "thread", "process")
+
+
+class _ToolPool:
+    """懒创建的线程/进程池，记录提交数与完成数以计算排队深度"""
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.executor: Optional[Executor] = None
+        self.submitted = 0
+        self.completed = 0
+
+    def _get_executor(self) -> Executor:
+        if self.executor is None:
+            if self.name == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.size)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="mmcp-tool")
+        return self.executor
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        with _lock:
+            executor = self._get_executor()
+            self.submitted += 1
+        try:
+            return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+        finally:
+            with _lock:
+                self.completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        in_flight = self.submitted - self.completed
+        return {
+            "size": self.size,
+            "running": min(in_flight, self.size),
+            "queued": max(in_flight - self.size, 0),
+            "completed": self.completed,
+        }
+
+
+_pools: Dict[str, _ToolPool] = {
+    "thread": _ToolPool("thread", TOOL_THREAD_POOL_SIZE),
+    "process": _ToolPool("process", TOOL_PROCESS_POOL_SIZE),
+}
+_lock = threading.Lock()
+
+
+def _call_in_process(plugin_collection_dir: str, mcp_type: str, func_name: str, arguments: Dict) -> Any:
+    """进程池中执行：子进程按插件目录自行导入函数（函数对象本身不一定能被 pickle）"""
+    if plugin_collection_dir not in sys.path:
+        sys.path.append(plugin_collection_dir)
+    plugin_module = importlib.import_module(mcp_type)
+    return getattr(plugin_module, func_name)(**arguments)
+
+
+async def run_sync_function(executor: str, target_func: Callable, arguments: Dict,
+                            plugin_collection_dir: str, mcp_type: str, func_name: str) -> Any:
+    """
+    按 executor 执行同步插件函数：
+    loop 直接在事件循环中调用；thread 交给线程池；process 交给进程池（参数与返回值需可 pickle）
+    注意：超时取消只会放弃等待，已在池中运行的函数仍会执行完毕
+    """
+    if executor == "loop":
+        return target_func(**arguments)
+    if executor == "process":
+        return await _pools["process"].run(_call_in_process, plugin_collection_dir, mcp_type, func_name, arguments)
+    return await _pools["thread"].run(target_func, **arguments)
+
+
+def get_tool_pool_stats() -> Dict[str, Dict[str, int]]:
+    """各执行池的大小、运行中数量与排队深度"""
+    with _lock:
+        return {name: pool.stats() for name, pool in _pools.items()}
+
+
+def shutdown_tool_pools() -> None:
+    with _lock:
+        for pool in _pools.values():
+            if pool.executor is not None:
+                pool.executor.shutdown(wait=False, cancel_futures=True)
+                pool.executor = None
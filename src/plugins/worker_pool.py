@@ -0,0 +1,181 @@
+import asyncio
+import itertools
+import os
+import signal
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config.settings import PLUGIN_WORKER_COUNT
+from src.plugins.plugin_worker import encode_frame, read_frame
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[2])
+
+
+class WorkerCrashedError(RuntimeError):
+    pass
+
+
+class PluginWorker:
+    """一个常驻的插件工作进程；请求按 id 匹配响应，同一进程可同时处理多个请求"""
+
+    def __init__(self, plugin_collection_dir: str, mcp_type: str):
+        self.plugin_collection_dir = plugin_collection_dir
+        self.mcp_type = mcp_type
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.restarts = 0
+        self._ids = itertools.count(1)
+        self._reader_task: Optional[asyncio.Task] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def alive(self) -> bool:
+        return (self.process is not None and self.process.returncode is None
+                and self.loop is asyncio.get_running_loop())
+
+    async def _ensure_started(self) -> None:
+        if self.alive:
+            return
+        if self._start_lock is None or self.loop is not asyncio.get_running_loop():
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.alive:
+                return
+            if self.process is not None:
+                self.restarts += 1
+                self.kill()
+            env = dict(os.environ)
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [PROJECT_ROOT, env.get("PYTHONPATH")]))
+            self.loop = asyncio.get_running_loop()
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "src.plugins.plugin_worker", self.plugin_collection_dir, self.mcp_type,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, env=env, cwd=os.getcwd(),
+            )
+            self._reader_task = asyncio.create_task(self._read_responses(self.process))
+
+    async def _read_responses(self, process: asyncio.subprocess.Process) -> None:
+        try:
+            while True:
+                message = await read_frame(process.stdout)
+                future = self.pending.pop(message["id"], None)
+                if future is None or future.done():
+                    continue
+                if "e" in message:
+                    future.set_exception(RuntimeError(message["e"]))
+                else:
+                    future.set_result(message.get("r"))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # 事件循环关闭：一并结束工作进程
+            self.kill()
+            raise
+        # 进程退出（崩溃/被杀）：未完成的调用全部失败，下次调用时自动重启
+        code = await process.wait()
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(WorkerCrashedError(f"插件 {self.mcp_type} 工作进程异常退出（code={code}）"))
+        self.pending.clear()
+
+    async def call(self, func_name: str, arguments: Dict) -> Any:
+        await self._ensure_started()
+        request_id = next(self._ids)
+        future = self.loop.create_future()
+        self.pending[request_id] = future
+        self.process.stdin.write(encode_frame({"id": request_id, "f": func_name, "a": arguments}))
+        try:
+            await self.process.stdin.drain()
+            return await future
+        except asyncio.CancelledError:
+            # 超时等取消：通知工作进程取消对应请求
+            self.pending.pop(request_id, None)
+            if self.alive:
+                self.process.stdin.write(encode_frame({"id": request_id, "c": 1}))
+            raise
+        except ConnectionError:
+            self.pending.pop(request_id, None)
+            raise WorkerCrashedError(f"插件 {self.mcp_type} 工作进程异常退出")
+
+    def kill(self) -> None:
+        """结束工作进程；可在任意线程调用，实际操作交给进程所属的事件循环"""
+        if self.process is None or self.process.returncode is not None:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            self._terminate()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._terminate)
+        else:
+            try:
+                os.kill(self.process.pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def _terminate(self) -> None:
+        try:
+            self.process.stdin.close()
+            self.process.kill()
+        except (ProcessLookupError, RuntimeError):
+            pass
+
+
+class PluginWorkerPool:
+    """每个插件 N 个工作进程，新请求交给当前排队最少的进程"""
+
+    def __init__(self, plugin_collection_dir: str, mcp_type: str, size: int):
+        self.workers: List[PluginWorker] = [PluginWorker(plugin_collection_dir, mcp_type) for _ in range(size)]
+
+    async def call(self, func_name: str, arguments: Dict) -> Any:
+        worker = min(self.workers, key=lambda w: len(w.pending))
+        return await worker.call(func_name, arguments)
+
+    def close(self) -> None:
+        for worker in self.workers:
+            worker.kill()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self.workers),
+            "running": sum(1 for w in self.workers if w.process is not None and w.process.returncode is None),
+            "pending": sum(len(w.pending) for w in self.workers),
+            "restarts": sum(w.restarts for w in self.workers),
+        }
+
+
+# mcp_type -> PluginWorkerPool
+_worker_pools: Dict[str, PluginWorkerPool] = {}
+_lock = threading.Lock()
+
+
+async def call_isolated(plugin_collection_dir: str, mcp_type: str, func_name: str, arguments: Dict,
+                        size: Optional[int] = None) -> Any:
+    """在插件的独立工作进程中执行函数（插件配置 isolation: process）"""
+    size = size or PLUGIN_WORKER_COUNT
+    with _lock:
+        pool = _worker_pools.get(mcp_type)
+        if pool is None or len(pool.workers) != size:
+            if pool is not None:
+                pool.close()
+            pool = _worker_pools[mcp_type] = PluginWorkerPool(plugin_collection_dir, mcp_type, size)
+    return await pool.call(func_name, arguments)
+
+
+def close_plugin_workers(mcp_type: Optional[str] = None) -> None:
+    """关闭某个插件（默认全部）的工作进程，插件重新注册后下次调用会加载新代码"""
+    with _lock:
+        names = [mcp_type] if mcp_type else list(_worker_pools)
+        for name in names:
+            pool = _worker_pools.pop(name, None)
+            if pool is not None:
+                pool.close()
+
+
+def get_worker_stats() -> Dict[str, Dict[str, int]]:
+    with _lock:
+        return {name: pool.stats() for name, pool in _worker_pools.items()}
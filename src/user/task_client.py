@@ -13,8 +13,9 @@ def add_task(
         task_content:str,
         file_path:str=None,
         available_tools=None,
+        use_cache=None,
 ):
-    task = Task(task_name, model, task_content, available_tools, file_path)
+    task = Task(task_name, model, task_content, available_tools, file_path, use_cache=use_cache)
     try:
         if submit_task(task):
             print("Success")
@@ -0,0 +1,76 @@
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.config.settings import DASHBOARD_MAX_TOMBSTONES
+
+# 看板的三类条目及各自的主键
+SECTIONS = {"tasks": "task_id", "models": "name", "tools": "call_id"}
+
+
+def _fingerprint(item: Dict) -> str:
+    return json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class DashboardProjection:
+    """
+    看板投影：每次请求时生成轻量快照，与上一份快照逐条比较
+    有变化时版本号 +1，并记录每个条目最后变化的版本与被移除条目的版本（墓碑），
+    客户端带上已有版本即可只拿到之后变化的条目
+    """
+
+    def __init__(self, max_tombstones: int = DASHBOARD_MAX_TOMBSTONES):
+        self.version = 0
+        self.max_tombstones = max_tombstones
+        # (section, key) -> (指纹, 条目, 最后变化的版本)
+        self._items: Dict[Tuple[str, str], Tuple[str, Dict, int]] = {}
+        # (section, key) -> 移除时的版本
+        self._tombstones: Dict[Tuple[str, str], int] = {}
+        # 早于该版本的增量无法保证完整（墓碑已被清理），需要全量
+        self._oldest_delta_version = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, snapshot: Dict[str, List[Dict]]) -> int:
+        """用最新快照更新投影，返回当前版本号"""
+        with self._lock:
+            current = {}
+            for section, key_field in SECTIONS.items():
+                for item in snapshot.get(section, []):
+                    current[(section, str(item[key_field]))] = item
+            fingerprints = {key: _fingerprint(item) for key, item in current.items()}
+            changed = [key for key in current if key not in self._items or self._items[key][0] != fingerprints[key]]
+            removed = [key for key in self._items if key not in current]
+            if not changed and not removed:
+                return self.version
+
+            self.version += 1
+            for key in changed:
+                self._items[key] = (fingerprints[key], current[key], self.version)
+                self._tombstones.pop(key, None)
+            for key in removed:
+                del self._items[key]
+                self._tombstones[key] = self.version
+            if len(self._tombstones) > self.max_tombstones:
+                oldest = sorted(self._tombstones.items(), key=lambda kv: kv[1])
+                for key, version in oldest[:len(oldest) - self.max_tombstones]:
+                    del self._tombstones[key]
+                    self._oldest_delta_version = max(self._oldest_delta_version, version)
+            return self.version
+
+    def delta(self, since: int) -> Optional[Dict[str, Dict[str, List]]]:
+        """since 之后变化/移除的条目；since 太旧（墓碑已清理）时返回 None，调用方改为全量"""
+        with self._lock:
+            if since < self._oldest_delta_version or since > self.version:
+                return None
+            result = {section: {"changed": [], "removed": []} for section in SECTIONS}
+            for (section, _), (_, item, version) in self._items.items():
+                if version > since:
+                    result[section]["changed"].append(item)
+            for (section, key), version in self._tombstones.items():
+                if version > since:
+                    result[section]["removed"].append(key)
+            return result
+
+
+def filter_tasks(tasks: List[Dict], state: Optional[str] = None, model: Optional[str] = None) -> List[Dict]:
+    return [t for t in tasks if (not state or t["state"] == state) and (not model or t["model"] == model)]
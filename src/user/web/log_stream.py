@@ -0,0 +1,69 @@
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+
+from src.common.utils.log_store import TaskLogStore
+from src.config.settings import LOG_STREAM_HEARTBEAT, LOG_STREAM_MIN_INTERVAL
+
+
+class LogSubscriber:
+    """
+    一个实时日志连接：日志变化时只置位事件（多次变化自动合并），由连接自己按游标拉取增量
+    执行器线程的通知是 O(1) 且不会阻塞，浏览器再慢也只是一次收到更多条目
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self._scheduled = False
+
+    def notify(self) -> None:
+        """可在任意线程调用"""
+        if self._scheduled:
+            return
+        self._scheduled = True
+        try:
+            self.loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def _wake(self) -> None:
+        self._scheduled = False
+        self.event.set()
+
+
+def _sse(event: str, data, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def stream_task_logs(store: TaskLogStore, task_id: str, since: int = 0) -> AsyncIterator[str]:
+    """
+    SSE 事件流：event: log 的 data 为新增/有变化的条目列表（按 seq 合并），id 为最新游标；
+    任务结束并推送完毕后发送 event: end
+    """
+    subscriber = LogSubscriber()
+    store.subscribe(task_id, subscriber.notify)
+    cursor = since
+    try:
+        while True:
+            subscriber.event.clear()
+            # 先判断是否结束再取增量，结束前的最后几条不会漏掉
+            finished = store.is_finished(task_id)
+            entries = await asyncio.to_thread(store.get, task_id, cursor)
+            if entries:
+                cursor = max(entry.get("rev", 0) for entry in entries)
+                yield _sse("log", entries, cursor)
+            if finished:
+                yield _sse("end", {"cursor": cursor})
+                return
+            try:
+                await asyncio.wait_for(subscriber.event.wait(), LOG_STREAM_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            # 流式输出时每个 token 都会通知，稍等片刻合并成一批
+            await asyncio.sleep(LOG_STREAM_MIN_INTERVAL)
+    finally:
+        store.unsubscribe(task_id, subscriber.notify)
@@ -1,11 +1,12 @@
+import asyncio
 import os
 import shutil
 import zipfile
 import uvicorn
 import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Header, Request, Response
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
@@ -17,11 +18,22 @@ from src.plugins.plugin_manager import (
     PLUGIN_COLLECTION_DIR
 )
 from src.mcp_server.task_executor import start_execute_handler_thread
-from src.mcp_server.task_manager import _task_queue, _handling_task_list, init_task
+from src.mcp_server.task_manager import get_pending_tasks, _handling_task_list, init_task
 from src.mcp_server.tool_manager import _executing_tool_list
 from src.common.models import Task
 from src.common.utils.task_logger import TASK_LOG_STORAGE
+from src.common.utils.history_store import get_task_history_store, close_task_history_store
+from src.common.utils.log_sink import close_log_sink
+from src.common.utils.attachment_store import store_upload, get_attachment_cache
+from src.common.utils.file_utils import shutdown_pdf_render_pool
+from src.user.web.log_stream import stream_task_logs
+from src.user.web.dashboard import DashboardProjection, filter_tasks
 from src.config.settings import save_model_config, delete_model_config
+from src.common.utils.model_utils import close_openai_clients
+from src.plugins.tool_cache import get_tool_cache_stats, invalidate_plugin_cache
+from src.plugins.tool_call import get_singleflight_stats
+from src.plugins.tool_pool import get_tool_pool_stats, shutdown_tool_pools
+from src.plugins.worker_pool import get_worker_stats, close_plugin_workers
 
 # 定义附件上传目录
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "uploads")
@@ -36,6 +48,12 @@ async def lifespan(app: FastAPI):
     init_default_models()
     start_execute_handler_thread()
     yield
+    await close_openai_clients()
+    shutdown_tool_pools()
+    shutdown_pdf_render_pool()
+    close_plugin_workers()
+    close_task_history_store()
+    close_log_sink()
     print(">>> WebUI 关闭")
 
 
@@ -56,6 +74,7 @@ class CreateTaskRequest(BaseModel):
     tools: List[str] = None
     model: str = "deepseek-chat"
     file_paths: List[str] = []  # 新增：附件路径列表
+    use_cache: Optional[bool] = None  # 模型响应缓存，None 跟随全局配置
 
 
 class PluginActionRequest(BaseModel):
@@ -68,6 +87,7 @@ class AddModelRequest(BaseModel):
     base_url: str
     api_key: str
     model_type: str = "LLM"
+    max_concurrency: int = 1
 
 
 @app.get("/")
@@ -80,22 +100,99 @@ async def read_root():
         return HTMLResponse(content=f.read())
 
 
-@app.get("/api/dashboard")
-def get_dashboard_data():
-    pending = [t.to_dict() for t in _task_queue]
-    handling = [t.to_dict() for t in _handling_task_list]
+_dashboard = DashboardProjection()
+
+
+def _dashboard_snapshot() -> dict:
+    """看板快照：任务只取摘要，不序列化会话历史"""
+    pending = [t.to_summary() for t in get_pending_tasks()]
+    handling = [t.to_summary() for t in list(_handling_task_list)]
     for t in pending: t['status_display'] = 'Waiting'
     for t in handling: t['status_display'] = 'Handling'
 
-    models = [{"name": m.name,"type": m.model_type, "state": m.state, "task_id": m.task_id, "task_name": m.task_name} for m in list_models()]
-    tools = [t.to_dict() for t in _executing_tool_list]
+    models = []
+    for m in list_models():
+        active_tasks = m.get_active_tasks()
+        first_task = active_tasks[0] if active_tasks else {}
+        models.append({
+            "name": m.name, "type": m.model_type, "state": m.state,
+            "used_slots": len(active_tasks), "max_concurrency": m.max_concurrency,
+            "active_tasks": active_tasks,
+            "task_id": first_task.get("task_id"), "task_name": first_task.get("task_name")
+        })
+    tools = [t.to_dict() for t in list(_executing_tool_list)]
 
     return {"tasks": handling + pending, "models": models, "tools": tools}
 
 
+@app.get("/api/dashboard")
+def get_dashboard_data(request: Request, response: Response, since: Optional[int] = None,
+                       state: Optional[str] = None, model: Optional[str] = None,
+                       offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1, le=500)):
+    """
+    看板数据；响应带 ETag，无变化时返回 304
+    since 为上次拿到的 version：返回之后变化/移除的条目（delta=true，此时忽略分页），过旧时退回全量
+    """
+    snapshot = _dashboard_snapshot()
+    version = _dashboard.refresh(snapshot)
+    etag = f'"{version}-{state or ""}-{model or ""}-{offset}-{limit or ""}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    if since is not None:
+        delta = _dashboard.delta(since)
+        if delta is not None:
+            # 不再满足筛选条件的任务（如从 waiting 变为 handling）对客户端来说等同于移除
+            tasks = delta["tasks"]
+            matched = filter_tasks(tasks["changed"], state, model)
+            matched_ids = {t["task_id"] for t in matched}
+            removed = tasks["removed"] + [t["task_id"] for t in tasks["changed"] if t["task_id"] not in matched_ids]
+            return {"version": version, "delta": True, "tasks": {"changed": matched, "removed": removed},
+                    "models": delta["models"], "tools": delta["tools"]}
+
+    tasks = filter_tasks(snapshot["tasks"], state, model)
+    page = tasks[offset:offset + limit] if limit else tasks[offset:]
+    return {"version": version, "delta": False, "total": len(tasks), "tasks": page,
+            "models": snapshot["models"], "tools": snapshot["tools"]}
+
+
+@app.get("/api/logs/stats")
+def get_task_log_stats():
+    """任务日志的内存占用与落盘情况"""
+    return TASK_LOG_STORAGE.stats()
+
+
 @app.get("/api/logs/{task_id}")
-def get_task_logs(task_id: str):
-    return TASK_LOG_STORAGE.get(task_id, [])
+def get_task_logs(task_id: str, since: Optional[int] = None):
+    """since 为上次拿到的最大 rev，只返回之后新增或有变化的条目（按 seq 合并）"""
+    return TASK_LOG_STORAGE.get(task_id, since)
+
+
+@app.get("/api/logs/{task_id}/stream")
+async def stream_logs(task_id: str, since: int = 0, last_event_id: Optional[int] = Header(None)):
+    """SSE 实时日志；断线重连时浏览器会带上 Last-Event-ID，从该游标继续"""
+    cursor = last_event_id if last_event_id is not None else since
+    return StreamingResponse(
+        stream_task_logs(TASK_LOG_STORAGE, task_id, cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/history")
+def list_task_history(model: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                      cursor: Optional[int] = None, limit: int = Query(50, ge=1, le=500)):
+    """分页查询任务历史（倒序），since/until 为 finish_time（YYYYmmddHHMMSS），翻页时传回 next_cursor"""
+    return get_task_history_store().query(model=model, since=since, until=until, cursor=cursor, limit=limit)
+
+
+@app.get("/api/history/{task_id}")
+def get_task_history(task_id: str):
+    record = get_task_history_store().get(task_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="任务历史不存在")
+    return record
 
 
 # [新增] 附件上传接口
@@ -107,25 +204,27 @@ async def upload_attachment(file: UploadFile = File(...)):
         if not os.path.exists(UPLOAD_DIR):
             os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-        # 为了防止重名，加个时间戳前缀
-        safe_filename = f"{int(time.time())}_{file.filename}"
-        file_path = os.path.join(UPLOAD_DIR, safe_filename)
-
-        # [关键修复 2]：写文件
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # 按内容 SHA-256 分目录保存并保留原文件名，重复上传同一内容只保留一份（编码结果也随之复用）
+        sha256, file_path, existed = await asyncio.to_thread(store_upload, file.file, file.filename, UPLOAD_DIR)
 
         # 返回绝对路径，供后端 Task 读取
         return {
             "status": "success",
             "file_path": os.path.abspath(file_path),
-            "filename": safe_filename  # 建议返回这个带时间戳的新文件名
+            "filename": file.filename,
+            "sha256": sha256,
+            "deduplicated": existed
         }
     except Exception as e:
         # 打印一下具体的错误路径，方便调试
-        print(f"Error saving file to {os.path.join(UPLOAD_DIR, safe_filename)}")
+        print(f"Error saving file {file.filename} to {UPLOAD_DIR}")
         raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
 
+
+@app.get("/api/attachments/cache")
+def get_attachment_cache_info():
+    return get_attachment_cache().stats()
+
 @app.post("/api/tasks")
 def create_task(req: CreateTaskRequest):
     try:
@@ -135,7 +234,8 @@ def create_task(req: CreateTaskRequest):
             model=req.model,
             task_content=req.content,
             available_tools=tools,
-            file_path=req.file_paths if req.file_paths else None # [修改] 传入附件路径
+            file_path=req.file_paths if req.file_paths else None, # [修改] 传入附件路径
+            use_cache=req.use_cache
         )
         init_task(new_task)
         return {"status": "success", "task_id": new_task.task_id}
@@ -149,9 +249,11 @@ def create_task(req: CreateTaskRequest):
 def api_add_model(req: AddModelRequest):
     if not req.model_name or not req.base_url or not req.api_key:
         raise HTTPException(status_code=400, detail="所有字段均为必填项")
+    if req.max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="并发槽位数必须大于 0")
 
-    # [修改] 传入 model_type
-    success = save_model_config(req.model_name, req.base_url, req.api_key, req.model_type)
+    # [修改] 传入 model_type / max_concurrency
+    success = save_model_config(req.model_name, req.base_url, req.api_key, req.model_type, req.max_concurrency)
     if not success:
         raise HTTPException(status_code=500, detail="保存配置失败")
 
@@ -180,9 +282,29 @@ def get_available_tools_list():
     return tool_list
 
 
+@app.get("/api/tools/cache")
+def get_tool_cache_info():
+    return get_tool_cache_stats()
+
+
+@app.get("/api/tools/singleflight")
+def get_tool_singleflight_info():
+    return get_singleflight_stats()
+
+
+@app.delete("/api/tools/cache/{plugin_name}")
+def clear_tool_cache(plugin_name: str):
+    removed = invalidate_plugin_cache(plugin_name)
+    return {"status": "success", "removed": removed}
+
+
+@app.get("/api/tools/pools")
+def get_tool_pool_info():
+    return {**get_tool_pool_stats(), "workers": get_worker_stats()}
+
+
 @app.get("/api/plugins")
 def list_plugins():
-    init_config_data()
     config = get_config_data() or {}
     plugins = []
     for k, v in config.items():
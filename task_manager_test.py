@@ -0,0 +1,166 @@
+import asyncio
+
+from src.common.models import Task
+import src.mcp_server.model_manager as model_manager
+import src.mcp_server.task_executor as task_executor
+import src.mcp_server.task_manager as task_manager
+from src.mcp_server.task_manager import (
+    init_task, get_pending_task, get_task_queue_size, mark_model_ready,
+    requeue_task, remove_handling_task
+)
+
+MODEL_NAMES = ["model_a", "model_b", "model_c", "model_d"]
+TASK_COUNT = 1000
+
+
+def _reset(model_names=MODEL_NAMES):
+    task_manager._model_queues.clear()
+    task_manager._resume_queues.clear()
+    task_manager._capacity_parked_models.clear()
+    task_manager._orphaned_tasks.clear()
+    task_manager._ready_models.clear()
+    task_manager._ready_model_set.clear()
+    model_manager._model_pool.clear()
+    for name in model_names:
+        model_manager.init_model(name)
+
+
+def _submit(count=TASK_COUNT, model_names=MODEL_NAMES):
+    submitted = {name: [] for name in model_names}
+    for i in range(count):
+        name = model_names[i % len(model_names)]
+        task = Task(task_name=f"task_{i}", model=name, task_content=f"content {i}")
+        init_task(task)
+        submitted[name].append(task.task_id)
+    return submitted
+
+
+def test_fifo_within_each_model():
+    _reset()
+    submitted = _submit()
+    assert get_task_queue_size() == TASK_COUNT
+
+    dispatched = {name: [] for name in MODEL_NAMES}
+    while True:
+        task = get_pending_task()
+        if not task:
+            break
+        dispatched[task.model].append(task.task_id)
+
+    assert dispatched == submitted
+    assert get_task_queue_size() == 0
+
+
+def test_busy_model_does_not_block_others():
+    _reset()
+    submitted = _submit()
+    model_manager.bind_model_task("model_a", "busy_task", "busy_task")
+
+    dispatched = []
+    while True:
+        task = get_pending_task()
+        if not task:
+            break
+        dispatched.append(task)
+
+    assert all(t.model != "model_a" for t in dispatched)
+    assert len(dispatched) == TASK_COUNT - len(submitted["model_a"])
+
+    # model_a 空闲后重新参与调度，且顺序不变
+    model_manager.unbind_model_task("model_a", "busy_task")
+    mark_model_ready("model_a")
+    resumed = []
+    while True:
+        task = get_pending_task()
+        if not task:
+            break
+        resumed.append(task.task_id)
+    assert resumed == submitted["model_a"]
+
+
+def test_models_are_served_round_robin():
+    _reset()
+    _submit()
+    first_round = [get_pending_task().model for _ in MODEL_NAMES]
+    assert sorted(first_round) == sorted(MODEL_NAMES)
+
+
+def test_model_concurrency_slots():
+    _reset()
+    _submit(count=10, model_names=["model_a"])
+    model_manager.get_model("model_a").max_concurrency = 3
+
+    granted = []
+    while True:
+        task = get_pending_task()
+        if not task:
+            break
+        assert model_manager.bind_model_task(task.model, task.task_id, task.task_name)
+        granted.append(task)
+    assert len(granted) == 3
+    assert model_manager.get_model("model_a").state == "think"
+
+    model_manager.unbind_model_task("model_a", granted[0].task_id)
+    mark_model_ready("model_a")
+    task = get_pending_task()
+    assert task is not None
+    model_manager.bind_model_task(task.model, task.task_id, task.task_name)
+    assert get_pending_task() is None
+
+
+def test_resumed_tasks_bypass_handling_cap():
+    _reset(["model_a"])
+    submitted = _submit(count=3, model_names=["model_a"])["model_a"]
+
+    first = get_pending_task()
+    requeue_task(first)
+    # 名额已满时只派发续跑任务，且续跑任务优先于新任务
+    assert get_pending_task(allow_new=False) is first
+    assert get_pending_task(allow_new=False) is None
+
+    remove_handling_task(first)
+    assert get_pending_task().task_id == submitted[1]
+
+
+def test_removed_model_fails_waiting_tasks():
+    _reset(["model_a"])
+    waiting, queued = _submit(count=2, model_names=["model_a"])["model_a"]
+    results = []
+    original = task_executor.write_task_history
+    task_executor.write_task_history = results.append
+
+    async def run():
+        task_manager.bind_dispatcher(asyncio.get_running_loop())
+        running = get_pending_task()
+        assert running.task_id == waiting
+        # 执行中的任务等待工具调用后的下一轮槽位
+        turn = asyncio.create_task(task_executor.wait_for_model_turn(running))
+        await asyncio.sleep(0)
+        model_manager.remove_model("model_a")
+        assert task_executor.dispatch_pending_tasks() == 0
+        try:
+            await turn
+            raise AssertionError("等待中的任务应当失败")
+        except task_executor.ModelUnavailableError:
+            pass
+
+    try:
+        asyncio.run(run())
+        assert not task_executor._turn_waiters
+        # 排队中的新任务直接以失败结束并写入历史
+        assert [r["task_id"] for r in results] == [queued]
+        assert "已被移除" in results[0]["task_result"]
+        assert get_task_queue_size() == 0 and get_pending_task() is None
+    finally:
+        task_executor.write_task_history = original
+        task_manager._dispatch_event = task_manager._dispatch_loop = None
+
+
+if __name__ == "__main__":
+    test_fifo_within_each_model()
+    test_busy_model_does_not_block_others()
+    test_models_are_served_round_robin()
+    test_model_concurrency_slots()
+    test_resumed_tasks_bypass_handling_cap()
+    test_removed_model_fails_waiting_tasks()
+    print("task_manager tests passed")
@@ -0,0 +1,130 @@
+import asyncio
+import base64
+import os
+import struct
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import src.common.utils.token_counter as token_counter
+import src.mcp_server.task_executor as task_executor
+from src.common.models import Task
+from src.common.utils import TaskLogger
+from src.common.utils.token_counter import (
+    IMAGE_BASE_TOKENS, PromptTooLargeError, count_prompt_tokens, estimate_image_tokens, estimate_text_tokens,
+    image_size_from_bytes
+)
+from src.config.settings import MODEL_CONTEXT_BUDGET, MODEL_CONTEXT_LIMIT
+
+MODEL = "token-counter-model"
+
+
+def _png_data_url(width: int, height: int) -> str:
+    header = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", width, height)
+    return "data:image/png;base64," + base64.b64encode(header + b"\x00" * 64).decode()
+
+
+def test_image_parts_use_real_dimensions():
+    url = _png_data_url(1024, 1024)
+    assert image_size_from_bytes(base64.b64decode(url.split(",", 1)[1])) == (1024, 1024)
+    # 1024x1024 -> 768x768 -> 4 块
+    assert estimate_image_tokens(1024, 1024) == IMAGE_BASE_TOKENS + 170 * 4
+    messages = [
+        {"role": "user", "content": [
+            {"type": "text", "text": "look"},
+            {"type": "image_url", "image_url": {"url": url}},
+            {"type": "image_url", "image_url": {"url": url, "detail": "low"}},
+        ]},
+    ]
+    tokens = count_prompt_tokens(messages)
+    assert tokens >= 4 + IMAGE_BASE_TOKENS + 170 * 4 + IMAGE_BASE_TOKENS
+
+
+def test_unchanged_messages_are_not_recounted():
+    calls = []
+    original = token_counter._count_message
+
+    def counting(message):
+        calls.append(message)
+        return original(message)
+
+    token_counter._count_message = counting
+    try:
+        cache = {}
+        history = [{"role": "user", "content": f"message {i}"} for i in range(10)]
+        tools = [{"type": "function", "function": {"name": "p__f", "parameters": {}}}]
+        first = count_prompt_tokens(history, tools, cache)
+        history.append({"role": "assistant", "content": "reply"})
+        second = count_prompt_tokens(history, tools, cache)
+        assert len(calls) == 11
+        assert second > first > count_prompt_tokens(history[:10])
+    finally:
+        token_counter._count_message = original
+
+
+def test_oversized_prompt_is_rejected_before_sending():
+    sent = []
+
+    class _Completions:
+        async def create(self, **kwargs):
+            sent.append(kwargs)
+
+    class _Client:
+        chat = type("Chat", (), {"completions": _Completions()})()
+
+    original = task_executor.get_openai_client
+    task_executor.get_openai_client = lambda model_name: _Client()
+    MODEL_CONTEXT_BUDGET[MODEL] = 0
+    MODEL_CONTEXT_LIMIT[MODEL] = 100
+    try:
+        task = Task(task_name="t", model=MODEL, task_content="do it")
+        task.session_history = [{"role": "user", "content": "x" * 2000}]
+        logger = TaskLogger("token-test", "t")
+        try:
+            asyncio.run(task_executor.model_call(task, logger))
+            assert False, "应拒绝超出上限的请求"
+        except PromptTooLargeError:
+            pass
+        assert not sent
+        assert logger.usage["turns"][0]["estimated"] > 100
+    finally:
+        task_executor.get_openai_client = original
+        MODEL_CONTEXT_BUDGET.pop(MODEL, None)
+        MODEL_CONTEXT_LIMIT.pop(MODEL, None)
+
+
+def test_encoding_loads_lazily_and_failure_is_cached():
+    # 导入模块时不加载编码表
+    script = (
+        "import sys, types\n"
+        "calls = []\n"
+        "sys.modules['tiktoken'] = types.SimpleNamespace(get_encoding=lambda name: calls.append(name))\n"
+        "import src.common.utils.token_counter\n"
+        "assert calls == [], calls\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    calls = []
+
+    def failing_get_encoding(name):
+        calls.append(name)
+        raise OSError("network unavailable")
+
+    original = (token_counter.tiktoken, token_counter._encoding)
+    token_counter.tiktoken = SimpleNamespace(get_encoding=failing_get_encoding)
+    token_counter._encoding = token_counter._NOT_LOADED
+    try:
+        assert estimate_text_tokens("abcdefgh") == 2
+        assert estimate_text_tokens("中文abcd") == 3
+        # 失败只尝试一次
+        assert calls == ["cl100k_base"]
+    finally:
+        token_counter.tiktoken, token_counter._encoding = original
+
+
+if __name__ == "__main__":
+    test_image_parts_use_real_dimensions()
+    test_unchanged_messages_are_not_recounted()
+    test_oversized_prompt_is_rejected_before_sending()
+    test_encoding_loads_lazily_and_failure_is_cached()
+    print("token_counter tests passed")
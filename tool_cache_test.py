@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+from src.common.models.tool_record import ToolRecord
+from src.plugins.dispatch_table import rebuild_dispatch_table
+from src.plugins.plugin_manager import get_config_data
+from src.plugins.tool_cache import (
+    MISS, get_cached_result, get_tool_cache_stats, invalidate_plugin_cache, make_arguments_key, set_cached_result
+)
+from src.plugins.tool_call import call_plugin_function
+from src.user.web.server import app
+
+PLUGIN_NAME = "tool_cache_test_plugin"
+
+PLUGIN_SOURCE = """
+CALLS = []
+
+
+def lookup(city, unit="c"):
+    CALLS.append((city, unit))
+    return f"{city}:{unit}:{len(CALLS)}"
+"""
+
+
+def test_arguments_key_ignores_key_order():
+    assert make_arguments_key({"a": 1, "b": {"y": 2, "x": 1}}) == make_arguments_key({"b": {"x": 1, "y": 2}, "a": 1})
+    assert make_arguments_key(None) == make_arguments_key({})
+    assert make_arguments_key({"a": 1}) != make_arguments_key({"a": 2})
+
+
+def test_lru_ttl_and_counters():
+    config = {"ttl": 0.05, "max_entries": 2}
+    plugin, func = "cache_unit_plugin", "f"
+    invalidate_plugin_cache(plugin)
+    assert get_cached_result(plugin, func, "k1", config) is MISS
+    set_cached_result(plugin, func, "k1", config, None)
+    # 结果为 None 也能命中
+    assert get_cached_result(plugin, func, "k1", config) is None
+
+    set_cached_result(plugin, func, "k2", config, "two")
+    get_cached_result(plugin, func, "k1", config)
+    set_cached_result(plugin, func, "k3", config, "three")
+    # k2 最久未使用，被淘汰
+    assert get_cached_result(plugin, func, "k2", config) is MISS
+    assert get_cached_result(plugin, func, "k3", config) == "three"
+
+    time.sleep(0.1)
+    assert get_cached_result(plugin, func, "k3", config) is MISS
+    stats = get_tool_cache_stats()[f"{plugin}/{func}"]
+    assert stats == {"entries": 1, "hits": 3, "misses": 3}
+
+
+def test_plugin_calls_are_memoised_and_invalidated():
+    plugin_dir = os.path.join(tempfile.mkdtemp(), PLUGIN_NAME)
+    os.makedirs(plugin_dir)
+    with open(os.path.join(plugin_dir, "__init__.py"), "w", encoding="utf-8") as f:
+        f.write(PLUGIN_SOURCE)
+    config = {
+        "dir_path": plugin_dir,
+        "functions": {
+            "lookup": {"type": "function", "function": {"name": "lookup"}, "cache": {"ttl": 60, "max_entries": 10}},
+        },
+    }
+    rebuild_dispatch_table({PLUGIN_NAME: config}, reload_plugins=[PLUGIN_NAME])
+
+    def call(arguments):
+        record = ToolRecord(task_id="t", task_name="t", mcp_type=PLUGIN_NAME, tool_name="lookup", model="m",
+                            arguments=arguments)
+        return asyncio.run(call_plugin_function(record))
+
+    try:
+        first = call({"city": "Paris", "unit": "f"})
+        # 参数顺序不同，仍命中同一条缓存
+        assert call({"unit": "f", "city": "Paris"}) == first
+        assert len(sys.modules[PLUGIN_NAME].CALLS) == 1
+        call({"city": "Rome"})
+        assert len(sys.modules[PLUGIN_NAME].CALLS) == 2
+
+        client = TestClient(app)
+        stats = client.get("/api/tools/cache").json()[f"{PLUGIN_NAME}/lookup"]
+        assert stats["entries"] == 2 and stats["hits"] == 1
+        response = client.delete(f"/api/tools/cache/{PLUGIN_NAME}")
+        assert response.json() == {"status": "success", "removed": 2}
+
+        assert call({"city": "Paris", "unit": "f"}) != first
+        assert len(sys.modules[PLUGIN_NAME].CALLS) == 3
+    finally:
+        invalidate_plugin_cache(PLUGIN_NAME)
+        rebuild_dispatch_table(get_config_data())
+
+
+if __name__ == "__main__":
+    test_arguments_key_ignores_key_order()
+    test_lru_ttl_and_counters()
+    test_plugin_calls_are_memoised_and_invalidated()
+    print("tool_cache tests passed")
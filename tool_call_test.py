@@ -0,0 +1,250 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import src.mcp_server.task_executor as task_executor
+from src.common.models import Task
+from src.common.models.tool_record import ToolRecord
+from src.mcp_server.model_manager import init_model, bind_model_task
+from src.mcp_server.tool_manager import add_executing_tool, remove_executing_tool
+from src.plugins.dispatch_table import rebuild_dispatch_table
+from src.plugins.plugin_manager import get_config_data
+from src.plugins.tool_call import call_plugin_function, get_singleflight_stats
+
+PLUGIN_NAME = "tool_call_test_plugin"
+MODEL = "tool-call-test-model"
+SLEEP_TIME = 0.2
+
+PLUGIN_SOURCE = f"""
+import asyncio
+
+STATE = {{"cancelled": 0, "running": 0, "peak": 0, "calls": 0}}
+
+
+async def hang():
+    try:
+        await asyncio.sleep(60)
+    except asyncio.CancelledError:
+        STATE["cancelled"] += 1
+        raise
+
+
+async def tracked(i=0):
+    STATE["calls"] += 1
+    STATE["running"] += 1
+    STATE["peak"] = max(STATE["peak"], STATE["running"])
+    try:
+        await asyncio.sleep({SLEEP_TIME})
+    finally:
+        STATE["running"] -= 1
+    return "ok"
+"""
+
+
+def _make_plugin(hang_config: dict = None, tracked_config: dict = None, plugin_options: dict = None) -> dict:
+    """在临时目录中生成测试插件包，返回其插件配置"""
+    plugin_dir = os.path.join(tempfile.mkdtemp(), PLUGIN_NAME)
+    os.makedirs(plugin_dir)
+    with open(os.path.join(plugin_dir, "__init__.py"), "w", encoding="utf-8") as f:
+        f.write(PLUGIN_SOURCE)
+    return {
+        "dir_path": plugin_dir,
+        "functions": {
+            "hang": {"type": "function", "function": {"name": "hang"}, **(hang_config or {})},
+            "tracked": {"type": "function", "function": {"name": "tracked"}, **(tracked_config or {})},
+        },
+        **(plugin_options or {}),
+    }
+
+
+def _record(func_name: str, arguments: dict = None) -> ToolRecord:
+    return ToolRecord(task_id="t", task_name="t", mcp_type=PLUGIN_NAME,
+                      tool_name=func_name, model="m", arguments=arguments or {})
+
+
+def _state() -> dict:
+    return sys.modules[PLUGIN_NAME].STATE
+
+
+def _install(config: dict) -> None:
+    rebuild_dispatch_table({PLUGIN_NAME: config}, reload_plugins=[PLUGIN_NAME])
+
+
+def test_hung_tool_is_cancelled_and_marked_timeout():
+    _install(_make_plugin(hang_config={"timeout": 0.2}))
+
+    async def run():
+        record = _record("hang")
+        add_executing_tool(record)
+        try:
+            await call_plugin_function(record)
+            assert False, "应当超时"
+        except TimeoutError as e:
+            assert "超时" in str(e)
+        # 让被取消的协程执行完 except 分支
+        await asyncio.sleep(0)
+        assert record.state == "timeout"
+        remove_executing_tool(record)
+        # 执行器移除记录时保留超时状态
+        assert record.state == "timeout"
+
+    try:
+        asyncio.run(run())
+        assert _state()["cancelled"] == 1
+    finally:
+        rebuild_dispatch_table(get_config_data())
+
+
+def test_timeout_is_reported_to_model_as_tool_error():
+    _install(_make_plugin(hang_config={"timeout": 0.2}))
+    sent = []
+
+    async def fake_model_call(task, logger=None):
+        sent.append(list(task.session_history))
+        if task.session_history[-1]["role"] == "tool":
+            message = SimpleNamespace(content="done", reasoning_content=None, tool_calls=None)
+        else:
+            call = SimpleNamespace(
+                id="call_1", function=SimpleNamespace(name=f"{PLUGIN_NAME}__hang", arguments="{}"),
+                model_dump=lambda: {"id": "call_1", "type": "function",
+                                    "function": {"name": f"{PLUGIN_NAME}__hang", "arguments": "{}"}})
+            message = SimpleNamespace(content=None, reasoning_content=None, tool_calls=[call])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    originals = (task_executor.model_call, task_executor.write_task_history,
+                 task_executor.RELEASE_MODEL_SLOT_ON_TOOL_CALL)
+    task_executor.model_call = fake_model_call
+    task_executor.write_task_history = lambda data: None
+    task_executor.RELEASE_MODEL_SLOT_ON_TOOL_CALL = False
+    try:
+        init_model(MODEL)
+        task = Task(task_name="timeout_task", model=MODEL, task_content="call the tool", task_id="timeout_task")
+        task.session_history = [{"role": "user", "content": task.task_content}]
+        bind_model_task(MODEL, task.task_id, task.task_name)
+        asyncio.run(task_executor.execute_task(task))
+        tool_messages = [m for m in task.session_history if m["role"] == "tool"]
+        assert len(tool_messages) == 1
+        assert tool_messages[0]["tool_call_id"] == "call_1"
+        assert tool_messages[0]["content"].startswith("Error:") and "超时" in tool_messages[0]["content"]
+        assert task.session_history[-1]["content"] == "done"
+    finally:
+        task_executor.model_call, task_executor.write_task_history, \
+            task_executor.RELEASE_MODEL_SLOT_ON_TOOL_CALL = originals
+        rebuild_dispatch_table(get_config_data())
+
+
+def test_function_limit_serialises_calls():
+    _install(_make_plugin(tracked_config={"max_concurrency": 1}))
+
+    async def run():
+        start = time.perf_counter()
+        # 参数不同，不会被合并为一次执行
+        results = await asyncio.gather(*(call_plugin_function(_record("tracked", {"i": i})) for i in range(3)))
+        return results, time.perf_counter() - start
+
+    try:
+        results, elapsed = asyncio.run(run())
+        assert results == ["ok"] * 3
+        assert _state()["peak"] == 1
+        assert elapsed >= SLEEP_TIME * 3
+    finally:
+        rebuild_dispatch_table(get_config_data())
+
+
+def test_function_limit_overrides_plugin_limit():
+    _install(_make_plugin(tracked_config={"max_concurrency": 3}, plugin_options={"max_concurrency": 1}))
+
+    async def run():
+        return await asyncio.gather(*(call_plugin_function(_record("tracked", {"i": i})) for i in range(3)))
+
+    try:
+        assert asyncio.run(run()) == ["ok"] * 3
+        assert _state()["peak"] == 3
+    finally:
+        rebuild_dispatch_table(get_config_data())
+
+
+def test_identical_concurrent_calls_run_once():
+    _install(_make_plugin(tracked_config={"singleflight": True}))
+
+    async def run():
+        before = get_singleflight_stats()
+        results = await asyncio.gather(*(call_plugin_function(_record("tracked", {"i": 1})) for _ in range(5)))
+        return results, before, get_singleflight_stats()
+
+    try:
+        results, before, after = asyncio.run(run())
+        assert results == ["ok"] * 5
+        assert _state()["calls"] == 1
+        assert after["executed"] - before["executed"] == 1
+        assert after["joined"] - before["joined"] == 4
+        assert after["inflight"] == 0
+    finally:
+        rebuild_dispatch_table(get_config_data())
+
+
+def test_singleflight_is_off_by_default():
+    _install(_make_plugin())
+
+    async def run():
+        return await asyncio.gather(*(call_plugin_function(_record("tracked", {"i": 1})) for _ in range(3)))
+
+    try:
+        assert asyncio.run(run()) == ["ok"] * 3
+        assert _state()["calls"] == 3
+    finally:
+        rebuild_dispatch_table(get_config_data())
+
+
+def test_cancelling_one_waiter_keeps_shared_call():
+    _install(_make_plugin(tracked_config={"singleflight": True}))
+
+    async def run():
+        first = asyncio.create_task(call_plugin_function(_record("tracked")))
+        second = asyncio.create_task(call_plugin_function(_record("tracked")))
+        await asyncio.sleep(SLEEP_TIME / 4)
+        first.cancel()
+        result = await second
+        assert first.cancelled()
+        return result
+
+    try:
+        assert asyncio.run(run()) == "ok"
+        assert _state()["calls"] == 1
+    finally:
+        rebuild_dispatch_table(get_config_data())
+
+
+def test_shared_call_cancelled_when_last_waiter_leaves():
+    _install(_make_plugin(hang_config={"singleflight": True, "timeout": None}))
+
+    async def run():
+        waiters = [asyncio.create_task(call_plugin_function(_record("hang"))) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        for i, waiter in enumerate(waiters):
+            waiter.cancel()
+            await asyncio.sleep(0.05)
+            # 还有等待方时底层执行不受影响
+            expected = 1 if i == len(waiters) - 1 else 0
+            assert _state()["cancelled"] == expected
+        assert get_singleflight_stats()["inflight"] == 0
+
+    try:
+        asyncio.run(run())
+    finally:
+        rebuild_dispatch_table(get_config_data())
+
+
+if __name__ == "__main__":
+    test_hung_tool_is_cancelled_and_marked_timeout()
+    test_timeout_is_reported_to_model_as_tool_error()
+    test_function_limit_serialises_calls()
+    test_function_limit_overrides_plugin_limit()
+    test_identical_concurrent_calls_run_once()
+    test_singleflight_is_off_by_default()
+    test_cancelling_one_waiter_keeps_shared_call()
+    test_shared_call_cancelled_when_last_waiter_leaves()
+    print("tool_call tests passed")
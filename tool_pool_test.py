@@ -0,0 +1,83 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from src.common.models.tool_record import ToolRecord
+from src.plugins.dispatch_table import rebuild_dispatch_table
+from src.plugins.plugin_manager import get_config_data
+from src.plugins.tool_call import call_plugin_function
+from src.plugins.tool_pool import get_tool_pool_stats
+
+PLUGIN_NAME = "pool_test_plugin"
+SLEEP_TIME = 0.5
+
+PLUGIN_SOURCE = f"""
+import time
+
+
+def slow_a():
+    time.sleep({SLEEP_TIME})
+    return "a"
+
+
+def slow_b():
+    time.sleep({SLEEP_TIME})
+    return "b"
+"""
+
+
+def _make_plugin(executor=None) -> dict:
+    """在临时目录中生成一个只含同步慢函数的插件包，返回其插件配置"""
+    plugin_dir = os.path.join(tempfile.mkdtemp(), PLUGIN_NAME)
+    os.makedirs(plugin_dir)
+    with open(os.path.join(plugin_dir, "__init__.py"), "w", encoding="utf-8") as f:
+        f.write(PLUGIN_SOURCE)
+    config = {
+        "dir_path": plugin_dir,
+        "functions": {
+            "slow_a": {"type": "function", "function": {"name": "slow_a"}},
+            "slow_b": {"type": "function", "function": {"name": "slow_b"}},
+        },
+    }
+    if executor:
+        config["executor"] = executor
+    return config
+
+
+def _record(func_name: str) -> ToolRecord:
+    return ToolRecord(task_id="t", task_name="t", mcp_type=PLUGIN_NAME,
+                      tool_name=func_name, model="m", arguments={})
+
+
+async def _run_both(config: dict):
+    rebuild_dispatch_table({PLUGIN_NAME: config}, reload_plugins=[PLUGIN_NAME])
+    try:
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            call_plugin_function(_record("slow_a")),
+            call_plugin_function(_record("slow_b")),
+        )
+        return results, time.perf_counter() - start
+    finally:
+        rebuild_dispatch_table(get_config_data())
+
+
+def test_slow_sync_tools_run_concurrently():
+    results, elapsed = asyncio.run(_run_both(_make_plugin()))
+    assert results == ["a", "b"]
+    # 线程池中并行执行，总耗时接近单个函数而不是两者之和
+    assert elapsed < SLEEP_TIME * 1.8
+    assert get_tool_pool_stats()["thread"]["queued"] == 0
+
+
+def test_loop_executor_runs_serially():
+    results, elapsed = asyncio.run(_run_both(_make_plugin("loop")))
+    assert results == ["a", "b"]
+    assert elapsed >= SLEEP_TIME * 2
+
+
+if __name__ == "__main__":
+    test_slow_sync_tools_run_concurrently()
+    test_loop_executor_runs_serially()
+    print("tool_pool tests passed")
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from src.common.models.tool_record import ToolRecord
+from src.plugins.dispatch_table import rebuild_dispatch_table
+from src.plugins.plugin_manager import get_config_data
+from src.plugins.tool_call import call_plugin_function
+from src.plugins.worker_pool import close_plugin_workers, get_worker_stats
+
+PLUGIN_NAME = "isolated_test_plugin"
+SLEEP_TIME = 0.5
+
+PLUGIN_SOURCE = f"""
+import asyncio
+import os
+import time
+
+
+def get_pid():
+    print("plugin output must not break the protocol")
+    return os.getpid()
+
+
+def slow(tag):
+    time.sleep({SLEEP_TIME})
+    return tag
+
+
+async def async_add(a, b):
+    await asyncio.sleep(0)
+    return a + b
+
+
+def crash():
+    os._exit(3)
+"""
+
+
+def _setup_plugin(workers: int = 1) -> None:
+    plugin_dir = os.path.join(tempfile.mkdtemp(), PLUGIN_NAME)
+    os.makedirs(plugin_dir)
+    with open(os.path.join(plugin_dir, "__init__.py"), "w", encoding="utf-8") as f:
+        f.write(PLUGIN_SOURCE)
+    functions = {name: {"type": "function", "function": {"name": name}, "singleflight": False}
+                 for name in ("get_pid", "slow", "async_add", "crash")}
+    rebuild_dispatch_table({PLUGIN_NAME: {
+        "dir_path": plugin_dir, "isolation": "process", "workers": workers, "functions": functions,
+    }})
+
+
+def _call(func_name: str, **arguments):
+    record = ToolRecord(task_id="t", task_name="t", mcp_type=PLUGIN_NAME,
+                        tool_name=func_name, model="m", arguments=arguments)
+    return call_plugin_function(record)
+
+
+async def _scenario():
+    pid = await _call("get_pid")
+    assert pid != os.getpid()
+    assert await _call("async_add", a=1, b=2) == 3
+
+    # 同一个工作进程中的请求流水线执行
+    start = time.perf_counter()
+    assert await asyncio.gather(_call("slow", tag="a"), _call("slow", tag="b")) == ["a", "b"]
+    assert time.perf_counter() - start < SLEEP_TIME * 1.8
+
+    # 工作进程崩溃：本次调用报错，下次调用自动重启
+    try:
+        await _call("crash")
+        assert False, "crash should surface as an error"
+    except RuntimeError as e:
+        assert "code=3" in str(e)
+    assert await _call("get_pid") != pid
+    assert get_worker_stats()[PLUGIN_NAME]["restarts"] == 1
+
+    close_plugin_workers(PLUGIN_NAME)
+    await asyncio.sleep(0.2)
+
+
+def test_isolated_plugin_runs_in_worker_process():
+    _setup_plugin()
+    try:
+        asyncio.run(_scenario())
+    finally:
+        rebuild_dispatch_table(get_config_data())
+
+
+if __name__ == "__main__":
+    test_isolated_plugin_runs_in_worker_process()
+    print("worker_pool tests passed")